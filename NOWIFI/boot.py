@@ -0,0 +1,29 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+import board
+import digitalio
+import storage
+
+# The flash is writable either by the code, for the event journal, or by the
+# computer over USB. The code gets it unless the debug button is held while
+# the board starts, hold it to copy new files to the board.
+switch = digitalio.DigitalInOut(board.GP15)
+switch.direction = digitalio.Direction.INPUT
+switch.pull = digitalio.Pull.UP
+
+storage.remount("/", readonly=not switch.value)
+switch.deinit()
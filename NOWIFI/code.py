@@ -14,20 +14,44 @@
 #
 ########################################################
 
-import gc
 import rtc
-from adafruit_datetime import datetime as cpy_datetime
+import time
 
-import src.hardware as hardware
+from src.codec import format_time
+from src.hardware import hardware
+from src.scheduler import Scheduler
 from src.state_machine import StateMachine
-from src.logger import logger
+from src.logger import INFO, logger, ring
+from src.telemetry import telemetry
+from src.time_service import time_service
+
+# Seconds between two runs of the periodic tasks
+TEMPERATURE_PERIOD = 5
+UART_PERIOD = 0.05
+LED_PERIOD = 0.05
+WEATHER_PERIOD = 1
+GC_PERIOD = 1
+BUTTON_PERIOD = 0.05
+JOURNAL_PERIOD = 10
+STATS_PERIOD = 60 * 60
+
+# Seconds to wait for each attempt of the time request, and attempts after the
+# first one
+TIME_TIMEOUT = 2
+TIME_RETRIES = 4
+
+# Seconds between two time syncs, and between two checks whether one is due,
+# i.e. how soon a failed sync is tried again
+TIME_SYNC_INTERVAL = 60 * 60
+TIME_CHECK_PERIOD = 60
 
 
 def request_time() -> None:
     """
     Sends request for time to the other microcontroller via UART and waits for 
-    the response.
-    Request format: '?T;', response format: '!T:YYYY-MM-DD HH:MM:SS;'
+    the response, at most TIME_TIMEOUT * (TIME_RETRIES + 1) seconds. If no
+    response arrives the time is left as it is and synced later, see
+    resync_time().
 
     Args:
         None
@@ -36,59 +60,138 @@ def request_time() -> None:
     """
 
     # Send request
-    hardware.uart.write(bytes(f"?T;", "ascii"))
+    request = hardware.link.request("T", timeout=TIME_TIMEOUT, retries=TIME_RETRIES)
     logger.info("Sent time request, waiting for response...")
 
     # Wait for response
-    done = False
-    while not done:
-
-        # Read byte from UART
-        byte_read = hardware.uart.read(1)
-        if not byte_read:
-            continue
-
-        # Start of response. Don't save '!'.
-        if byte_read == b"!":
-            response = []
-            response_started = True
-            continue
-
-        if response_started:
-
-            # Check for end of response. Don't save ';'.
-            if byte_read == b";":
-                response_started = False
-
-                if "".join(response).startswith("T"):
-                    date_time = cpy_datetime.fromisoformat(
-                        "".join(response)[2:])
-                    rtc.RTC().datetime = date_time.timetuple()
-                    logger.info(f"Received time: {date_time}")
-                    done = True
-            
-            # Else, accumulate response bytes.
-            else:
-                response.append(chr(byte_read[0]))
+    on_time(hardware.link.wait(request))
 
 
-def main() -> None:
-    """Main function and loop. Initializes state machine and keeps running it."""
+def resync_time() -> None:
+    """Sends a time request without waiting when the last sync is too old,
+    the response is handled by on_time()."""
+
+    if time_service.stale(TIME_SYNC_INTERVAL):
+        hardware.link.request("T", timeout=TIME_TIMEOUT, retries=TIME_RETRIES,
+                              callback=on_time)
+
+
+def on_time(response) -> None:
+    """
+    Syncs the time service to the time received, and the RTC to the time
+    service for the logs.
+
+    Args:
+        response: tuple, timestamp, None if no response arrived
+    Returns:
+        None
+    """
+
+    if response is None:
+        logger.error("No time received, keeping the current time")
+        return
+
+    time_service.sync(response[0])
+    rtc.RTC().datetime = time.localtime(time_service.time())
+    if logger.enabled(INFO):
+        logger.info("Received time: %s, %s", format_time(time_service.time()),
+                    time_service.report())
+
+
+def send_stats(state_machine) -> None:
+    """
+    Logs the telemetry of this board and sends it to the other one with a
+    statistics request, which is answered with the telemetry of the other
+    board.
+
+    Args:
+        state_machine: StateMachine
+    Returns:
+        None
+    """
+
+    if logger.enabled(INFO):
+        logger.info("Telemetry:\n%s", telemetry.report())
+        logger.info("GC: %s", state_machine.gc_manager.report())
+        logger.info("Time: %s", time_service.report())
+    hardware.link.request("S", telemetry.fields(), callback=on_stats)
+
+
+def on_stats(response) -> None:
+    """Logs the telemetry of the other board, answer to send_stats()."""
+
+    if response is None:
+        logger.error("No telemetry received from the WIFI board")
+        return
+
+    if logger.enabled(INFO):
+        logger.info("WIFI board telemetry:\n%s", telemetry.report(response))
+
+
+def check_debug_switch() -> None:
+    """Prints the last logs, kept in RAM, when the debug button is pressed."""
+
+    switch = hardware.debug_switch
+    switch.update()
+    if switch.fell:
+        print(f"Last logs:\n{ring.dump()}")
+
+
+def start():
+    """
+    Initializes the state machine and schedules its tasks: state switching,
+    state update, temperature reading, weather refresh and UART servicing run
+    independently, each with its own period.
+
+    Args:
+        None
+    Returns:
+        state_machine: StateMachine
+        scheduler: Scheduler, ready to run
+    """
+
+    # Devices are created when first used, except the LEDs showing the boot
+    # and the servos keeping the door locked
+    hardware.init("pixels", "motor_in", "motor_out")
 
     # Request time from the other microcontroller
     request_time()
 
     state_machine = StateMachine()
     logger.info("Initialized state machine")
+    if logger.enabled(INFO):
+        logger.info("Hardware:\n%s", hardware.report())
+
+    scheduler = Scheduler()
+    scheduler.spawn(state_machine.switch_states())
+    scheduler.every(TEMPERATURE_PERIOD, state_machine.read_temperature)
+    scheduler.every(UART_PERIOD, state_machine.service_uart)
+    scheduler.every(LED_PERIOD, state_machine.leds.tick)
+    scheduler.every(WEATHER_PERIOD, state_machine.refresh_weather)
+    scheduler.spawn(state_machine.update())
+
+    # Collect garbage when memory runs low, see GCManager
+    scheduler.every(GC_PERIOD, state_machine.gc_manager.poll)
+    scheduler.every(STATS_PERIOD, lambda: send_stats(state_machine), delay=STATS_PERIOD)
+    scheduler.every(BUTTON_PERIOD, check_debug_switch)
+    scheduler.every(JOURNAL_PERIOD, state_machine.journal.poll)
+    scheduler.every(TIME_CHECK_PERIOD, resync_time, delay=TIME_CHECK_PERIOD)
+
+    return state_machine, scheduler
+
+
+def main() -> None:
+    """Main function. Starts the state machine and runs its tasks forever."""
+
+    state_machine, scheduler = start()
 
-    while True:
-        
-        # Collect garbage, frees idling memory
-        gc.collect()
-        
-        # Update state machine
-        state_machine.go_to()
-        state_machine.update()
+    # On a crash the last logs are printed before the error
+    try:
+        scheduler.run()
+    except Exception:
+        state_machine.journal.flush()
+        print(f"Last logs:\n{ring.dump()}")
+        raise
 
 
 if __name__ == "__main__":
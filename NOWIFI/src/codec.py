@@ -0,0 +1,554 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# NOTE: this file is shared by both boards, keep NOWIFI/src/codec.py and
+# WIFI/src/codec.py identical.
+
+import time
+from array import array
+
+from src.frames import FrameReader, decode_frame, encode_frame
+from src.telemetry import STATS_SIZE, telemetry
+
+# Fields of each message, by start marker and kind: 's' string, 't' timestamp
+# (epoch seconds, local time), 'u' unsigned 32 bits integer, 'w' weather.
+# Error responses have no fields.
+SCHEMAS = {
+    "?T": "",
+    "!T": "t",
+    "?W": "",
+    "!W": "wtt",
+    "?N": "sss",
+    "!N": "",
+    "?S": "u" * STATS_SIZE,
+    "!S": "u" * STATS_SIZE,
+}
+
+# Longest text frame, a statistics message with every value at its maximum
+# takes about 260 bytes
+ASCII_FRAME_SIZE = 384
+
+# Characters of text fields sent as an escape and two hex digits: the frame
+# markers, the field separator and the escape itself. Bytes which are not
+# printable ASCII are escaped too, so any text can be sent.
+ESCAPE = "\\"
+RESERVED = "\\^;?!"
+
+# Weather main groups of OpenWeatherMap, sent as their index in binary mode
+WEATHER = (
+    "Clear", "Clouds", "Drizzle", "Rain", "Thunderstorm", "Snow", "Mist",
+    "Smoke", "Haze", "Dust", "Fog", "Sand", "Ash", "Squall", "Tornado",
+)
+WEATHER_UNKNOWN = 255
+
+# Binary packets: version, flags, kind, sequence number, payload length,
+# payload and CRC16 of everything before it, COBS-encoded and ended by a zero
+VERSION = 1
+HEADER_SIZE = 5
+CRC_SIZE = 2
+PACKET_END = 0
+
+# Longest packet: header, a payload of 255 bytes and CRC take 262 bytes,
+# 264 once COBS-encoded
+PACKET_SIZE = HEADER_SIZE + 255 + CRC_SIZE + 2
+
+# Flags of a binary packet
+RESPONSE = 0x01
+ERROR = 0x02
+NO_SEQ = 0x04
+
+
+def _crc_table():
+    """Lookup table of CRC-16/CCITT-FALSE, one entry per byte value."""
+
+    table = array("H", [0] * 256)
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table[byte] = crc & 0xFFFF
+
+    return table
+
+
+CRC_TABLE = _crc_table()
+
+
+def crc16(data, crc: int = 0xFFFF) -> int:
+    """
+    CRC-16/CCITT-FALSE of some bytes.
+
+    Args:
+        data: bytes, data to check
+        crc: int, initial value, the CRC of the previous data to continue it
+    Returns:
+        int, CRC of the data
+    """
+
+    table = CRC_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+
+    return crc
+
+
+def cobs_encode(data) -> bytearray:
+    """
+    Encodes bytes with Consistent Overhead Byte Stuffing: the result has no
+    zero bytes, so a zero can mark the end of a packet. Adds one byte every
+    254, plus one.
+
+    Args:
+        data: bytes, data to encode
+    Returns:
+        bytearray, encoded data
+    """
+
+    out = bytearray(1)
+    code_pos = 0
+    code = 1
+    for byte in data:
+        if byte:
+            out.append(byte)
+            code += 1
+        if not byte or code == 0xFF:
+            out[code_pos] = code
+            code_pos = len(out)
+            out.append(0)
+            code = 1
+    out[code_pos] = code
+
+    return out
+
+
+def cobs_decode(data) -> bytearray:
+    """
+    Decodes bytes encoded by cobs_encode().
+
+    Args:
+        data: bytes, encoded data without the final zero
+    Returns:
+        bytearray, decoded data
+    Raises:
+        ValueError, if the data is not valid COBS
+    """
+
+    out = bytearray()
+    pos = 0
+    length = len(data)
+    while pos < length:
+        code = data[pos]
+        end = pos + code
+        if not code or end > length:
+            raise ValueError("invalid COBS data")
+
+        out.extend(data[pos + 1:end])
+        pos = end
+        if code < 0xFF and pos < length:
+            out.append(0)
+
+    return out
+
+
+def format_time(epoch: int) -> str:
+    """Timestamp as 'YYYY-MM-DD HH:MM:SS'."""
+
+    t = time.localtime(epoch)
+    return f"{t[0]:04d}-{t[1]:02d}-{t[2]:02d} {t[3]:02d}:{t[4]:02d}:{t[5]:02d}"
+
+
+def parse_time(text: str) -> int:
+    """Timestamp from 'YYYY-MM-DD HH:MM:SS', the inverse of format_time()."""
+
+    return int(time.mktime((int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                            int(text[11:13]), int(text[14:16]),
+                            int(text[17:19]), 0, 0, -1)))
+
+
+def escape(text: str) -> str:
+    """
+    Text field of a text message, with the reserved characters escaped as
+    '\\' and the two hex digits of each of their UTF-8 bytes, e.g. 'Out\\21'.
+
+    Args:
+        text: str, text to send
+    Returns:
+        str, printable ASCII text without reserved characters
+    """
+
+    parts = []
+    for byte in text.encode("utf-8"):
+        if byte < 0x20 or byte > 0x7E or chr(byte) in RESERVED:
+            parts.append(f"{ESCAPE}{byte:02X}")
+        else:
+            parts.append(chr(byte))
+
+    return "".join(parts)
+
+
+def unescape(text: str) -> str:
+    """
+    The inverse of escape().
+
+    Args:
+        text: str, text field as received
+    Returns:
+        str, text sent
+    Raises:
+        ValueError, if an escape is not followed by two hex digits or the
+            bytes are not UTF-8
+    """
+
+    if ESCAPE not in text:
+        return text
+
+    data = bytearray()
+    pos = 0
+    while pos < len(text):
+        if text[pos] == ESCAPE:
+            digits = text[pos + 1:pos + 3]
+            if len(digits) != 2:
+                raise ValueError("truncated escape")
+            data.append(int(digits, 16))
+            pos += 3
+        else:
+            data.append(ord(text[pos]))
+            pos += 1
+
+    return data.decode("utf-8")
+
+
+def _parse_field(text: str, field_type: str):
+    """Field of a text message, by its type in the schema."""
+
+    if field_type == "t":
+        return parse_time(text)
+    if field_type == "u":
+        return int(text)
+    return unescape(text)
+
+
+class PacketReader:
+    """
+    Reads zero-terminated binary packets from a UART, the binary counterpart
+    of FrameReader. Whatever is waiting in the UART is read in a single call
+    into a preallocated buffer.
+    """
+
+    def __init__(self, uart, size: int = PACKET_SIZE) -> None:
+        """
+        Args:
+            uart: busio.UART (or any object with in_waiting and readinto)
+            size: int, size of the read buffer and maximum packet length
+        """
+
+        self.uart = uart
+        self.dropped = 0
+
+        # Chunk read from the UART and position of the next byte to scan
+        self._chunk = bytearray(size)
+        self._chunk_view = memoryview(self._chunk)
+        self._pos = 0
+        self._end = 0
+
+        # Packet being received, too long packets are dropped until their end
+        self._packet = bytearray(size)
+        self._packet_len = 0
+        self._overflow = False
+
+    def read_frame(self):
+        """
+        Returns the next complete packet, never blocks.
+
+        Args:
+            None
+        Returns:
+            bytes, packet without the final zero, or None if no packet is
+            complete
+        """
+
+        chunk = self._chunk
+        packet = self._packet
+        size = len(packet)
+
+        while True:
+
+            # Refill the chunk with whatever is waiting in the UART
+            if self._pos == self._end:
+                waiting = self.uart.in_waiting
+                if not waiting:
+                    return None
+
+                if waiting >= size:
+                    read = self.uart.readinto(self._chunk_view)
+                else:
+                    read = self.uart.readinto(self._chunk_view[:waiting])
+                if not read:
+                    return None
+
+                telemetry.add("uart_in", read)
+                self._pos = 0
+                self._end = read
+
+            # Scan the chunk
+            while self._pos < self._end:
+                byte = chunk[self._pos]
+                self._pos += 1
+
+                if byte == PACKET_END:
+                    length = self._packet_len
+                    overflow = self._overflow
+                    self._packet_len = 0
+                    self._overflow = False
+                    if length and not overflow:
+                        return bytes(packet[:length])
+
+                elif self._packet_len == size:
+                    if not self._overflow:
+                        self.dropped += 1
+                    self._overflow = True
+
+                else:
+                    packet[self._packet_len] = byte
+                    self._packet_len += 1
+
+    def frames(self):
+        """Generator over all packets that can be completed, see FrameReader.frames()."""
+
+        packet = self.read_frame()
+        while packet is not None:
+            yield packet
+            packet = self.read_frame()
+
+
+class AsciiCodec:
+    """
+    Text messages, e.g. '!W#3:Clear^2024-01-01 07:12:00^2024-01-01 17:01:00;'.
+    Fields are separated by '^', and an error response has 'E' as payload.
+    Readable, text fields are escaped so they can contain any character, see
+    escape().
+    """
+
+    name = "ascii"
+
+    def __init__(self) -> None:
+        self.errors = 0
+
+    def reader(self, uart, start: str):
+        """Reader of the frames starting with 'start' received from a UART."""
+
+        return FrameReader(uart, start=start, size=ASCII_FRAME_SIZE)
+
+    def encode(self, start: str, kind: str, seq, fields) -> bytes:
+        """
+        Encodes a message.
+
+        Args:
+            start: str, '?' for requests, '!' for responses
+            kind: str, kind of the message, e.g. 'W'
+            seq: int, sequence number, None for none
+            fields: tuple, fields of the message, None for an error response
+        Returns:
+            bytes, encoded message
+        Raises:
+            ValueError, if the frame is longer than the other board reads
+        """
+
+        if fields is None:
+            return encode_frame(start, kind, seq, "E")
+        if not fields:
+            return encode_frame(start, kind, seq)
+
+        schema = SCHEMAS.get(start + kind, "")
+        parts = []
+        for i, field in enumerate(fields):
+            field_type = schema[i] if i < len(schema) else "s"
+            if field_type == "t":
+                parts.append(format_time(field))
+            elif field_type == "u":
+                parts.append(str(int(field) & 0xFFFFFFFF))
+            else:
+                parts.append(escape(str(field)))
+
+        frame = encode_frame(start, kind, seq, "^".join(parts))
+        if len(frame) > ASCII_FRAME_SIZE + 2:
+            raise ValueError("frame too long")
+        return frame
+
+    def decode(self, start: str, frame):
+        """
+        Decodes a message read by the reader.
+
+        Args:
+            start: str, '?' for requests, '!' for responses
+            frame: str, frame body
+        Returns:
+            tuple of kind, sequence number (None for none) and fields (None
+            for an error response), or None if the message is not valid
+        """
+
+        kind, seq, payload = decode_frame(frame)
+        if payload is None:
+            return kind, seq, ()
+        if start == "!" and payload == "E":
+            return kind, seq, None
+
+        schema = SCHEMAS.get(start + kind)
+        parts = payload.split("^")
+        if schema is not None and len(parts) != len(schema):
+            self.errors += 1
+            return None
+
+        try:
+            if schema is None:
+                fields = tuple(unescape(part) for part in parts)
+            else:
+                fields = tuple(_parse_field(part, field_type)
+                               for part, field_type in zip(parts, schema))
+        except ValueError:
+            self.errors += 1
+            return None
+
+        return kind, seq, fields
+
+
+class BinaryCodec:
+    """
+    Binary messages: timestamps are 4 bytes and the weather a single byte,
+    strings are prefixed by their length and may contain any character. Each
+    packet carries a version and a CRC16, corrupted packets are discarded.
+    """
+
+    name = "binary"
+
+    def __init__(self) -> None:
+        self.errors = 0
+
+    def reader(self, uart, start: str):
+        """Reader of the packets received from a UART."""
+
+        return PacketReader(uart)
+
+    def encode(self, start: str, kind: str, seq, fields) -> bytes:
+        """
+        Encodes a message, see AsciiCodec.encode().
+
+        Raises:
+            ValueError, if the payload is longer than 255 bytes
+        """
+
+        flags = RESPONSE if start == "!" else 0
+        if fields is None:
+            flags |= ERROR
+        if seq is None:
+            flags |= NO_SEQ
+
+        payload = bytearray()
+        schema = SCHEMAS.get(start + kind, "")
+        for i, field in enumerate(fields if fields else ()):
+            field_type = schema[i] if i < len(schema) else "s"
+            if field_type == "t":
+                payload.extend(int(field).to_bytes(4, "big"))
+            elif field_type == "u":
+                payload.extend((int(field) & 0xFFFFFFFF).to_bytes(4, "big"))
+            elif field_type == "w":
+                payload.append(WEATHER.index(field) if field in WEATHER else WEATHER_UNKNOWN)
+            else:
+                text = str(field).encode("utf-8")[:255]
+                payload.append(len(text))
+                payload.extend(text)
+
+        if len(payload) > 255:
+            raise ValueError("payload too long")
+
+        data = bytearray((VERSION, flags, ord(kind), 0 if seq is None else seq,
+                          len(payload)))
+        data.extend(payload)
+        crc = crc16(data)
+        data.append(crc >> 8)
+        data.append(crc & 0xFF)
+
+        packet = cobs_encode(data)
+        packet.append(PACKET_END)
+        return bytes(packet)
+
+    def decode(self, start: str, frame):
+        """Decodes a packet read by the reader, see AsciiCodec.decode()."""
+
+        try:
+            data = cobs_decode(frame)
+        except ValueError:
+            self.errors += 1
+            return None
+
+        end = len(data) - CRC_SIZE
+        if (end < HEADER_SIZE or data[0] != VERSION or
+                data[4] != end - HEADER_SIZE or
+                crc16(memoryview(data)[:end]) != (data[end] << 8 | data[end + 1])):
+            self.errors += 1
+            return None
+
+        flags = data[1]
+        if bool(flags & RESPONSE) != (start == "!"):
+            return None
+
+        kind = chr(data[2])
+        seq = None if flags & NO_SEQ else data[3]
+        if flags & ERROR:
+            return kind, seq, None
+
+        schema = SCHEMAS.get(start + kind)
+        fields = []
+        pos = HEADER_SIZE
+        try:
+            while pos < end:
+                field_type = schema[len(fields)] if schema else "s"
+                if field_type in "tu":
+                    fields.append(int.from_bytes(data[pos:pos + 4], "big"))
+                    pos += 4
+                elif field_type == "w":
+                    code = data[pos]
+                    fields.append(WEATHER[code] if code < len(WEATHER) else "Unknown")
+                    pos += 1
+                else:
+                    length = data[pos]
+                    fields.append(data[pos + 1:pos + 1 + length].decode("utf-8"))
+                    pos += 1 + length
+        except (IndexError, UnicodeError):
+            self.errors += 1
+            return None
+
+        if pos != end or (schema is not None and len(fields) != len(schema)):
+            self.errors += 1
+            return None
+
+        return kind, seq, tuple(fields)
+
+
+def codec_for(mode):
+    """
+    Codec of a link mode, as set by LINK_MODE in settings.toml. Both boards
+    must use the same one.
+
+    Args:
+        mode: str, 'ascii' or 'binary', None for the default 'ascii'
+    Returns:
+        AsciiCodec or BinaryCodec
+    """
+
+    if mode == BinaryCodec.name:
+        return BinaryCodec()
+    return AsciiCodec()
@@ -0,0 +1,110 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+from array import array
+
+# Events returned by DoorSensor.sample()
+DOOR_OPENED = 1
+DOOR_CLOSED = 2
+
+
+class DoorSensor:
+    """
+    Detects the door swinging from the force sensor. Samples are taken at a
+    fixed rate into a ring buffer and the door is considered open while enough
+    of the last samples fall in the 'open' band. Different thresholds for
+    opening and closing give hysteresis, so a noisy reading doesn't flap.
+    """
+
+    def __init__(self,
+                 adc,
+                 rate: int = 100,
+                 size: int = 16,
+                 low: int = 600,
+                 high: int = 800,
+                 open_count: int = 8,
+                 close_count: int = 2) -> None:
+        """
+        Args:
+            adc: analogio.AnalogIn (or any object with a 'value')
+            rate: int, samples per second
+            size: int, number of samples kept
+            low: int, lower bound (excluded) of the 'open' band
+            high: int, upper bound (excluded) of the 'open' band
+            open_count: int, samples in band needed to report the door open
+            close_count: int, samples in band at or below which the door is
+                reported closed
+        """
+
+        self.adc = adc
+        self.period = 1 / rate
+        self.low = low
+        self.high = high
+        self.open_count = open_count
+        self.close_count = close_count
+
+        self._samples = array("H", [0] * size)
+        self.reset()
+
+    def reset(self) -> None:
+        """Forgets all samples, the door is considered closed."""
+
+        for i in range(len(self._samples)):
+            self._samples[i] = 0
+        self._index = 0
+        self._in_band = 0
+        self._next_sample = None
+        self.is_open = False
+
+    def _is_in_band(self, value: int) -> bool:
+        """Whether a sample means the door is open."""
+
+        return self.low < value < self.high
+
+    def sample(self, now: float):
+        """
+        Takes a sample if one is due and updates the door status.
+
+        Args:
+            now: float, current time in seconds
+        Returns:
+            int, DOOR_OPENED or DOOR_CLOSED if the status changed, else None
+        """
+
+        # Samples a little early are accepted, so that timing jitter doesn't
+        # make the sensor skip samples
+        if self._next_sample is not None and now < self._next_sample:
+            return None
+        self._next_sample = now + self.period * 0.9
+
+        # Replace the oldest sample, keeping count of samples in band
+        value = self.adc.value
+        if self._is_in_band(self._samples[self._index]):
+            self._in_band -= 1
+        if self._is_in_band(value):
+            self._in_band += 1
+        self._samples[self._index] = value
+        self._index = (self._index + 1) % len(self._samples)
+
+        # Hysteresis
+        if not self.is_open and self._in_band >= self.open_count:
+            self.is_open = True
+            return DOOR_OPENED
+        if self.is_open and self._in_band <= self.close_count:
+            self.is_open = False
+            return DOOR_CLOSED
+
+        return None
@@ -0,0 +1,137 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+import gc
+import time as py_time
+
+from src.telemetry import telemetry
+
+# Reasons of a collection
+LOW_MEMORY = 0
+IDLE = 1
+FORCED = 2
+
+REASONS = ("low memory", "idle", "forced")
+
+
+class GCManager:
+    """
+    Decides when to collect garbage. A full collection pauses everything for
+    milliseconds, so instead of collecting on a fixed period it collects when
+    free memory runs low, or in idle windows, e.g. right after an RFID scan
+    without tags, if enough memory was allocated since the last collection.
+    Pauses are recorded in the 'gc' telemetry timer.
+    """
+
+    def __init__(self, low_memory: int = 32 * 1024, idle_allocated: int = 8 * 1024,
+                 max_interval: float = 10 * 60, clock=None) -> None:
+        """
+        Args:
+            low_memory: int, free bytes below which poll() collects
+            idle_allocated: int, bytes allocated since the last collection
+                above which idle() collects
+            max_interval: float, seconds after which poll() collects anyway,
+                so fragmentation doesn't build up if no idle window comes
+            clock: function returning the current time in seconds
+        """
+
+        self.low_memory = low_memory
+        self.idle_allocated = idle_allocated
+        self.max_interval = max_interval
+        self.clock = clock if clock else py_time.monotonic
+
+        self.started = self.clock()
+        self.last = self.started
+        self.allocated = gc.mem_alloc()
+
+        # Collections by reason, total and longest pause in microseconds
+        self.collections = [0] * len(REASONS)
+        self.pause_total = 0
+        self.pause_max = 0
+
+    def poll(self) -> bool:
+        """
+        Collects if free memory is low or the last collection is too old.
+        Cheap, can be called often.
+
+        Args:
+            None
+        Returns:
+            bool, whether a collection was done
+        """
+
+        if gc.mem_free() < self.low_memory:
+            self.collect(LOW_MEMORY)
+            return True
+
+        if self.clock() - self.last > self.max_interval:
+            self.collect(FORCED)
+            return True
+
+        return False
+
+    def idle(self) -> bool:
+        """
+        Collects if enough memory was allocated since the last collection.
+        Called when nothing time-critical is going on.
+
+        Args:
+            None
+        Returns:
+            bool, whether a collection was done
+        """
+
+        if gc.mem_alloc() - self.allocated < self.idle_allocated:
+            return False
+
+        self.collect(IDLE)
+        return True
+
+    def collect(self, reason: int = FORCED) -> None:
+        """Collects garbage now, recording the pause."""
+
+        started = telemetry.start()
+        gc.collect()
+        pause = telemetry.stop("gc", started)
+
+        self.collections[reason] += 1
+        self.pause_total += pause
+        self.pause_max = max(self.pause_max, pause)
+        self.last = self.clock()
+        self.allocated = gc.mem_alloc()
+
+        free = gc.mem_free()
+        telemetry.set("mem_free", free)
+        telemetry.lowest("mem_min", free)
+
+    def report(self) -> str:
+        """
+        Summary of the collections: count by reason, collections per hour and
+        pauses.
+
+        Args:
+            None
+        Returns:
+            str, the summary
+        """
+
+        count = sum(self.collections)
+        hours = max(self.clock() - self.started, 1) / 3600
+        reasons = ", ".join(f'{n} {reason}' for n, reason in zip(self.collections, REASONS))
+        average = self.pause_total / count / 1000 if count else 0
+
+        return (f'{count} collections ({reasons}), {count / hours:.1f}/h, '
+                f'pause {average:.2f} ms avg, {self.pause_max / 1000:.2f} ms max')
@@ -14,69 +14,259 @@
 #
 ########################################################
 
-import analogio
-import board
-import digitalio
-import busio
-import neopixel
-import pwmio
-
-import mfrc522
-
-import adafruit_sht4x
-from adafruit_motor import servo
-from adafruit_debouncer import Debouncer
-from src.logger import logger
-
-# Addressable LED strip
-pixels = neopixel.NeoPixel(
-    pin=board.GP7, 
-    n=26, 
-    brightness=0.2, 
-    auto_write=False, 
-    pixel_order=neopixel.GRB
-)
-pixels.fill((0, 0, 255))
-pixels.show()
-logger.info('LED strip initialized')
-
-# UART for serial communication between Pico and Pico W
-uart = busio.UART(tx=board.GP0, rx=board.GP1, baudrate=115200)
-logger.info('UART initialized at 115200 bauds')
-
-# Servo motor IN
-pwm_in = pwmio.PWMOut(board.GP12, duty_cycle=2**15, frequency=50)
-motor_in = servo.Servo(pwm_in)
-motor_in.angle = 0
-logger.info('Servo motor in initialized')
-
-# Servo motor OUT
-pwm_out = pwmio.PWMOut(board.GP13, duty_cycle=2**15, frequency=50)
-motor_out = servo.Servo(pwm_out)
-motor_out.angle = 0
-logger.info('Servo motor out initialized')
-
-# RFID reader
-spi = busio.SPI(clock=board.GP18, MOSI=board.GP19, MISO=board.GP16)
-cs = digitalio.DigitalInOut(board.GP17)
-rst = digitalio.DigitalInOut(board.GP22)
-rfid = mfrc522.MFRC522(spi, cs, rst)
-rfid.set_antenna_gain(0x07 << 4)
-logger.info('RFID reader initialized')
-
-# Temperature sensor
-i2c = busio.I2C(scl=board.GP5, sda=board.GP4)
-sht = adafruit_sht4x.SHT4x(i2c)
-sht.mode = adafruit_sht4x.Mode.NOHEAT_HIGHPRECISION
-logger.info('Temperature sensor initialized')
-
-# Flex sensor
-flex = analogio.AnalogIn(board.GP28)
-logger.info('Flex sensor initialized')
-
-# Debug button
-btn_pin = digitalio.DigitalInOut(board.GP15)
-btn_pin.direction = digitalio.Direction.INPUT
-btn_pin.pull = digitalio.Pull.UP
-debug_switch = Debouncer(btn_pin)
-logger.info('Debug button initialized')
+import os
+import time
+
+from src.codec import codec_for
+from src.link import Link
+from src.logger import get_logger
+
+logger = get_logger("hardware")
+
+# Backend used unless HARDWARE_BACKEND is set in settings.toml
+DEFAULT_BACKEND = "board"
+
+# Bytes the UART keeps until they are read. The default of 64 is less than a
+# statistics or notification frame, and the UART is only read every 50 ms.
+UART_BUFFER_SIZE = 512
+
+
+class Hardware:
+    """
+    Registry of the devices. Each device is created by its driver the first
+    time it is used, and the time taken is recorded. A device whose driver
+    fails is replaced by an inert stand-in and marked degraded, so a missing
+    peripheral disables a feature instead of the whole door.
+    """
+
+    def __init__(self, drivers) -> None:
+        """
+        Args:
+            drivers: dict, maps a device name to a function creating it, called
+                with the registry so it can use other devices
+        """
+
+        self._drivers = drivers
+        self.init_times = {}
+        self.degraded = {}
+
+    def __getattr__(self, name: str):
+        """Creates a device on first access, later accesses don't get here."""
+
+        if name.startswith("_") or name not in self._drivers:
+            raise AttributeError(name)
+
+        start = time.monotonic()
+
+        # Drivers fail in many ways (missing module, pin in use, no device on
+        # the bus), any of them only disables this device
+        try:
+            device = self._drivers[name](self)
+        except Exception as error:
+            from src.simulated import inert_device
+
+            logger.error('Hardware: %s failed (%s), degraded', name, error)
+            device = inert_device(name)
+            self.degraded[name] = str(error)
+        self.init_times[name] = time.monotonic() - start
+
+        setattr(self, name, device)
+        if name not in self.degraded:
+            logger.info('Hardware: %s initialized in %.3f s', name, self.init_times[name])
+        return device
+
+    def init(self, *names) -> None:
+        """Creates the given devices now, e.g. to put them in a safe state."""
+
+        for name in names:
+            getattr(self, name)
+
+    def is_degraded(self, name: str) -> bool:
+        """Whether a device failed and was replaced by a stand-in."""
+
+        return name in self.degraded
+
+    def report(self) -> str:
+        """
+        Summary of the devices created so far: time taken by each driver and
+        error of the degraded ones.
+
+        Args:
+            None
+        Returns:
+            str, one line per device
+        """
+
+        lines = []
+        for name, seconds in self.init_times.items():
+            if name in self.degraded:
+                lines.append(f'{name}: degraded, {self.degraded[name]}')
+            else:
+                lines.append(f'{name}: {seconds:.3f} s')
+
+        return "\n".join(lines)
+
+
+# Drivers of the board, CircuitPython modules are only imported when needed
+
+def _pixels(hw):
+    """Addressable LED strip, blue until the state machine takes over."""
+
+    import board
+    import neopixel
+
+    pixels = neopixel.NeoPixel(
+        pin=board.GP7,
+        n=26,
+        brightness=0.2,
+        auto_write=False,
+        pixel_order=neopixel.GRB
+    )
+    pixels.fill((0, 0, 255))
+    pixels.show()
+    return pixels
+
+
+def _uart(hw):
+    """UART for serial communication between Pico and Pico W."""
+
+    import board
+    import busio
+
+    return busio.UART(tx=board.GP0, rx=board.GP1, baudrate=115200,
+                      receiver_buffer_size=UART_BUFFER_SIZE)
+
+
+def _servo(pin):
+    """Servo motor on a pin, locked."""
+
+    import pwmio
+    from adafruit_motor import servo
+
+    pwm = pwmio.PWMOut(pin, duty_cycle=2**15, frequency=50)
+    motor = servo.Servo(pwm)
+    motor.angle = 0
+    return motor
+
+
+def _motor_in(hw):
+    """Servo motor IN."""
+
+    import board
+
+    return _servo(board.GP12)
+
+
+def _motor_out(hw):
+    """Servo motor OUT."""
+
+    import board
+
+    return _servo(board.GP13)
+
+
+def _rfid(hw):
+    """RFID reader."""
+
+    import board
+    import busio
+    import digitalio
+    import mfrc522
+
+    spi = busio.SPI(clock=board.GP18, MOSI=board.GP19, MISO=board.GP16)
+    cs = digitalio.DigitalInOut(board.GP17)
+    rst = digitalio.DigitalInOut(board.GP22)
+    rfid = mfrc522.MFRC522(spi, cs, rst)
+    rfid.set_antenna_gain(0x07 << 4)
+    return rfid
+
+
+def _sht(hw):
+    """Temperature sensor."""
+
+    import board
+    import busio
+    import adafruit_sht4x
+
+    i2c = busio.I2C(scl=board.GP5, sda=board.GP4)
+    sht = adafruit_sht4x.SHT4x(i2c)
+    sht.mode = adafruit_sht4x.Mode.NOHEAT_HIGHPRECISION
+    return sht
+
+
+def _flex(hw):
+    """Flex sensor."""
+
+    import analogio
+    import board
+
+    return analogio.AnalogIn(board.GP28)
+
+
+def _debug_switch(hw):
+    """Debug button."""
+
+    import board
+    import digitalio
+    from adafruit_debouncer import Debouncer
+
+    btn_pin = digitalio.DigitalInOut(board.GP15)
+    btn_pin.direction = digitalio.Direction.INPUT
+    btn_pin.pull = digitalio.Pull.UP
+    return Debouncer(btn_pin)
+
+
+BOARD_DRIVERS = {
+    "pixels": _pixels,
+    "uart": _uart,
+    "motor_in": _motor_in,
+    "motor_out": _motor_out,
+    "rfid": _rfid,
+    "sht": _sht,
+    "flex": _flex,
+    "debug_switch": _debug_switch,
+}
+
+
+# Drivers common to all backends
+
+def _codec(hw):
+    """Codec of the UART messages, see codec_for()."""
+
+    return codec_for(os.getenv("LINK_MODE"))
+
+
+def _link(hw):
+    """Requests to the other board over the UART."""
+
+    return Link(hw.uart, hw.codec)
+
+
+COMMON_DRIVERS = {
+    "codec": _codec,
+    "link": _link,
+}
+
+
+def drivers_for(backend):
+    """
+    Drivers of a backend, as set by HARDWARE_BACKEND in settings.toml.
+
+    Args:
+        backend: str, 'board' or 'simulated', None for the default 'board'
+    Returns:
+        dict, maps a device name to its driver
+    """
+
+    if backend == "simulated":
+        from src.simulated import SIMULATED_DRIVERS
+        drivers = dict(SIMULATED_DRIVERS)
+    else:
+        drivers = dict(BOARD_DRIVERS)
+
+    drivers.update(COMMON_DRIVERS)
+    return drivers
+
+
+# Devices of the door
+hardware = Hardware(drivers_for(os.getenv("HARDWARE_BACKEND", DEFAULT_BACKEND)))
@@ -0,0 +1,263 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+import os
+import struct
+import time as py_time
+
+from src.logger import get_logger
+
+logger = get_logger("journal")
+
+# Record: timestamp (epoch seconds, local time), tag UID, event, state and a
+# spare value, 12 bytes big endian
+RECORD_FORMAT = ">IIBBH"
+RECORD_SIZE = 12
+
+# Index entry: day (days since the epoch) and number of its first record
+INDEX_FORMAT = ">II"
+INDEX_SIZE = 8
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Events
+BOOT = 0
+STATE_SWITCH = 1
+PET_IN = 2
+PET_OUT = 3
+UNKNOWN_BADGE = 4
+
+EVENT_NAMES = ("boot", "state switch", "pet in", "pet out", "unknown badge")
+
+
+class Journal:
+    """
+    Append-only journal of events in a file of fixed-size binary records.
+    Records are buffered in RAM and written in blocks, when the buffer is
+    full or the oldest buffered record is 'flush_interval' seconds old, to
+    limit flash wear and write stalls: a power loss loses the buffered records
+    only. An index file next to the journal holds the first record of each
+    day, so the records of a day are found with a binary search over the index
+    and a single read.
+
+    On the board, the code can only write the flash if boot.py allowed it.
+    Otherwise writes fail, are counted in 'errors' and records are dropped
+    when the buffer is full.
+    """
+
+    def __init__(self, path: str, batch: int = 32, flush_interval: float = 10 * 60,
+                 clock=None) -> None:
+        """
+        Args:
+            path: str, path of the journal, the index is '<path>.idx'
+            batch: int, records buffered before writing
+            flush_interval: float, seconds a record waits in the buffer at most,
+                as long as poll() is called
+            clock: function returning the current time in seconds
+        """
+
+        self.path = path
+        self.index_path = path + ".idx"
+        self.batch = batch
+        self.flush_interval = flush_interval
+        self.clock = clock if clock else py_time.monotonic
+
+        # Buffered records and index entries, at most one entry per record
+        self._records = bytearray(RECORD_SIZE * batch)
+        self._entries = bytearray(INDEX_SIZE * batch)
+        self._buffered = 0
+        self._buffered_entries = 0
+        self._oldest = None
+
+        # Records and index entries on flash. A record cut by a power loss is
+        # overwritten by the next one.
+        self.count = _size(self.path) // RECORD_SIZE
+        self.days = _size(self.index_path) // INDEX_SIZE
+        self.last_day = -1
+        if self.days:
+            with open(self.index_path, "rb") as index:
+                self.last_day = _entry(index, self.days - 1)[0]
+
+        self.flushes = 0
+        self.errors = 0
+        self.dropped = 0
+
+    def record(self, epoch: int, event: int, uid: int = 0, state: int = 0,
+               data: int = 0) -> None:
+        """
+        Adds a record, written later.
+
+        Args:
+            epoch: int, time of the event, epoch seconds
+            event: int, event code, e.g. PET_IN
+            uid: int, UID of the tag involved, 0 for none
+            state: int, state of the door
+            data: int, spare 16 bits value
+        Returns:
+            None
+        """
+
+        if self._buffered == self.batch and not self.flush():
+            self.dropped += 1
+            return
+
+        # First record of a new day, index it
+        day = epoch // SECONDS_PER_DAY
+        if day > self.last_day:
+            struct.pack_into(INDEX_FORMAT, self._entries,
+                             self._buffered_entries * INDEX_SIZE,
+                             day, self.count + self._buffered)
+            self._buffered_entries += 1
+            self.last_day = day
+
+        struct.pack_into(RECORD_FORMAT, self._records, self._buffered * RECORD_SIZE,
+                         epoch, uid, event, state, data)
+        self._buffered += 1
+        if self._oldest is None:
+            self._oldest = self.clock()
+
+        if self._buffered == self.batch:
+            self.flush()
+
+    def poll(self) -> None:
+        """Writes the buffered records if the oldest has waited long enough."""
+
+        if self._oldest is not None and self.clock() - self._oldest >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> bool:
+        """
+        Writes the buffered records and index entries.
+
+        Args:
+            None
+        Returns:
+            bool, False if writing failed, the records stay buffered
+        """
+
+        if not self._buffered:
+            return True
+
+        try:
+            _write(self.path, self.count * RECORD_SIZE,
+                   memoryview(self._records)[:self._buffered * RECORD_SIZE])
+            if self._buffered_entries:
+                _write(self.index_path, self.days * INDEX_SIZE,
+                       memoryview(self._entries)[:self._buffered_entries * INDEX_SIZE])
+        except OSError as error:
+            self.errors += 1
+            self._oldest = self.clock()
+            logger.error('Journal: %d records not written (%s)', self._buffered, error)
+            return False
+
+        self.count += self._buffered
+        self.days += self._buffered_entries
+        self._buffered = 0
+        self._buffered_entries = 0
+        self._oldest = None
+        self.flushes += 1
+        return True
+
+    def day(self, day: int):
+        """
+        Records of a day. Buffered records are written first, so they are
+        included.
+
+        Args:
+            day: int, days since the epoch, i.e. epoch // SECONDS_PER_DAY
+        Returns:
+            list of tuples (epoch, uid, event, state, data), oldest first
+        """
+
+        self.flush()
+        if not self.days:
+            return []
+
+        # Binary search over the index for the day, then the next entry gives
+        # the end of its records
+        with open(self.index_path, "rb") as index:
+            low = 0
+            high = self.days
+            while low < high:
+                middle = (low + high) // 2
+                if _entry(index, middle)[0] < day:
+                    low = middle + 1
+                else:
+                    high = middle
+
+            if low == self.days:
+                return []
+            found, first = _entry(index, low)
+            end = _entry(index, low + 1)[1] if low + 1 < self.days else self.count
+
+        if found != day:
+            return []
+
+        # Records of the next day written before a power loss cut the index
+        # write have no entry, leave them out
+        return [record for record in self.read(first, end - first)
+                if record[0] // SECONDS_PER_DAY == day]
+
+    def read(self, first: int, count: int):
+        """
+        Records on flash from a given one.
+
+        Args:
+            first: int, number of the first record
+            count: int, number of records
+        Returns:
+            list of tuples (epoch, uid, event, state, data)
+        """
+
+        count = max(0, min(count, self.count - first))
+        if not count:
+            return []
+
+        with open(self.path, "rb") as journal:
+            journal.seek(first * RECORD_SIZE)
+            data = journal.read(count * RECORD_SIZE)
+
+        return [struct.unpack_from(RECORD_FORMAT, data, i * RECORD_SIZE)
+                for i in range(len(data) // RECORD_SIZE)]
+
+
+def _entry(index, number: int):
+    """Entry of an open index file, as (day, first record)."""
+
+    index.seek(number * INDEX_SIZE)
+    return struct.unpack(INDEX_FORMAT, index.read(INDEX_SIZE))
+
+
+def _size(path: str) -> int:
+    """Size of a file in bytes, 0 if it doesn't exist."""
+
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return 0
+
+
+def _write(path: str, offset: int, data) -> None:
+    """Writes bytes at an offset of a file, created if missing."""
+
+    try:
+        output = open(path, "r+b")
+    except OSError:
+        output = open(path, "wb")
+
+    with output:
+        output.seek(offset)
+        output.write(data)
@@ -0,0 +1,139 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+import time as py_time
+
+OFF = (0, 0, 0)
+
+# Brightness steps of a pulse, few enough that most ticks don't change the color
+PULSE_STEPS = 16
+
+
+class LedController:
+    """
+    Controls the LED strip. The strip is only written when the color actually
+    changes. Animations don't block: each call to tick() shows their next
+    frame, and once over the strip goes back to the last color set with fill().
+    """
+
+    def __init__(self, pixels, clock=None) -> None:
+        """
+        Args:
+            pixels: neopixel.NeoPixel, created with auto_write=False
+            clock: function returning the current time in seconds
+        """
+
+        self.pixels = pixels
+        self.clock = clock if clock else py_time.monotonic
+
+        # Color set with fill(), color currently shown and running animation
+        self.color = None
+        self._shown = None
+        self._animation = None
+
+        self.shows = 0
+        self.skipped = 0
+
+    def fill(self, color) -> None:
+        """
+        Sets all LEDs to a color, stopping any animation.
+
+        Args:
+            color: tuple, (red, green, blue)
+        Returns:
+            None
+        """
+
+        self._animation = None
+        self.color = color
+        self._show(color)
+
+    def blink(self, color, times: int = 3, period: float = 0.4) -> None:
+        """
+        Blinks all LEDs, then goes back to the color set with fill().
+
+        Args:
+            color: tuple, (red, green, blue)
+            times: int, number of blinks
+            period: float, seconds of a blink, on and off
+        Returns:
+            None
+        """
+
+        self._animation = self._blink(color, times, period)
+        self.tick()
+
+    def pulse(self, color, period: float = 2.0) -> None:
+        """
+        Fades all LEDs in and out until fill() is called.
+
+        Args:
+            color: tuple, (red, green, blue)
+            period: float, seconds of a fade in and out
+        Returns:
+            None
+        """
+
+        self.color = color
+        self._animation = self._pulse(color, period)
+        self.tick()
+
+    def tick(self) -> None:
+        """Shows the next frame of the running animation, if any."""
+
+        if self._animation is None:
+            return
+
+        try:
+            color = next(self._animation)
+        except StopIteration:
+            self._animation = None
+            color = self.color
+
+        if color is not None:
+            self._show(color)
+
+    def _show(self, color) -> None:
+        """Writes a color to the strip, unless it is already shown."""
+
+        if color == self._shown:
+            self.skipped += 1
+            return
+
+        self.pixels.fill(color)
+        self.pixels.show()
+        self._shown = color
+        self.shows += 1
+
+    def _blink(self, color, times: int, period: float):
+        """Animation blinking a color, yields the color to show."""
+
+        start = self.clock()
+        while True:
+            elapsed = self.clock() - start
+            if elapsed >= times * period:
+                return
+            yield color if elapsed % period < period / 2 else OFF
+
+    def _pulse(self, color, period: float):
+        """Animation fading a color in and out, yields the color to show."""
+
+        start = self.clock()
+        while True:
+            phase = ((self.clock() - start) % period) / period
+            level = 1 - abs(2 * phase - 1)
+            step = int(level * PULSE_STEPS) / PULSE_STEPS
+            yield (int(color[0] * step), int(color[1] * step), int(color[2] * step))
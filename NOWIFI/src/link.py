@@ -0,0 +1,311 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+import time as py_time
+from array import array
+
+from src.logger import get_logger
+from src.telemetry import telemetry
+
+logger = get_logger("link")
+
+# Request status
+PENDING = 0
+DONE = 1
+FAILED = 2
+
+# Sequence numbers wrap around after this value, back to 1: 0 is only used by
+# the first request after boot, so the other board can tell a restart
+SEQ_LIMIT = 256
+
+# Default seconds to wait for a response and number of times a request is sent
+# again before giving up
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_RETRIES = 2
+
+# Default maximum number of requests in flight, further ones wait their turn
+DEFAULT_WINDOW = 4
+
+# Upper bounds in seconds of the latency histogram buckets, latencies above the
+# last one go to an extra bucket
+LATENCY_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+
+class Request:
+    """A request sent over the link and its outcome."""
+
+    def __init__(self, kind: str, fields, timeout: float, retries: int,
+                 callback) -> None:
+        """
+        Args:
+            kind: str, kind of the request, e.g. 'W'
+            fields: tuple, fields of the request
+            timeout: float, seconds to wait for a response to each attempt
+            retries: int, times the request is sent again before giving up
+            callback: function called with the response fields, None if the
+                request failed or got an error response, None for no callback
+        """
+
+        self.kind = kind
+        self.fields = fields
+        self.timeout = timeout
+        self.retries = retries
+        self.callback = callback
+
+        # Sequence number and encoded request, set once the request is sent
+        self.seq = None
+        self.frame = None
+
+        self.status = PENDING
+        self.response = None
+        self.attempts = 0
+        self.started = 0
+        self.sent = 0
+
+    @property
+    def pending(self) -> bool:
+        """Whether the request is still waiting for a response."""
+
+        return self.status == PENDING
+
+
+class Link:
+    """
+    Request/response exchanges with the other board. Every request carries a
+    sequence number echoed in its response, so a response is matched to its
+    request and late or duplicate responses are discarded. Several requests
+    can be in flight at once, up to 'window', and their responses arrive in
+    any order. A request not answered within its timeout is sent again a
+    limited number of times, then fails: nothing ever waits forever for the
+    other board. Latencies, from the first attempt to the response, are
+    recorded in a histogram per kind.
+    """
+
+    def __init__(self, uart, codec, clock=None,
+                 window: int = DEFAULT_WINDOW) -> None:
+        """
+        Args:
+            uart: busio.UART, used to send requests and receive responses
+            codec: AsciiCodec or BinaryCodec, see codec_for()
+            clock: function returning the current time in seconds
+            window: int, maximum number of requests in flight
+        """
+
+        self.uart = uart
+        self.codec = codec
+        self.reader = codec.reader(uart, "!")
+        self.clock = clock if clock else py_time.monotonic
+
+        # Requests waiting for a response, by sequence number, and requests
+        # waiting to be sent
+        self.window = window
+        self._pending = {}
+        self._queue = []
+        self._seq = 0
+
+        # Latency histograms, by kind
+        self.latencies = {}
+
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.discarded = 0
+
+    def request(self, kind: str, fields=(), timeout: float = DEFAULT_TIMEOUT,
+                retries: int = DEFAULT_RETRIES, callback=None) -> Request:
+        """
+        Sends a request without waiting for the response, or queues it if the
+        window is full. The response is handled by poll(), which must be
+        called regularly. A request too long for the codec fails at once.
+
+        Args:
+            kind: str, kind of the request, e.g. 'W'
+            fields: tuple, fields of the request
+            timeout: float, seconds to wait for a response to each attempt
+            retries: int, times the request is sent again before giving up
+            callback: function called with the response fields, None if the
+                request failed or got an error response
+        Returns:
+            Request, to check the outcome
+        """
+
+        request = Request(kind, fields, timeout, retries, callback)
+        if len(self._pending) < self.window:
+            self._start(request)
+        else:
+            self._queue.append(request)
+        return request
+
+    @property
+    def busy(self) -> bool:
+        """Whether any request is in flight or waiting to be sent."""
+
+        return bool(self._pending or self._queue)
+
+    def poll(self) -> None:
+        """
+        Handles the responses received and the requests timed out. Never
+        blocks.
+        """
+
+        # Reading frame by frame rather than with frames() spares a generator
+        # on every poll, most of which find nothing
+        while True:
+            frame = self.reader.read_frame()
+            if frame is None:
+                break
+
+            response = self.codec.decode("!", frame)
+            request = None
+            if response is not None:
+                telemetry.add("frames")
+                kind, seq, fields = response
+                request = self._pending.get(seq)
+            else:
+                telemetry.add("frame_errors")
+            if request is None or request.kind != kind:
+                self.discarded += 1
+                logger.debug('Link: discarded response %s', frame)
+                continue
+
+            del self._pending[seq]
+            self._record(kind, self.clock() - request.started)
+            request.response = fields
+            self._finish(request, DONE)
+
+        # Requests waiting for a free slot
+        while self._queue and len(self._pending) < self.window:
+            self._start(self._queue.pop(0))
+
+        if not self._pending:
+            return
+
+        now = self.clock()
+        for request in list(self._pending.values()):
+            if now - request.sent < request.timeout:
+                continue
+
+            if request.attempts > request.retries:
+                del self._pending[request.seq]
+                self.failed += 1
+                logger.error('Link: %s request failed after %d attempts',
+                             request.kind, request.attempts)
+                self._finish(request, FAILED)
+            else:
+                self.retried += 1
+                self._send(request)
+
+    def wait(self, request: Request, sleep=None, step: float = 0.01):
+        """
+        Blocks until a request is answered or fails, which takes at most
+        timeout * (retries + 1) seconds. Other requests are handled meanwhile.
+
+        Args:
+            request: Request, as returned by request()
+            sleep: function sleeping for the given seconds
+            step: float, seconds between two polls
+        Returns:
+            tuple, response fields, None if the request failed or got an error
+            response
+        """
+
+        sleep = sleep if sleep else py_time.sleep
+        while request.pending:
+            self.poll()
+            if request.pending:
+                sleep(step)
+
+        return request.response
+
+    def report(self) -> str:
+        """
+        Summary of the link: requests sent, retried, failed, responses
+        discarded and, for each kind, the latency histogram as
+        '<upper bound>:<count>' pairs.
+
+        Args:
+            None
+        Returns:
+            str, one line for the totals and one per kind
+        """
+
+        lines = [f'sent {self.sent}, retried {self.retried}, failed {self.failed}, discarded {self.discarded}, queued {len(self._queue)}']
+        for kind, histogram in self.latencies.items():
+            buckets = []
+            for i, count in enumerate(histogram):
+                if count:
+                    bound = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else "inf"
+                    buckets.append(f'{bound}:{count}')
+            lines.append(f'{kind}: {" ".join(buckets)}')
+
+        return "\n".join(lines)
+
+    def _start(self, request: Request) -> None:
+        """
+        Gives a request a sequence number and sends it for the first time. A
+        request the codec can't encode fails at once.
+        """
+
+        # Skip sequence numbers still in use by old requests
+        seq = self._seq
+        while seq in self._pending:
+            seq = (seq + 1) % SEQ_LIMIT or 1
+        self._seq = (seq + 1) % SEQ_LIMIT or 1
+
+        request.seq = seq
+        try:
+            request.frame = self.codec.encode("?", request.kind, seq, request.fields)
+        except ValueError as error:
+
+            # Too long for the codec, e.g. a notification with a long text in
+            # binary mode: sending it again would not help
+            self.failed += 1
+            logger.error('Link: %s request not sent (%s)', request.kind, error)
+            self._finish(request, FAILED)
+            return
+
+        self._pending[seq] = request
+        request.started = self.clock()
+        self._send(request)
+
+    def _send(self, request: Request) -> None:
+        """Writes a request to the UART, once more."""
+
+        self.uart.write(request.frame)
+        telemetry.add("uart_out", len(request.frame))
+        request.attempts += 1
+        request.sent = self.clock()
+        self.sent += 1
+
+    def _finish(self, request: Request, status: int) -> None:
+        """Sets the outcome of a request and calls its callback."""
+
+        request.status = status
+        if request.callback:
+            request.callback(request.response)
+
+    def _record(self, kind: str, latency: float) -> None:
+        """Adds a latency to the histogram of a kind."""
+
+        histogram = self.latencies.get(kind)
+        if histogram is None:
+            histogram = array("L", [0] * (len(LATENCY_BUCKETS) + 1))
+            self.latencies[kind] = histogram
+
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS) and latency > LATENCY_BUCKETS[bucket]:
+            bucket += 1
+        histogram[bucket] += 1
@@ -14,9 +14,251 @@
 #
 ########################################################
 
+# NOTE: this file is shared by both boards, keep NOWIFI/src/logger.py and
+# WIFI/src/logger.py identical.
+
+import os
+import time
+
 import adafruit_logging as logging
 
+# Levels, as in adafruit_logging
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+CRITICAL = 50
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING,
+          "ERROR": ERROR, "CRITICAL": CRITICAL}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+# Size of a ring buffer record header: milliseconds (4 bytes), level and
+# message length (1 byte each). Messages are cut to 255 bytes.
+RECORD_HEADER = 6
+MESSAGE_MAX = 255
+
+
+class RingBuffer:
+    """
+    Last log records in a bytearray allocated once, the oldest records are
+    overwritten by the new ones. Kept in RAM so that what happened before a
+    problem can be dumped afterwards, even if nobody was reading the console.
+    """
+
+    def __init__(self, size: int = 4096, clock=None) -> None:
+        """
+        Args:
+            size: int, size of the buffer in bytes
+            clock: function returning the current time in nanoseconds
+        """
+
+        self.clock = clock if clock else time.monotonic_ns
+        self._buffer = bytearray(size)
+        self._header = bytearray(RECORD_HEADER)
+
+        # Offset of the oldest record, offset of the next write, bytes in use
+        self._start = 0
+        self._end = 0
+        self._used = 0
+        self.overwritten = 0
+
+    def write(self, level: int, message: str) -> None:
+        """Adds a record, dropping the oldest ones to make room."""
+
+        data = message.encode("utf-8")[:MESSAGE_MAX]
+        length = RECORD_HEADER + len(data)
+        size = len(self._buffer)
+        if length > size:
+            return
+
+        while size - self._used < length:
+            self._drop()
+
+        ms = (self.clock() // 1000000) & 0xFFFFFFFF
+        header = self._header
+        header[0] = ms >> 24
+        header[1] = (ms >> 16) & 0xFF
+        header[2] = (ms >> 8) & 0xFF
+        header[3] = ms & 0xFF
+        header[4] = level
+        header[5] = len(data)
+        self._put(header)
+        self._put(data)
+        self._used += length
+
+    def records(self):
+        """
+        Records from the oldest to the newest.
+
+        Args:
+            None
+        Returns:
+            list of tuples, milliseconds, level and message of each record
+        """
+
+        records = []
+        pos = self._start
+        left = self._used
+        while left:
+            header = self._get(pos, RECORD_HEADER)
+            ms = (header[0] << 24) | (header[1] << 16) | (header[2] << 8) | header[3]
+            length = header[5]
+            message = self._get(pos + RECORD_HEADER, length).decode("utf-8", "replace")
+            records.append((ms, header[4], message))
+
+            pos = (pos + RECORD_HEADER + length) % len(self._buffer)
+            left -= RECORD_HEADER + length
+
+        return records
+
+    def dump(self) -> str:
+        """
+        Records as text, one line each: '<seconds> <level> <message>'.
+
+        Args:
+            None
+        Returns:
+            str, the records, oldest first
+        """
+
+        lines = [f'{ms / 1000:.3f} {LEVEL_NAMES.get(level, level)} {message}'
+                 for ms, level, message in self.records()]
+        if self.overwritten:
+            lines.insert(0, f'({self.overwritten} older records overwritten)')
+
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        """Removes all the records."""
+
+        self._start = 0
+        self._end = 0
+        self._used = 0
+        self.overwritten = 0
+
+    def _drop(self) -> None:
+        """Removes the oldest record."""
+
+        length = RECORD_HEADER + self._buffer[(self._start + 5) % len(self._buffer)]
+        self._start = (self._start + length) % len(self._buffer)
+        self._used -= length
+        self.overwritten += 1
+
+    def _put(self, data) -> None:
+        """Writes bytes at the end, wrapping around."""
+
+        size = len(self._buffer)
+        first = min(len(data), size - self._end)
+        self._buffer[self._end:self._end + first] = data[:first]
+        self._buffer[0:len(data) - first] = data[first:]
+        self._end = (self._end + len(data)) % size
+
+    def _get(self, pos: int, length: int) -> bytes:
+        """Reads bytes from an offset, wrapping around."""
+
+        pos %= len(self._buffer)
+        first = min(length, len(self._buffer) - pos)
+        return bytes(self._buffer[pos:pos + first]) + bytes(self._buffer[0:length - first])
+
+
+class Logger:
+    """
+    Logger of a module. Messages below its level are discarded before being
+    formatted: pass the values as arguments, '%' formatting is only done if
+    the message is logged, e.g. logger.debug('RFID: read id %08x', uid).
+    Logged messages go to the console and to the ring buffer.
+    """
+
+    def __init__(self, name: str, level: int, console, ring) -> None:
+        """
+        Args:
+            name: str, name of the module, as in LOG_LEVELS
+            level: int, lowest level logged
+            console: adafruit_logging.Logger, None for no console output
+            ring: RingBuffer, None for none
+        """
+
+        self.name = name
+        self.level = level
+        self.console = console
+        self.ring = ring
+
+    def enabled(self, level: int) -> bool:
+        """Whether messages of a level are logged, to skip building costly ones."""
+
+        return level >= self.level
+
+    def log(self, level: int, message: str, *args) -> None:
+        """Logs a message, formatted with the arguments only if logged."""
+
+        if level < self.level:
+            return
+
+        if args:
+            message = message % args
+        if self.console is not None:
+            self.console.log(level, message)
+        if self.ring is not None:
+            self.ring.write(level, message)
+
+    def debug(self, message: str, *args) -> None:
+        if self.level <= DEBUG:
+            self.log(DEBUG, message, *args)
+
+    def info(self, message: str, *args) -> None:
+        if self.level <= INFO:
+            self.log(INFO, message, *args)
+
+    def warning(self, message: str, *args) -> None:
+        self.log(WARNING, message, *args)
+
+    def error(self, message: str, *args) -> None:
+        self.log(ERROR, message, *args)
+
+    def critical(self, message: str, *args) -> None:
+        self.log(CRITICAL, message, *args)
+
+
+def _parse_levels(text):
+    """Levels by module from 'name=LEVEL,...', as in LOG_LEVELS."""
+
+    levels = {}
+    for item in (text or "").split(","):
+        name, _, level = item.partition("=")
+        if level.strip().upper() in LEVELS:
+            levels[name.strip()] = LEVELS[level.strip().upper()]
+
+    return levels
+
+
+# Levels from settings.toml: LOG_LEVEL for all modules (INFO by default) and
+# LOG_LEVELS to override it by module, e.g. "link=DEBUG,state=WARNING".
+# LOG_CONSOLE = 0 keeps the logs in the ring buffer only.
+DEFAULT_LEVEL = LEVELS.get(str(os.getenv("LOG_LEVEL", "INFO")).upper(), INFO)
+MODULE_LEVELS = _parse_levels(os.getenv("LOG_LEVELS"))
+
+_console = None
+if str(os.getenv("LOG_CONSOLE", "1")) != "0":
+    _console = logging.getLogger("root")
+    _console.setLevel(logging.DEBUG)
+
+# Last log records of all modules, see RingBuffer.dump()
+ring = RingBuffer()
+
+
+def get_logger(name: str) -> Logger:
+    """
+    Logger of a module, with the level set for it in LOG_LEVELS if any.
+
+    Args:
+        name: str, name of the module, e.g. 'link'
+    Returns:
+        Logger
+    """
+
+    return Logger(name, MODULE_LEVELS.get(name, DEFAULT_LEVEL), _console, ring)
+
 
-# Logger object to be used in all modules
-logger = logging.getLogger("root")
-logger.setLevel(logging.DEBUG)
+# Logger object to be used in all modules without their own
+logger = get_logger("root")
@@ -0,0 +1,153 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+from src.logger import get_logger
+from src.schedule import MUST_STAY_IN, MUST_STAY_OUT
+
+logger = get_logger("pets")
+
+# Pet used when no pets file is found
+DEFAULT_PET = (0xd951c359, "Dog")
+
+
+class Pet:
+    """A pet allowed through the door and its status."""
+
+    def __init__(self, uid: int, name: str, overrides=None, limits=None) -> None:
+        """
+        Args:
+            uid: int, UID of the pet's RFID tag packed in 4 bytes
+            name: str, name used in notifications
+            overrides: dict, maps a scheduled state to the state applied to
+                this pet instead
+            limits: tuple, lowest and highest temperature for this pet to go
+                out instead of the policy ones, see OutdoorPolicy
+        """
+
+        self.uid = uid
+        self.name = name
+        self.overrides = overrides if overrides else {}
+        self.limits = limits
+        self.inside = True
+        self.status_changes = 0
+
+    def state(self, state: int) -> int:
+        """
+        Args:
+            state: int, scheduled state
+        Returns:
+            int, state applied to this pet
+        """
+
+        return self.overrides.get(state, state)
+
+
+def _parse_pet(fields) -> Pet:
+    """
+    Pet of a line of the pets file, see PetRegistry.from_file().
+
+    Args:
+        fields: list of str, fields of the line
+    Returns:
+        Pet
+    Raises:
+        ValueError, IndexError: if the line is not valid
+    """
+
+    overrides = {}
+    limits = None
+    for override in fields[2:]:
+        if ".." in override:
+            low, high = override.split("..")
+            limits = (float(low), float(high))
+        else:
+            scheduled, applied = override.split(":")
+            scheduled, applied = int(scheduled), int(applied)
+
+            # States are indexes of StateMachine.states
+            for state in (scheduled, applied):
+                if not MUST_STAY_IN <= state <= MUST_STAY_OUT:
+                    raise ValueError(f"unknown state {state}")
+            overrides[scheduled] = applied
+
+    return Pet(int(fields[0], 16), fields[1], overrides, limits)
+
+
+class PetRegistry:
+    """Pets known by the door, looked up by the UID of their tag."""
+
+    def __init__(self, pets=None) -> None:
+        self.pets = {}
+        for pet in pets if pets else []:
+            self.pets[pet.uid] = pet
+
+    @classmethod
+    def from_file(cls, path: str):
+        """
+        Loads the pets from a file on flash, one pet per line:
+        '<uid in hex> <name> [<state>:<state> ...] [<low>..<high>]', e.g.
+        'd951c359 Fido 3:1 -5..28' for a pet handled as free to go in and out
+        when the others must stay out, and going out between -5 and 28
+        Celsius. Lines starting with '#' are skipped, and so are invalid
+        lines, e.g. with a state which does not exist. If the file can't be
+        read, only the default pet is known.
+
+        Args:
+            path: str, path of the file
+        Returns:
+            PetRegistry
+        """
+
+        pets = []
+        try:
+            with open(path) as pets_file:
+                for number, line in enumerate(pets_file, 1):
+                    fields = line.split()
+                    if not fields or fields[0].startswith("#"):
+                        continue
+
+                    try:
+                        pets.append(_parse_pet(fields))
+                    except (ValueError, IndexError) as error:
+                        logger.error('Pets: %s:%d skipped (%s)', path, number, error)
+        except OSError as error:
+            logger.error('Pets: could not load %s (%s), using default pet', path, error)
+            pets = [Pet(*DEFAULT_PET)]
+
+        logger.info('Pets: %d known', len(pets))
+        return cls(pets)
+
+    def get(self, uid: int):
+        """
+        Args:
+            uid: int, UID of a tag packed in 4 bytes
+        Returns:
+            Pet, the pet owning the tag, or None if the tag is unknown
+        """
+
+        return self.pets.get(uid)
+
+    def reset_status_changes(self) -> None:
+        """Resets the status changes of all pets, called when a state is entered."""
+
+        for pet in self.pets.values():
+            pet.status_changes = 0
+
+    def __iter__(self):
+        return iter(self.pets.values())
+
+    def __len__(self) -> int:
+        return len(self.pets)
@@ -0,0 +1,289 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+import time
+
+from src.logger import get_logger
+
+logger = get_logger("policy")
+
+# Rule used when no policy file is found: weather groups of OpenWeatherMap in
+# which pets can go out, and temperatures in Celsius out of which they can't
+DEFAULT_WEATHER = ("Clear", "Clouds", "Drizzle")
+DEFAULT_LOW = 5.0
+DEFAULT_HIGH = 32.0
+
+# Degrees a temperature out of the limits must come back within them by
+DEFAULT_HYSTERESIS = 1.0
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class Rule:
+    """
+    Compiled outdoor rule: weather groups allowed, as a frozenset, and
+    temperature limits. Whether the temperature is within the limits is
+    updated on every sample, with hysteresis once it is known, and the verdict
+    is cached until the weather or that changes.
+    """
+
+    def __init__(self, weather, low: float, high: float, hysteresis: float) -> None:
+        """
+        Args:
+            weather: iterable of str, weather groups in which pets can go out
+            low: float, temperature at or below which it is too cold
+            high: float, temperature at or above which it is too hot
+            hysteresis: float, degrees to come back within the limits by
+        """
+
+        self.weather = frozenset(weather)
+        self.low = low
+        self.high = high
+        self.hysteresis = hysteresis
+
+        # Whether the temperature is within the limits, None until a sample
+        # tells
+        self.temperature_ok = None
+
+        # Weather of the cached verdict, and whether the verdict is valid
+        self._seen = None
+        self._verdict = False
+        self._valid = False
+
+    def update(self, temperature: float) -> None:
+        """
+        Takes a new temperature. Coming back within the limits takes the
+        hysteresis, except for the first sample, and a temperature which is not
+        a number makes it unknown again.
+
+        Args:
+            temperature: float, Celsius
+        Returns:
+            None
+        """
+
+        if temperature != temperature:
+            temperature_ok = None
+        else:
+            margin = self.hysteresis if self.temperature_ok is False else 0
+            temperature_ok = self.low + margin < temperature < self.high - margin
+        if temperature_ok != self.temperature_ok:
+            self.temperature_ok = temperature_ok
+            self._valid = False
+
+    def allows(self, weather) -> bool:
+        """
+        Args:
+            weather: str, current weather group, None if unknown
+        Returns:
+            bool, whether pets can go out
+        """
+
+        if not self._valid or weather != self._seen:
+            self._seen = weather
+            self._verdict = self.temperature_ok is True and weather in self.weather
+            self._valid = True
+
+        return self._verdict
+
+
+class OutdoorPolicy:
+    """
+    Decides whether pets can go out, from the weather and the temperature.
+    The rules are compiled once: a default rule, overridden for some months
+    (seasons) and, for pets with their own temperature limits, for some pets.
+    can_go_out() only looks up the rule of the month and the pet and returns
+    its cached verdict.
+    """
+
+    def __init__(self, weather=DEFAULT_WEATHER, low: float = DEFAULT_LOW,
+                 high: float = DEFAULT_HIGH, hysteresis: float = DEFAULT_HYSTERESIS,
+                 seasons=None) -> None:
+        """
+        Args:
+            weather: iterable of str, weather groups in which pets can go out
+            low: float, temperature at or below which it is too cold
+            high: float, temperature at or above which it is too hot
+            hysteresis: float, degrees to come back within the limits by
+            seasons: list of (first month, last month, weather, low, high)
+                tuples overriding the default rule from the first to the last
+                month (1 to 12, wrapping around the year), None values keep
+                the default
+        """
+
+        self.weather = tuple(weather)
+        self.low = low
+        self.high = high
+        self.hysteresis = hysteresis
+        self.seasons = seasons if seasons else []
+
+        # Current month, refreshed when the day changes, see update()
+        self.month = 1
+        self._day = None
+
+        self.compile()
+
+    @classmethod
+    def from_file(cls, path: str):
+        """
+        Loads the policy from a file on flash, one setting per line:
+        'weather <group> ...', 'temperature <low> <high>', 'hysteresis
+        <degrees>', or 'season <first month>-<last month>' followed by a
+        weather or temperature setting for those months. Lines starting with
+        '#' are skipped. If the file can't be read, the default policy is used.
+
+        Args:
+            path: str, path of the file
+        Returns:
+            OutdoorPolicy
+        """
+
+        settings = {}
+        seasons = []
+        try:
+            with open(path) as policy_file:
+                for line in policy_file:
+                    fields = line.split()
+                    if not fields or fields[0].startswith("#"):
+                        continue
+
+                    if fields[0] == "season":
+                        first, last = fields[1].split("-")
+                        season = _setting(fields[2:], {})
+                        seasons.append((int(first), int(last), season.get("weather"),
+                                        season.get("low"), season.get("high")))
+                    else:
+                        _setting(fields, settings)
+        except (OSError, ValueError, IndexError) as error:
+            logger.error('Policy: could not load %s (%s), using default policy', path, error)
+            return cls()
+
+        return cls(seasons=seasons, **settings)
+
+    def compile(self, pets=()) -> None:
+        """
+        Builds the rules of each month, and of each month for the pets with
+        their own limits. Must be called again whenever the settings or the
+        pets change.
+
+        Args:
+            pets: iterable of Pet
+        Returns:
+            None
+        """
+
+        # Equal rules are shared, so each is updated once per sample
+        rules = {}
+
+        def rule(weather, low, high):
+            key = (weather, low, high)
+            if key not in rules:
+                rules[key] = Rule(weather, low, high, self.hysteresis)
+            return rules[key]
+
+        # Weather and rule of each month, index 0 is unused
+        weathers = [None] * 13
+        months = [None] * 13
+        for month in range(1, 13):
+            weather, low, high = self.weather, self.low, self.high
+            for first, last, season_weather, season_low, season_high in self.seasons:
+                if _in_season(month, first, last):
+                    weather = tuple(season_weather) if season_weather else weather
+                    low = low if season_low is None else season_low
+                    high = high if season_high is None else season_high
+            weathers[month] = weather
+            months[month] = rule(weather, low, high)
+
+        # Pets with their own temperature limits keep the weather of the month
+        self._pets = {}
+        for pet in pets:
+            if pet.limits:
+                self._pets[pet.uid] = [None] + [rule(weathers[month], *pet.limits)
+                                                for month in range(1, 13)]
+
+        self._months = months
+        self._rules = tuple(rules.values())
+
+    @property
+    def limits(self) -> tuple:
+        """All the temperature limits in force, sorted."""
+
+        limits = set()
+        for rule in self._rules:
+            limits.add(rule.low)
+            limits.add(rule.high)
+
+        return tuple(sorted(limits))
+
+    def update(self, temperature: float, epoch: int) -> None:
+        """
+        Takes a new temperature sample, called after each one.
+
+        Args:
+            temperature: float, smoothed temperature
+            epoch: int, current time in epoch seconds, local time
+        Returns:
+            None
+        """
+
+        day = epoch // SECONDS_PER_DAY
+        if day != self._day:
+            self._day = day
+            self.month = time.localtime(epoch)[1]
+
+        for rule in self._rules:
+            rule.update(temperature)
+
+    def can_go_out(self, weather, pet=None) -> bool:
+        """
+        Args:
+            weather: str, current weather group, None if unknown
+            pet: Pet, pet asking, None for the default rule
+        Returns:
+            bool, whether the pet can go out
+        """
+
+        months = self._months
+        if pet is not None:
+            months = self._pets.get(pet.uid, months)
+
+        return months[self.month].allows(weather)
+
+
+def _setting(fields, settings: dict) -> dict:
+    """Parses a 'weather' or 'temperature' or 'hysteresis' setting into 'settings'."""
+
+    if fields[0] == "weather":
+        settings["weather"] = tuple(fields[1:])
+    elif fields[0] == "temperature":
+        settings["low"] = float(fields[1])
+        settings["high"] = float(fields[2])
+    elif fields[0] == "hysteresis":
+        settings["hysteresis"] = float(fields[1])
+    else:
+        raise ValueError(f"unknown setting {fields[0]}")
+
+    return settings
+
+
+def _in_season(month: int, first: int, last: int) -> bool:
+    """Whether a month is between the first and last month of a season, which
+    may wrap around the year, e.g. 12-2."""
+
+    if first <= last:
+        return first <= month <= last
+
+    return month >= first or month <= last
@@ -0,0 +1,76 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+
+class RFIDReader:
+    """
+    Polls the RFID reader at a fixed interval without blocking. The last card
+    seen is remembered and the same card is not reported again while it keeps
+    being read within the debounce window.
+    """
+
+    def __init__(self, rfid, interval: float = 0.05, debounce: float = 3.0) -> None:
+        """
+        Args:
+            rfid: mfrc522.MFRC522
+            interval: float, seconds between two polls of the reader
+            debounce: float, seconds during which the same card is not reported
+                again
+        """
+
+        self.rfid = rfid
+        self.interval = interval
+        self.debounce = debounce
+
+        self.last_uid = None
+        self.last_seen = None
+        self._next_poll = None
+
+    def poll(self, now: float):
+        """
+        Polls the reader if a poll is due.
+
+        Args:
+            now: float, current time in seconds
+        Returns:
+            int, UID of a newly presented card packed in 4 bytes, else None
+        """
+
+        # Polls a little early are accepted, so that timing jitter doesn't make
+        # the reader skip polls
+        if self._next_poll is not None and now < self._next_poll:
+            return None
+        self._next_poll = now + self.interval * 0.9
+
+        # Check for a card
+        (status, _) = self.rfid.request(self.rfid.REQALL)
+        if status != self.rfid.OK:
+            return None
+
+        # Card detected, read its id
+        (status, raw_uid) = self.rfid.anticoll()
+        if status != self.rfid.OK:
+            return None
+
+        uid = (raw_uid[0] << 24) | (raw_uid[1] << 16) | (raw_uid[2] << 8) | raw_uid[3]
+
+        # Same card still in front of the reader
+        repeated = (uid == self.last_uid and
+                    now - self.last_seen < self.debounce)
+        self.last_uid = uid
+        self.last_seen = now
+
+        return None if repeated else uid
@@ -0,0 +1,148 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+from array import array
+
+# States, same order as StateMachine.states
+MUST_STAY_IN = 0
+FREE_IN_OUT = 1
+EATING = 2
+MUST_STAY_OUT = 3
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def seconds_of_day(epoch: int) -> int:
+    """
+    Args:
+        epoch: int, timestamp in epoch seconds, local time
+    Returns:
+        int, seconds since midnight
+    """
+
+    return epoch % SECONDS_PER_DAY
+
+
+def format_seconds(seconds: int) -> str:
+    """Seconds since midnight as 'HH:MM:SS', for the logs."""
+
+    minutes, seconds = divmod(seconds, 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:{seconds:02d}"
+
+
+class Schedule:
+    """
+    Daily schedule of the states. It is compiled into a sorted array of
+    boundaries (seconds since midnight) and the state starting at each of them,
+    so finding the current state is a binary search.
+    """
+
+    def __init__(self,
+                 breakfast: int = 9 * 3600,
+                 lunch: int = 13 * 3600,
+                 dinner: int = 20 * 3600,
+                 meal_duration: int = 30 * 60) -> None:
+        """
+        Args:
+            breakfast: int, start of breakfast in seconds since midnight
+            lunch: int, start of lunch in seconds since midnight
+            dinner: int, start of dinner in seconds since midnight
+            meal_duration: int, duration of a meal in seconds
+        """
+
+        self.breakfast = breakfast
+        self.lunch = lunch
+        self.dinner = dinner
+        self.meal_duration = meal_duration
+
+        self._starts = array("l")
+        self._states = b""
+
+    def compile(self, sunrise: int, sunset: int) -> None:
+        """
+        Builds the boundaries table. Must be called again whenever sunrise or
+        sunset change. Boundaries at the same time keep the state of the later
+        one in the day, e.g. a sunset after dinner gives no free time.
+
+        Args:
+            sunrise: int, sunrise in seconds since midnight
+            sunset: int, sunset in seconds since midnight
+        Returns:
+            None
+        """
+
+        meal = self.meal_duration
+
+        # Meals take precedence: pets stay in until breakfast however late the
+        # sun rises, the free time after sunset is over at dinner, and the
+        # afternoon outside lasts at least until the end of lunch
+        sunrise = min(sunrise, self.breakfast)
+        sunset = max(self.lunch + meal, min(sunset, self.dinner))
+
+        boundaries = sorted([
+            (0, MUST_STAY_IN),
+            (sunrise, FREE_IN_OUT),
+            (self.breakfast, EATING),
+            (self.breakfast + meal, MUST_STAY_OUT),
+            (self.lunch, EATING),
+            (self.lunch + meal, MUST_STAY_OUT),
+            (sunset, FREE_IN_OUT),
+            (self.dinner, EATING),
+            (self.dinner + meal, MUST_STAY_IN),
+        ], key=lambda boundary: boundary[0])
+
+        self._starts = array("l", [start for start, _ in boundaries])
+        self._states = bytes([state for _, state in boundaries])
+
+    def _index(self, seconds: int) -> int:
+        """Index of the last boundary not after 'seconds'."""
+
+        starts = self._starts
+        low = 0
+        high = len(starts)
+        while low < high:
+            middle = (low + high) // 2
+            if seconds < starts[middle]:
+                high = middle
+            else:
+                low = middle + 1
+
+        return low - 1
+
+    def state_at(self, seconds: int) -> int:
+        """
+        Args:
+            seconds: int, seconds since midnight
+        Returns:
+            int, state scheduled at the given time
+        """
+
+        return self._states[self._index(seconds)]
+
+    def next_transition(self, seconds: int) -> int:
+        """
+        Args:
+            seconds: int, seconds since midnight
+        Returns:
+            int, seconds since midnight of the next boundary, SECONDS_PER_DAY
+            if there are no more boundaries today
+        """
+
+        index = self._index(seconds) + 1
+        if index < len(self._starts):
+            return self._starts[index]
+
+        return SECONDS_PER_DAY
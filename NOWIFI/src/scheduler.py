@@ -0,0 +1,148 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+import time as py_time
+
+from src.telemetry import telemetry
+
+
+class Scheduler:
+    """
+    Cooperative scheduler. A task is a generator which yields the number of
+    seconds to wait before it is resumed. Plain functions can be run
+    periodically with every(). Time is read from 'clock' and the scheduler waits
+    with 'sleep', so a simulated clock can be used in place of the real one.
+    """
+
+    def __init__(self, clock=None, sleep=None) -> None:
+        self.clock = clock if clock else py_time.monotonic
+        self.sleep = sleep if sleep else py_time.sleep
+
+        # Each task is [due time, generator], generator is None once cancelled
+        self._tasks = []
+        self._cancelled = False
+
+    def spawn(self, task, delay: float = 0):
+        """
+        Adds a generator task, first run after 'delay' seconds.
+
+        Args:
+            task: generator, yields seconds to wait before being resumed
+            delay: float, seconds to wait before the first run
+        Returns:
+            generator, the task itself, can be passed to cancel()
+        """
+
+        self._tasks.append([self.clock() + delay, task])
+        return task
+
+    def every(self, period: float, func, delay: float = 0):
+        """
+        Calls 'func' every 'period' seconds.
+
+        Args:
+            period: float, seconds between two calls
+            func: function without arguments
+            delay: float, seconds to wait before the first call
+        Returns:
+            generator, the task, can be passed to cancel()
+        """
+
+        return self.spawn(self._periodic(period, func), delay)
+
+    def cancel(self, task) -> None:
+        """Removes a task, it will not be resumed anymore."""
+
+        for entry in self._tasks:
+            if entry[1] is task:
+                entry[1] = None
+                self._cancelled = True
+
+    def run_once(self) -> float:
+        """
+        Resumes every task which is due.
+
+        Args:
+            None
+        Returns:
+            float, seconds until the next task is due
+        """
+
+        now = self.clock()
+
+        # Tasks spawned while running are only considered on the next run
+        for i in range(len(self._tasks)):
+            entry = self._tasks[i]
+            if entry[1] is None or entry[0] > now:
+                continue
+
+            try:
+                delay = next(entry[1])
+            except StopIteration:
+                entry[1] = None
+                self._cancelled = True
+                continue
+
+            entry[0] = self.clock() + (delay if delay else 0)
+
+        # Drop finished and cancelled tasks
+        if self._cancelled:
+            self._tasks = [entry for entry in self._tasks if entry[1] is not None]
+            self._cancelled = False
+
+        if not self._tasks:
+            return 0
+
+        # Plain loop, a generator expression would allocate on every run
+        due = self._tasks[0][0]
+        for entry in self._tasks:
+            if entry[0] < due:
+                due = entry[0]
+
+        return max(0, due - self.clock())
+
+    def run(self, duration: float = None) -> None:
+        """
+        Runs the tasks, sleeping while none of them is due.
+
+        Args:
+            duration: float, seconds after which to return, forever if None
+        Returns:
+            None
+        """
+
+        end = None if duration is None else self.clock() + duration
+
+        while self._tasks:
+            started = telemetry.start()
+            wait = self.run_once()
+            telemetry.stop("loop", started)
+
+            if end is not None:
+                left = end - self.clock()
+                if left <= 0:
+                    return
+                wait = min(wait, left)
+
+            if wait > 0:
+                self.sleep(wait)
+
+    def _periodic(self, period: float, func):
+        """Task calling 'func' every 'period' seconds."""
+
+        while True:
+            func()
+            yield period
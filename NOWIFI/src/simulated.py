@@ -0,0 +1,522 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Stand-ins for the hardware, used to run the code on a normal computer. Nothing
+# in here depends on CircuitPython modules.
+
+import random
+import time
+
+from src.codec import AsciiCodec
+
+
+class FakeUART:
+    """
+    Stand-in for busio.UART. Bytes given to feed() are returned by the read
+    methods split exactly as they were fed, bytes written are kept in 'tx'
+    unless 'keep' is False.
+    """
+
+    def __init__(self, keep: bool = True) -> None:
+        self._chunks = []
+        self.keep = keep
+        self.tx = bytearray()
+
+    def feed(self, data) -> None:
+        """Queues a chunk of bytes to be received."""
+
+        if data:
+            self._chunks.append(bytearray(data))
+
+    @property
+    def in_waiting(self) -> int:
+        """Bytes available in the next chunk."""
+
+        return len(self._chunks[0]) if self._chunks else 0
+
+    def readinto(self, buf):
+        """Reads at most len(buf) bytes of the next chunk into buf."""
+
+        if not self._chunks:
+            return None
+
+        chunk = self._chunks[0]
+        read = min(len(buf), len(chunk))
+        buf[:read] = chunk[:read]
+        del chunk[:read]
+        if not chunk:
+            self._chunks.pop(0)
+
+        return read
+
+    def read(self, nbytes: int = 1):
+        """Reads at most nbytes bytes of the next chunk."""
+
+        buf = bytearray(nbytes)
+        read = self.readinto(buf)
+        return bytes(buf[:read]) if read else None
+
+    def write(self, buf) -> int:
+        """Keeps the written bytes in 'tx'."""
+
+        if self.keep:
+            self.tx.extend(buf)
+        return len(buf)
+
+    def reset_input_buffer(self) -> None:
+        """Discards all bytes not yet read."""
+
+        self._chunks = []
+
+
+class LoopbackUART:
+    """
+    One end of an in-process UART link, see loopback_pair(). Bytes written to
+    one end are received by the other one 'delay' seconds later, as read from
+    'clock'. Each write is lost as a whole with probability 'loss', which for
+    the boards means a lost frame. Like a real UART, at most 'buffer_size'
+    received bytes wait to be read, the ones arriving when it is full are lost.
+    """
+
+    def __init__(self, clock, delay: float = 0.0, loss: float = 0.0,
+                 seed: int = 0, buffer_size: int = 64) -> None:
+        self.clock = clock
+        self.delay = delay
+        self.loss = loss
+        self.buffer_size = buffer_size
+        self.peer = None
+        self.lost = 0
+        self.overflowed = 0
+        self._random = random.Random(seed)
+
+        # Chunks on their way to this end, each [arrival time, bytes], and
+        # bytes arrived and not read yet
+        self._incoming = []
+        self._buffer = bytearray()
+
+    def _receive(self) -> None:
+        """Moves the chunks arrived into the buffer, dropping what doesn't fit."""
+
+        now = self.clock()
+        while self._incoming and self._incoming[0][0] <= now:
+            data = self._incoming.pop(0)[1]
+            room = self.buffer_size - len(self._buffer)
+            if len(data) > room:
+                self.overflowed += len(data) - room
+                data = data[:room]
+            self._buffer.extend(data)
+
+    @property
+    def in_waiting(self) -> int:
+        """Bytes arrived and not read yet."""
+
+        self._receive()
+        return len(self._buffer)
+
+    def readinto(self, buf):
+        """Reads at most len(buf) arrived bytes into buf."""
+
+        self._receive()
+        read = min(len(buf), len(self._buffer))
+        buf[:read] = self._buffer[:read]
+        del self._buffer[:read]
+
+        return read if read else None
+
+    def read(self, nbytes: int = 1):
+        """Reads at most nbytes arrived bytes."""
+
+        buf = bytearray(nbytes)
+        read = self.readinto(buf)
+        return bytes(buf[:read]) if read else None
+
+    def write(self, buf) -> int:
+        """Sends bytes to the other end, unless they get lost."""
+
+        if self._random.random() < self.loss:
+            self.lost += 1
+        else:
+            self.peer._incoming.append([self.clock() + self.delay, bytearray(buf)])
+        return len(buf)
+
+    def reset_input_buffer(self) -> None:
+        """Discards all bytes not yet read, including those on their way."""
+
+        self._incoming = []
+        self._buffer = bytearray()
+
+
+def loopback_pair(clock, delay: float = 0.0, loss: float = 0.0, seed: int = 0,
+                  buffer_size: int = 64):
+    """
+    Two connected LoopbackUART ends, what one writes the other reads.
+
+    Args:
+        clock: function returning the current time in seconds
+        delay: float, seconds taken by bytes to reach the other end
+        loss: float, probability of a write being lost, between 0 and 1
+        seed: int, seed of the losses, runs with the same seed lose the same
+            writes
+        buffer_size: int, bytes each end keeps until they are read, see
+            receiver_buffer_size of busio.UART
+    Returns:
+        tuple of two LoopbackUART
+    """
+
+    first = LoopbackUART(clock, delay, loss, seed, buffer_size)
+    second = LoopbackUART(clock, delay, loss, seed + 1, buffer_size)
+    first.peer = second
+    second.peer = first
+    return first, second
+
+
+class SimClock:
+    """
+    Simulated monotonic clock. Time only moves forward when sleep() is called, so
+    runs are deterministic and faster than real time.
+    """
+
+    def __init__(self, start: float = 0.0) -> None:
+        self.now = start
+
+    def monotonic(self) -> float:
+        """Current simulated time in seconds."""
+
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        """Moves the simulated time forward instead of waiting."""
+
+        self.now += seconds
+
+
+class TraceADC:
+    """
+    Stand-in for analogio.AnalogIn replaying recorded values. Each read of
+    'value' returns the next value of the trace. Once the trace is over the
+    last value is repeated, or the trace starts over if 'loop' is True.
+    """
+
+    def __init__(self, values, loop: bool = False) -> None:
+        self.values = values
+        self.loop = loop
+        self._index = 0
+
+    @classmethod
+    def from_file(cls, path: str, loop: bool = False):
+        """Loads a trace file, one value per line. Lines starting with '#' are skipped."""
+
+        with open(path) as trace:
+            return cls([int(line) for line in trace
+                        if line.strip() and not line.startswith("#")], loop)
+
+    @property
+    def value(self) -> int:
+        """Next value of the trace."""
+
+        value = self.values[self._index]
+        if self._index < len(self.values) - 1:
+            self._index += 1
+        elif self.loop:
+            self._index = 0
+        return value
+
+
+class ScriptedADC:
+    """
+    Stand-in for analogio.AnalogIn of the flex sensor driven by a script: the
+    door is pushed between start and end seconds of each (start, end) tuple,
+    as read from 'clock'.
+    """
+
+    def __init__(self, clock, pushes=None, idle: int = 0, pushed: int = 700) -> None:
+        self.clock = clock
+        self.pushes = pushes if pushes else []
+        self.idle = idle
+        self.pushed = pushed
+
+    @property
+    def value(self) -> int:
+        """Reading at the current time."""
+
+        now = self.clock()
+        for start, end in self.pushes:
+            if start <= now < end:
+                return self.pushed
+        return self.idle
+
+
+def replay_door_trace(sensor, duration: float = None):
+    """
+    Feeds a door sensor reading from a TraceADC at the sensor rate.
+
+    Args:
+        sensor: DoorSensor, its adc must be a TraceADC
+        duration: float, seconds to replay, the whole trace if None
+    Returns:
+        list of (time, event) tuples, one per event reported
+    """
+
+    samples = len(sensor.adc.values)
+    if duration is not None:
+        samples = int(duration / sensor.period)
+
+    events = []
+    for i in range(samples):
+        now = i * sensor.period
+        event = sensor.sample(now)
+        if event:
+            events.append((now, event))
+
+    return events
+
+
+class FakeMFRC522:
+    """
+    Stand-in for mfrc522.MFRC522. Cards are scripted as (start, end, uid)
+    tuples, a card is in front of the reader between start and end seconds as
+    read from 'clock'. Calls are counted to measure the traffic on the bus.
+    """
+
+    OK = 0
+    NOTAGERR = 1
+    ERR = 2
+
+    REQIDL = 0x26
+    REQALL = 0x52
+
+    def __init__(self, clock, cards=None) -> None:
+        self.clock = clock
+        self.cards = cards if cards else []
+        self.requests = 0
+        self.reads = 0
+
+    def _card(self):
+        """UID of the card currently in front of the reader, or None."""
+
+        now = self.clock()
+        for start, end, uid in self.cards:
+            if start <= now < end:
+                return uid
+        return None
+
+    def set_antenna_gain(self, gain: int) -> None:
+        """Does nothing, the gain has no effect on scripted cards."""
+
+        pass
+
+    def request(self, mode: int):
+        """Checks for a card in front of the reader."""
+
+        self.requests += 1
+        if self._card() is None:
+            return (self.NOTAGERR, None)
+        return (self.OK, 0x10)
+
+    def anticoll(self):
+        """Reads the UID of the card, followed by its check byte."""
+
+        self.reads += 1
+        uid = self._card()
+        if uid is None:
+            return (self.ERR, [])
+
+        raw_uid = [(uid >> 24) & 0xff, (uid >> 16) & 0xff, (uid >> 8) & 0xff, uid & 0xff]
+        raw_uid.append(raw_uid[0] ^ raw_uid[1] ^ raw_uid[2] ^ raw_uid[3])
+        return (self.OK, raw_uid)
+
+
+class FakePixels:
+    """Stand-in for neopixel.NeoPixel, counts the writes to the strip."""
+
+    def __init__(self, n: int = 26) -> None:
+        self.n = n
+        self.color = None
+        self.shows = 0
+
+    def fill(self, color) -> None:
+        """Sets the color of all LEDs."""
+
+        self.color = color
+
+    def show(self) -> None:
+        """Counts a write to the strip."""
+
+        self.shows += 1
+
+
+class FakeServo:
+    """
+    Stand-in for adafruit_motor.servo.Servo, counts the moves and calls
+    'on_move' with the new angle, if given.
+    """
+
+    def __init__(self, angle: float = 0, on_move=None) -> None:
+        self._angle = angle
+        self.on_move = on_move
+        self.moves = 0
+
+    @property
+    def angle(self) -> float:
+        """Last angle set."""
+
+        return self._angle
+
+    @angle.setter
+    def angle(self, angle: float) -> None:
+        self._angle = angle
+        self.moves += 1
+        if self.on_move:
+            self.on_move(angle)
+
+
+# Repeatability of the SHT4x in Celsius by measurement mode, keys are the
+# adafruit_sht4x.Mode values of the high, medium and low precision modes.
+# Noise is uniform within +-1.7 times it, which has the same deviation.
+SHT4X_NOISE = {0xFD: 0.04, 0xF6: 0.07, 0xE0: 0.1}
+NOISE_SPREAD = 1.7
+
+
+class FakeSHT4x:
+    """
+    Stand-in for adafruit_sht4x.SHT4x. The temperature is fixed, or follows a
+    curve of (time, temperature) points as read from 'clock', interpolated
+    linearly and held before the first and after the last point. Readings get
+    the noise of the measurement mode, none until a mode is set, and are
+    counted by mode.
+    """
+
+    def __init__(self, temperature: float = 20.0, clock=None, curve=None) -> None:
+        self.clock = clock if clock else time.monotonic
+        self.fixed = temperature
+        self.curve = curve if curve else []
+        self.mode = None
+        self.reads = {}
+
+    @property
+    def temperature(self) -> float:
+        """Reading at the current time."""
+
+        self.reads[self.mode] = self.reads.get(self.mode, 0) + 1
+        temperature = self.at(self.clock())
+        noise = SHT4X_NOISE.get(self.mode, 0) * NOISE_SPREAD
+        if noise:
+            temperature += random.uniform(-noise, noise)
+        return temperature
+
+    @temperature.setter
+    def temperature(self, value: float) -> None:
+        """Fixes the temperature from now on."""
+
+        self.fixed = value
+        self.curve = []
+
+    def ramp(self, target: float, duration: float) -> None:
+        """Moves the temperature linearly to 'target' over 'duration' seconds."""
+
+        now = self.clock()
+        self.curve = [(now, self.at(now)), (now + duration, target)]
+
+    def at(self, now: float) -> float:
+        """Temperature without noise at a time."""
+
+        curve = self.curve
+        if not curve:
+            return self.fixed
+        if now <= curve[0][0]:
+            return curve[0][1]
+
+        for (start, first), (end, last) in zip(curve, curve[1:]):
+            if now < end:
+                return first + (last - first) * (now - start) / (end - start)
+
+        return curve[-1][1]
+
+
+class InertSHT4x:
+    """Stand-in for an SHT4x that failed: the temperature is not a number."""
+
+    def __init__(self) -> None:
+        self.temperature = float("nan")
+        self.mode = None
+
+
+class FakeButton:
+    """Stand-in for adafruit_debouncer.Debouncer of a released button."""
+
+    def __init__(self) -> None:
+        self.value = True
+        self.rose = False
+        self.fell = False
+
+    def update(self) -> None:
+        """Does nothing, the button is never pressed."""
+
+        pass
+
+
+# Drivers of the simulated backend, see src.hardware.drivers_for()
+SIMULATED_DRIVERS = {
+    "pixels": lambda hw: FakePixels(),
+    "uart": lambda hw: FakeUART(keep=False),
+    "motor_in": lambda hw: FakeServo(),
+    "motor_out": lambda hw: FakeServo(),
+    "rfid": lambda hw: FakeMFRC522(time.monotonic),
+    "sht": lambda hw: FakeSHT4x(),
+    "flex": lambda hw: TraceADC([0]),
+    "debug_switch": lambda hw: FakeButton(),
+}
+
+
+def _inert_link():
+    """Link to no other board, all its requests fail."""
+
+    # Imported here, the other stand-ins don't need the logger
+    from src.link import Link
+
+    return Link(FakeUART(keep=False), AsciiCodec())
+
+
+# Stand-ins of the devices with no inert fake among the simulated drivers
+INERT_DRIVERS = {
+    "sht": lambda: InertSHT4x(),
+    "codec": lambda: AsciiCodec(),
+    "link": _inert_link,
+}
+
+
+def inert_device(name: str):
+    """
+    Stand-in for a device that failed: it never reports anything, and the
+    temperature is not a number so it is never considered good.
+
+    Args:
+        name: str, device name, see src.hardware.BOARD_DRIVERS and
+            COMMON_DRIVERS
+    Returns:
+        object, stand-in for the device
+    Raises:
+        ValueError: if there is no stand-in for a device of that name
+    """
+
+    driver = INERT_DRIVERS.get(name)
+    if driver is not None:
+        return driver()
+
+    driver = SIMULATED_DRIVERS.get(name)
+    if driver is None:
+        raise ValueError(f"no stand-in for device {name}")
+    return driver(None)
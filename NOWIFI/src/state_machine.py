@@ -16,24 +16,81 @@
 
 import time as py_time
 
-from adafruit_datetime import datetime as cpy_datetime, timedelta as cpy_timedelta
-
-from src.logger import logger
-import src.hardware as hardware
+from src.logger import get_logger
+from src.hardware import hardware
+from src.door_sensor import DoorSensor, DOOR_OPENED
+from src.gc_manager import GCManager
+from src.journal import Journal, BOOT, STATE_SWITCH, UNKNOWN_BADGE
+from src.leds import LedController
+from src.pets import PetRegistry
+from src.policy import OutdoorPolicy
+from src.rfid_reader import RFIDReader
+from src.schedule import Schedule, format_seconds, seconds_of_day
+from src.telemetry import telemetry
+from src.temperature import TemperatureService
+from src.time_service import time_service
+from src.weather_cache import WeatherCache
 from src.states.must_stay_in_state import must_stay_in_state
 from src.states.free_in_out_state import free_in_out_state
 from src.states.eating_state import eating_state
 from src.states.must_stay_out_state import must_stay_out_state
 
 
+# Seconds between two polls of the RFID reader, and seconds during which a card
+# kept in front of the reader is not read again
+RFID_POLL_INTERVAL = 0.05
+RFID_DEBOUNCE = 3
+
+# File on flash listing the pets, see PetRegistry.from_file()
+PETS_FILE = "/pets.txt"
+
+# File on flash with the weather and temperatures in which pets can go out,
+# see OutdoorPolicy.from_file()
+POLICY_FILE = "/policy.txt"
+
+# Journal of the events on flash, see Journal
+JOURNAL_FILE = "/events.bin"
+
+# Seconds after which the weather is refreshed, seconds to wait for a response
+# and seconds to wait before trying again after a failure
+WEATHER_TTL = 30 * 60
+WEATHER_TIMEOUT = 60
+WEATHER_RETRY_INTERVAL = 60
+
+# Seconds to wait for each attempt of a weather request, and attempts after the
+# first one. The other board needs a few seconds to query the API.
+WEATHER_REQUEST_TIMEOUT = 10
+WEATHER_REQUEST_RETRIES = 2
+
+# Seconds to wait for the acknowledgement of a notification request, and
+# attempts after the first one. Repeated notifications are merged by the other
+# board.
+NOTIFICATION_TIMEOUT = 1
+NOTIFICATION_RETRIES = 3
+
+# Sunrise and sunset used until the first weather data is received, in seconds
+# since midnight
+DEFAULT_SUNRISE = 7 * 3600
+DEFAULT_SUNSET = 19 * 3600
+
+# Maximum seconds between two checks of the schedule
+SCHEDULE_MAX_WAIT = 1
+
+
 class StateMachine:
     """State machine class. It is responsible for switching between states."""
 
-    dog_in = True
+    def __init__(self, clock=None):
+
+        self.logger = get_logger("state")
+        self.clock = clock if clock else py_time.monotonic
 
-    def __init__(self):
+        self.leds = LedController(hardware.pixels, self.clock)
+
+        # Known pets, and pet whose tag was read last
+        self.pets = PetRegistry.from_file(PETS_FILE)
+        self.pet = None
 
-        self.logger = logger
         self.state = 0
         self.states = [
             must_stay_in_state(self),
@@ -42,108 +99,152 @@ class StateMachine:
             must_stay_out_state(self),
         ]
 
-        self.weather, self.sunrise_date, self.sunset_date = self._get_weather()
-        self.temperature = hardware.sht.temperature
+        # Weather, refreshed in the background
+        self.weather_cache = WeatherCache(self._request_weather,
+                                          ttl=WEATHER_TTL,
+                                          timeout=WEATHER_TIMEOUT,
+                                          retry=WEATHER_RETRY_INTERVAL,
+                                          clock=self.clock)
+
+        # Rules deciding whether pets can go out, and temperature they are
+        # checked against, sampled in the background, see read_temperature()
+        self.policy = OutdoorPolicy.from_file(POLICY_FILE)
+        self.policy.compile(self.pets)
+        self.temperature_service = TemperatureService(hardware.sht,
+                                                      limits=self.policy.limits)
+        self.read_temperature()
+
+        self.door_sensor = DoorSensor(hardware.flex)
+        self.rfid_reader = RFIDReader(hardware.rfid,
+                                      interval=RFID_POLL_INTERVAL,
+                                      debounce=RFID_DEBOUNCE)
+
+        # Events kept across reboots
+        self.journal = Journal(JOURNAL_FILE, clock=self.clock)
+        self.record(BOOT)
+
+        # Garbage is collected when memory runs low or while nobody is at the
+        # door, see idle()
+        self.gc_manager = GCManager(clock=self.clock)
+
+        # Daily schedule, rebuilt whenever sunrise or sunset change
+        self.schedule = Schedule()
+        self.sunrise = DEFAULT_SUNRISE
+        self.sunset = DEFAULT_SUNSET
+        self.schedule.compile(self.sunrise, self.sunset)
+
+    @property
+    def weather(self):
+        """Last weather received, None until the first one arrives."""
+
+        return self.weather_cache.weather
+
+    @property
+    def temperature(self) -> float:
+        """Smoothed temperature, not a number until the first reading."""
+
+        return self.temperature_service.value
+
+    def can_go_out(self, pet=None) -> bool:
+        """
+        Args:
+            pet: Pet, pet asking, None for the rule of all pets
+        Returns:
+            bool, whether the weather and the temperature let the pet out,
+            see OutdoorPolicy
+        """
 
-        # Date unused, only time is important
-        self.midnight = cpy_datetime(year=1970, month=1, day=1, hour=0)
-        self.breakfast = cpy_datetime(year=1970, month=1, day=1, hour=9)
-        self.lunch = cpy_datetime(year=1970, month=1, day=1, hour=13)
-        self.dinner = cpy_datetime(year=1970, month=1, day=1, hour=20)
+        return self.policy.can_go_out(self.weather_cache.weather, pet)
 
-    def go_to(self) -> None:
+    def go_to(self) -> int:
         """
-        Reads the current time from rtc and uses it to determine in which state 
-        to switch. Additionally, between 00:00 and 00:10, it updates the weather
-        if needed.
+        Reads the current time from the time service and uses it to determine
+        in which state to switch.
 
         Args:
             None
         Returns:
-            None
+            int, seconds until the next scheduled state switch
         """
 
-        time = cpy_datetime.now().time()
-        self.logger.info(f'Using time {time}')
-
-        # Weather update
-        if (time >= self.midnight.time() and
-                time < (self.midnight + cpy_timedelta(minutes=10)).time() and
-                cpy_datetime.now().date() != self.sunrise_date.date()
-
-                ):
-            self.weather, sunrise_new, sunset_new = self._get_weather()
+        seconds = time_service.seconds_of_day()
 
-            if self.weather and sunrise_new and sunset_new:
-                if self.sunrise_date.date() != sunrise_new.date():
-                    self.sunrise_date = sunrise_new
-                    self.sunset_date = sunset_new
-                    self.logger.info(
-                        f'Weather updated: {self.weather}, sunrise: {self.sunrise_date}, sunset: {self.sunset_date}')
+        # State switching
+        self._switch_state(self.schedule.state_at(seconds))
 
-        # State switching, could use a match case statement but it is not supported
-        # on python 3.4 running on the microcontroller
-        if (time >= self.midnight.time() and time < self.sunrise_date.time()):
+        return self.schedule.next_transition(seconds) - seconds
 
-            # Switch to 'must stay in' state
-            self._switch_state(0)
-
-        if (time >= self.sunrise_date.time() and time < self.breakfast.time()):
-
-            # Switch to 'free in/out' state
-            self._switch_state(1)
-
-        if (time >= self.breakfast.time() and
-                time < (self.breakfast + cpy_timedelta(minutes=30)).time()):
+    def switch_states(self):
+        """
+        Task calling go_to() when the next state switch is due, or at least
+        every SCHEDULE_MAX_WAIT seconds so that time syncs and changes to
+        sunrise and sunset are noticed.
 
-            # Switch to 'eating' state
-            self._switch_state(2)
+        Args:
+            None
+        Returns:
+            generator, yields seconds to wait
+        """
 
-        if (time >= (self.breakfast + cpy_timedelta(minutes=30)).time() and
-                time < self.lunch.time()):
+        while True:
+            yield min(self.go_to(), SCHEDULE_MAX_WAIT)
 
-            # Switch to 'must stay out' state
-            self._switch_state(3)
+    def update(self):
+        """
+        Task running the update of the current state over and over. As soon as
+        the state changes, the running update is abandoned and the one of the
+        new state is started.
 
-        if (time >= self.lunch.time() and
-                time < (self.lunch + cpy_timedelta(minutes=30)).time()):
+        Args:
+            None
+        Returns:
+            generator, yields seconds to wait
+        """
 
-            # Switch to 'eating' state
-            self._switch_state(2)
+        while True:
+            state = self.state
+            for delay in self.states[state].update():
+                yield delay
+                if self.state != state:
+                    break
+            else:
+                yield 0
 
-        if (time >= (self.lunch + cpy_timedelta(minutes=30)).time() and
-                time < self.sunset_date.time()):
+    def read_temperature(self) -> None:
+        """Samples the temperature and passes it to the policy, see
+        TemperatureService."""
 
-            # Switch to 'must stay out' state
-            self._switch_state(3)
+        self.temperature_service.sample()
+        self.policy.update(self.temperature_service.value, time_service.time())
 
-        if (time >= self.sunset_date.time() and
-                time < self.dinner.time()):
+    def record(self, event: int, uid: int = 0) -> None:
+        """
+        Adds an event to the journal, with the current time and state.
 
-            # Switch to 'free in/out' state
-            self._switch_state(1)
+        Args:
+            event: int, event code, see src.journal
+            uid: int, UID of the tag involved, 0 for none
+        Returns:
+            None
+        """
 
-        if (time >= self.dinner.time() and
-                time < (self.dinner + cpy_timedelta(minutes=30)).time()):
+        self.journal.record(time_service.time(), event, uid, self.state)
 
-            # Switch to 'eating' state
-            self._switch_state(2)
+    def idle(self) -> None:
+        """Called in windows where a pause is harmless, e.g. after an RFID
+        scan without tags."""
 
-        if (time >= (self.dinner + cpy_timedelta(minutes=30)).time() and
-                time < self.midnight.time()):
+        self.gc_manager.idle()
 
-            # Switch to 'must stay in' state
-            self._switch_state(0)
+    def service_uart(self) -> None:
+        """Handles the responses received from the other microcontroller."""
 
-    def update(self) -> None:
-        """
-        Updates the temperature and calls the update method of the current state.
-        """
+        hardware.link.poll()
 
-        self.temperature = hardware.sht.temperature
-        self.logger.info(f"Temperature: {self.temperature}")
+    def refresh_weather(self) -> None:
+        """Requests fresh weather data when the cached one is too old."""
 
-        self.states[self.state].update()
+        self.weather_cache.poll()
 
     def _switch_state(self, new_state: int) -> None:
         """
@@ -160,73 +261,71 @@ class StateMachine:
             self.states[self.state].exit()
             self.state = new_state
             self.states[self.state].enter()
-            self.logger.info(f'Switched to state {self.state}')
+            self.record(STATE_SWITCH)
+            self.logger.info('Switched to state %d at %s', self.state,
+                             format_seconds(time_service.seconds_of_day()))
 
-    def _get_weather(self):
+    def _request_weather(self) -> None:
         """
-        Sends request for the weather, sunrise and sunset to the other microcontroller
-        via UART, waits for the response and returns the data in the order above.
-        Request format: '?W;', response format: '!W:weather^YYYY-MM-DD HH:MM:SS^YYYY-MM-DD HH:MM:SS;'
-
-        Args:
-            None
-        Returns:
-            weather: str, weather description
-            sunrise_date: datetime, sunrise time
-            sunset_date: datetime, sunset time
+        Sends request for the weather to the other microcontroller via UART
+        without waiting for the response, which is handled by service_uart().
         """
 
-        # Send request
-        hardware.uart.write(bytes("?W;", "ascii"))
-        logger.info("Sent weather request, waiting for response...")
+        hardware.link.request("W",
+                              timeout=WEATHER_REQUEST_TIMEOUT,
+                              retries=WEATHER_REQUEST_RETRIES,
+                              callback=self._on_weather)
+        self.logger.info("Sent weather request")
 
-        # Wait for response
-        done = False
-        while not done:
-
-            # Read byte from UART
-            byte_read = hardware.uart.read(1)
+    def _on_weather(self, response) -> None:
+        """
+        Handles the response to a weather request.
 
-            if not byte_read:
-                continue
+        Args:
+            response: tuple, weather and sunrise and sunset timestamps, None
+                on error
+        Returns:
+            None
+        """
 
-            # Start of response. Don't save '!'.
-            if byte_read == b"!":
-                response = []
-                response_started = True
-                continue
+        if response is None:
+            self.logger.error('Weather: no data received')
+            self._update_weather(None, None, None)
+            return
 
-            if response_started:
+        weather, sunrise, sunset = response
+        self._update_weather(weather, sunrise, sunset)
 
-                # Check for end of response. Don't save ';'.
-                if byte_read == b";":
-                    response_started = False
+    def _update_weather(self, weather, sunrise_new, sunset_new) -> None:
+        """
+        Stores new weather data in the cache, an error keeps the cached data.
+        The schedule is rebuilt if sunrise or sunset changed.
 
-                    # Check for error response
-                    if (response == 'W:E'):
-                        self.logger.error('Error response received')
-                        return None, None, None
+        Args:
+            weather: str, weather description
+            sunrise_new: int, sunrise timestamp, epoch seconds
+            sunset_new: int, sunset timestamp, epoch seconds
+        Returns:
+            None
+        """
 
-                    # Parse response
-                    response_parts = "".join(response).split("^")
-                    if response_parts[0].startswith("W"):
-                        weather = response_parts[0][2:]
-                        sunrise_date = cpy_datetime.fromisoformat(
-                            response_parts[1])
-                        sunset_date = cpy_datetime.fromisoformat(
-                            response_parts[2])
-                        done = True
+        if not self.weather_cache.update(weather, sunrise_new, sunset_new):
+            return
 
-                # Else, accumulate response bytes.
-                else:
-                    response.append(chr(byte_read[0]))
+        sunrise = seconds_of_day(sunrise_new)
+        sunset = seconds_of_day(sunset_new)
+        if sunrise != self.sunrise or sunset != self.sunset:
+            self.sunrise = sunrise
+            self.sunset = sunset
+            self.schedule.compile(sunrise, sunset)
 
-        return weather, sunrise_date, sunset_date
+        self.logger.info('Weather updated: %s, sunrise: %s, sunset: %s', weather,
+                         format_seconds(sunrise), format_seconds(sunset))
 
     def send_notification(self, title: str, data, tags: str = "") -> None:
         """
         Sends request for sending a notification to the other microcontroller via UART.
-        Does not wait for a response. Format: '?N:title^data^tags;'
+        Does not wait for the acknowledgement, which is handled by service_uart().
 
         Args:
             title: str, title of the notification
@@ -236,82 +335,88 @@ class StateMachine:
             None
         """
 
-        hardware.uart.write(bytes(f"?N:{title}^{data}^{tags};", "ascii"))
-        self.logger.info(f"Sent notification request: {title}, {data}, {tags}")
+        hardware.link.request("N", (title, data, tags),
+                              timeout=NOTIFICATION_TIMEOUT,
+                              retries=NOTIFICATION_RETRIES,
+                              callback=self._on_notification)
+        self.logger.info("Sent notification request: %s, %s, %s", title, data, tags)
+
+    def _on_notification(self, response) -> None:
+        """Handles the acknowledgement of a notification request, None if it failed."""
 
-    def read_RFID(self) -> int:
+        if response is None:
+            self.logger.error('Notification request not acknowledged')
+
+    def read_RFID(self):
         """
-        Tries reading an RFID tag for 5 seconds. It returns 200 if the correct
-        tag is detected, 400 if a wrong tag is detected and 500 if no tag is
-        detected.
+        Task trying to read an RFID tag for 5 seconds, the reader is polled every
+        RFID_POLL_INTERVAL seconds. It returns 200 if the tag of a known pet is
+        detected, the pet is then stored in 'pet', 400 if an unknown tag is
+        detected and 500 if no tag is detected. A card kept in front of the
+        reader is only reported once.
+        Use with 'yield from'.
 
         Args:
             None
         Returns:
-            int, 200, 400 or 500
+            generator, yields seconds to wait and returns 200, 400 or 500
         """
 
         # Start timer
-        self.start_monoton = py_time.monotonic()
-        self.logger.info('Started RFID scan...')
+        self.start_monoton = self.clock()
+        self.logger.debug('Started RFID scan...')
 
         # Keep reading for 5 seconds
-        while py_time.monotonic() - self.start_monoton < 5:
-
-            # Check for a card
-            (status, _) = hardware.rfid.request(hardware.rfid.REQALL)
-
-            if status == hardware.rfid.OK:
-
-                # Card detected, start reading
-                self.logger.debug('RFID: a card detected, start reading...')
-                (status, raw_uid) = hardware.rfid.anticoll()
-
-                if status == hardware.rfid.OK:
-                    self.logger.debug('RFID: card read, determining id...')
-                    rfid_data = "{:02x}{:02x}{:02x}{:02x}".format(raw_uid[0],
-                                                                  raw_uid[1],
-                                                                  raw_uid[2],
-                                                                  raw_uid[3]
-                                                                  )
-                    self.logger.debug(f'RFID: read id is {rfid_data}')
-
-                    # Parse id
-                    if rfid_data == "d951c359":
-                        self.logger.info('RFID: correct id detected')
-                        return 200
-                    else:
-                        self.logger.info('RFID: wrong id detected')
-                        return 400
+        while self.clock() - self.start_monoton < 5:
+
+            started = telemetry.start()
+            uid = self.rfid_reader.poll(self.clock())
+            telemetry.stop("rfid", started)
+            if uid is not None:
+                self.logger.debug('RFID: read id is %08x', uid)
+
+                # Parse id
+                pet = self.pets.get(uid)
+                if pet:
+                    self.pet = pet
+                    self.logger.info('RFID: %s detected', pet.name)
+                    return 200
+                else:
+                    self.logger.info('RFID: wrong id detected')
+                    self.record(UNKNOWN_BADGE, uid)
+                    return 400
+
+            yield RFID_POLL_INTERVAL
 
         # Timeout reached
-        self.logger.info('RFID: no card detected')
+        self.logger.debug('RFID: no card detected')
         return 500
 
-    def door_open(self) -> bool:
+    def door_open(self):
         """
-        Reads the force sensor for 5 seconds to determine if the door was open.
+        Task sensing the door for at most 5 seconds. It returns as soon as the
+        door sensor reports the door open. Use with 'yield from'.
 
         Args:
             None
         Returns:
-            bool, True if the door was open, False otherwise
+            generator, yields seconds to wait and returns True if the door was
+            open, False otherwise
         """
 
         # Start timer
-        start_time = py_time.monotonic()
-
-        # Count times the door was open
-        times_opened = 0
-        while py_time.monotonic() - start_time < 5:
-            if hardware.flex.value > 600 and hardware.flex.value < 800:
-                times_opened += 1
-
-        # Return result
-        if times_opened > 10:
-            return True
-        else:
-            return False
+        start_time = self.clock()
+        self.door_sensor.reset()
+
+        while self.clock() - start_time < 5:
+            started = telemetry.start()
+            state = self.door_sensor.sample(self.clock())
+            telemetry.stop("door", started)
+            if state == DOOR_OPENED:
+                return True
+            yield self.door_sensor.period
+
+        return False
 
     def lock_door_in(self, lock: bool) -> None:
         """
@@ -14,8 +14,8 @@
 #
 ########################################################
 
-import src.hardware as hardware
-from src.logger import logger
+from src.journal import PET_IN, PET_OUT
+from src.logger import get_logger
 from src.states.state import State
 
 
@@ -23,76 +23,70 @@ class free_in_out_state(State):
     """State in which the dog is free to go in and out."""
 
     def __init__(self, state_machine) -> None:
-        self.logger = logger
+        self.logger = get_logger("state")
         self.state_machine = state_machine
 
     def enter(self) -> None:
         """Called when the state is entered."""
 
         self.logger.info('Entered "free in-out" state')
-        self.status_changes = 0
+        self.state_machine.pets.reset_status_changes()
 
         # Lock doors
         self.state_machine.lock_door_in(True)
         self.state_machine.lock_door_out(True)
 
         # LEDs cyan
-        hardware.pixels.fill((0, 255, 255))
-        hardware.pixels.show()
-
-    def update(self) -> None:
-        """Called periodically to update the state."""
-
-        rfid_status = self.state_machine.read_RFID()
-
-        # Parse RFID status reading
-        if rfid_status == 200:
-
-            # Correct tag read, unlock door inwards and check weather
-            # LEDs green
-            hardware.pixels.fill((0, 255, 0))
-            hardware.pixels.show()
-            self.state_machine.lock_door_in(False)
-            
-            if (self.state_machine.weather in ['Clear', 'Clouds', 'Drizzle'] and
-                    self.state_machine.temperature > 5.0 and
-                    self.state_machine.temperature < 32.0):
-                
-                self.logger.info('Weather OK, dog can go out')
-                self.state_machine.lock_door_out(False)
-
-            # Sense the door for movement, update dog status if needed
-            self.logger.info('Sensing door...')
-            if self.state_machine.door_open():
-                self.logger.info('Door opened')
-                self.state_machine.dog_in = not self.state_machine.dog_in
-                self.status_changes += 1
-                self.logger.debug(
-                    f'Dog status changed: now is {"in" if self.state_machine.dog_in else "out"}')
-
-        elif rfid_status == 400:
-            # Unknown tag read, send notification
-            self.state_machine.send_notification(
-                title='Error: unknown ID badge',
-                data='An unknown ID badge has been scanned',
-                tags='x')
-            self.logger.info('Unknown ID badge detected')
-
-            # LEDs red
-            hardware.pixels.fill((255, 0, 0))
-            hardware.pixels.show()
-
-        elif rfid_status == 500:
-            # Timeout reached, no tag read
-            self.logger.info('RFID timeout reached')
-            
-            # Lock doors
-            self.state_machine.lock_door_in(True)
-            self.state_machine.lock_door_out(True)
-            
-            # LEDs cyan
-            hardware.pixels.fill((0, 255, 255))
-            hardware.pixels.show()
+        self.state_machine.leds.fill((0, 255, 255))
+
+    def pet_detected(self, pet):
+        """Task called when the tag of a known pet is read, yields seconds to wait."""
+
+        # Correct tag read, unlock door inwards and check weather
+        # LEDs pulsing green
+        self.state_machine.leds.pulse((0, 255, 0))
+        self.state_machine.lock_door_in(False)
+        
+        if self.state_machine.can_go_out(pet):
+            self.logger.info('Weather OK, %s can go out', pet.name)
+            self.state_machine.lock_door_out(False)
+
+        # Sense the door for movement, update pet status if needed
+        self.logger.info('Sensing door...')
+        door_opened = yield from self.state_machine.door_open()
+        if door_opened:
+            self.logger.info('Door opened')
+            pet.inside = not pet.inside
+            pet.status_changes += 1
+            self.logger.debug(
+                '%s status changed: now is %s', pet.name, "in" if pet.inside else "out")
+            self.state_machine.record(PET_IN if pet.inside else PET_OUT, pet.uid)
+
+    def unknown_badge(self) -> None:
+        """Called when an unknown tag is read."""
+
+        # Unknown tag read, send notification
+        self.state_machine.send_notification(
+            title='Error: unknown ID badge',
+            data='An unknown ID badge has been scanned',
+            tags='x')
+        self.logger.info('Unknown ID badge detected')
+
+        # LEDs blinking red
+        self.state_machine.leds.blink((255, 0, 0))
+
+    def timeout(self) -> None:
+        """Called when no tag is read before the timeout."""
+
+        # Timeout reached, no tag read
+        self.logger.debug('RFID timeout reached')
+        
+        # Lock doors
+        self.state_machine.lock_door_in(True)
+        self.state_machine.lock_door_out(True)
+        
+        # LEDs cyan
+        self.state_machine.leds.fill((0, 255, 255))
 
     def exit(self) -> None:
         """Called when the state is exited."""
@@ -14,8 +14,8 @@
 #
 ########################################################
 
-import src.hardware as hardware
-from src.logger import logger
+from src.journal import PET_IN, PET_OUT
+from src.logger import get_logger
 from src.states.state import State
 
 
@@ -23,73 +23,70 @@ class must_stay_in_state(State):
     """State in which the dog must stay in."""
 
     def __init__(self, state_machine) -> None:
-        self.logger = logger
+        self.logger = get_logger("state")
         self.state_machine = state_machine
 
     def enter(self) -> None:
         """Called when the state is entered."""
 
         self.logger.info('Entered "must stay in" state')
-        self.status_changes = 0
+        self.state_machine.pets.reset_status_changes()
 
         # Lock doors
         self.state_machine.lock_door_out(True)
         self.state_machine.lock_door_in(True)
 
         # LEDs white
-        hardware.pixels.fill((255, 255, 255))
-        hardware.pixels.show()
-
-    def update(self) -> None:
-        """Called periodically to update the state."""
-
-        rfid_status = self.state_machine.read_RFID()
-
-        # Parse RFID status reading
-        if rfid_status == 200:
-
-            # Correct tag read, unlock door inwards
-            # LEDs green
-            hardware.pixels.fill((0, 255, 0))
-            hardware.pixels.show()
-            self.state_machine.lock_door_in(False)
-
-            # Sense the door for movement, send notification if dog is trying to
-            # go out, update dog status if it is going inside
-            self.logger.info('Sensing door...')
-            if self.state_machine.door_open():
-                self.state_machine.send_notification(
-                    title='Dog is trying to go out',
-                    data="It's dark outside, the dog should stay in",
-                    tags='first_quarter_moon_with_face')
-            else:
-                self.status_changes += 1
-                self.state_machine.dog_in = True
-                self.logger.debug(
-                    f'Dog status changed: now is {"in" if self.state_machine.dog_in else "out"}')
-
-        elif rfid_status == 400:
-            # Unknown tag read, send notification
+        self.state_machine.leds.fill((255, 255, 255))
+
+    def pet_detected(self, pet):
+        """Task called when the tag of a known pet is read, yields seconds to wait."""
+
+        # Correct tag read, unlock door inwards
+        # LEDs pulsing green
+        self.state_machine.leds.pulse((0, 255, 0))
+        self.state_machine.lock_door_in(False)
+
+        # Sense the door for movement, send notification if pet is trying to
+        # go out, update pet status if it is going inside
+        self.logger.info('Sensing door...')
+        door_opened = yield from self.state_machine.door_open()
+        if door_opened:
             self.state_machine.send_notification(
-                title='Error: unknown ID badge',
-                data='An unknown ID badge has been scanned',
-                tags='x')
-
-            # LEDs red
-            hardware.pixels.fill((255, 0, 0))
-            hardware.pixels.show()
-
-        elif rfid_status == 500:
-            # Timeout reached, no tag read
-            self.logger.info('RFID timeout reached')
-            
-            # Lock doors
-            self.state_machine.lock_door_in(True)
-            self.state_machine.lock_door_out(True)
-
-            # LEDs white
-            hardware.pixels.fill((255, 255, 255))
-            hardware.pixels.show()
+                title=f'{pet.name} is trying to go out',
+                data=f"It's dark outside, {pet.name} should stay in",
+                tags='first_quarter_moon_with_face')
+        else:
+            pet.status_changes += 1
+            pet.inside = True
+            self.logger.debug(
+                '%s status changed: now is %s', pet.name, "in" if pet.inside else "out")
+            self.state_machine.record(PET_IN if pet.inside else PET_OUT, pet.uid)
+
+    def unknown_badge(self) -> None:
+        """Called when an unknown tag is read."""
+
+        # Unknown tag read, send notification
+        self.state_machine.send_notification(
+            title='Error: unknown ID badge',
+            data='An unknown ID badge has been scanned',
+            tags='x')
+
+        # LEDs blinking red
+        self.state_machine.leds.blink((255, 0, 0))
+
+    def timeout(self) -> None:
+        """Called when no tag is read before the timeout."""
+
+        # Timeout reached, no tag read
+        self.logger.debug('RFID timeout reached')
+        
+        # Lock doors
+        self.state_machine.lock_door_in(True)
+        self.state_machine.lock_door_out(True)
+
+        # LEDs white
+        self.state_machine.leds.fill((255, 255, 255))
 
     def exit(self) -> None:
         self.logger.info('Exiting "must stay in" state')
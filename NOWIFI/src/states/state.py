@@ -30,7 +30,41 @@ class State:
 
         pass
 
-    def update(self) -> None:
-        """Called periodically to update the state."""
+    def update(self):
+        """
+        Task run over and over to update the state, yields seconds to wait.
+        Reads a tag and calls the handler for the result. A known pet is handled
+        by the state its schedule overrides say, by default this one.
+        """
+
+        rfid_status = yield from self.state_machine.read_RFID()
+
+        # Parse RFID status reading
+        if rfid_status == 200:
+            pet = self.state_machine.pet
+            state = self.state_machine.states[pet.state(self.state_machine.state)]
+            yield from state.pet_detected(pet)
+
+        elif rfid_status == 400:
+            self.unknown_badge()
+
+        elif rfid_status == 500:
+            self.timeout()
+
+            # Nobody at the door, a good time for housekeeping
+            self.state_machine.idle()
+
+    def pet_detected(self, pet):
+        """Task called when the tag of a known pet is read, yields seconds to wait."""
+
+        yield 0
+
+    def unknown_badge(self) -> None:
+        """Called when an unknown tag is read."""
+
+        pass
+
+    def timeout(self) -> None:
+        """Called when no tag is read before the timeout."""
 
         pass
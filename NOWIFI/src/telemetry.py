@@ -0,0 +1,176 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# NOTE: this file is shared by both boards, keep NOWIFI/src/telemetry.py and
+# WIFI/src/telemetry.py identical.
+
+import time
+from array import array
+
+# Counters, each board uses those that apply to it. The mem_* ones are levels
+# in bytes, set rather than incremented.
+COUNTERS = (
+    "uart_in",
+    "uart_out",
+    "frames",
+    "frame_errors",
+    "notifications_sent",
+    "notifications_dropped",
+    "mem_free",
+    "mem_min",
+)
+
+# Timers: each keeps the number of timed operations, their total time in
+# milliseconds and the longest one in microseconds
+TIMERS = (
+    "loop",
+    "rfid",
+    "door",
+    "gc",
+    "http",
+)
+
+# Number of values of a statistics message, see Telemetry.fields()
+STATS_SIZE = len(COUNTERS) + 3 * len(TIMERS)
+
+# Values are sent as unsigned 32 bits integers
+VALUE_MASK = 0xFFFFFFFF
+
+
+class Telemetry:
+    """
+    Counters and timers of the hot paths, in arrays allocated once so that
+    recording a value allocates no memory. Names are looked up in a dict, the
+    values themselves are plain integers.
+    """
+
+    def __init__(self, counters=COUNTERS, timers=TIMERS) -> None:
+        """
+        Args:
+            counters: tuple of str, names of the counters
+            timers: tuple of str, names of the timers
+        """
+
+        self.counter_names = counters
+        self.timer_names = timers
+        self._counters = {name: i for i, name in enumerate(counters)}
+        self._timers = {name: i for i, name in enumerate(timers)}
+
+        self.counts = array("L", [0] * len(counters))
+        self.timer_counts = array("L", [0] * len(timers))
+        self.timer_totals = array("L", [0] * len(timers))
+        self.timer_max = array("L", [0] * len(timers))
+
+        # Sub-millisecond remainder of each timer total, in microseconds
+        self._remainders = array("L", [0] * len(timers))
+
+    def add(self, name: str, value: int = 1) -> None:
+        """Adds to a counter."""
+
+        i = self._counters[name]
+        self.counts[i] = (self.counts[i] + value) & VALUE_MASK
+
+    def set(self, name: str, value: int) -> None:
+        """Sets a counter used as a level, e.g. free memory."""
+
+        self.counts[self._counters[name]] = value & VALUE_MASK
+
+    def lowest(self, name: str, value: int) -> None:
+        """Sets a level counter to a value if lower, or if it was never set."""
+
+        i = self._counters[name]
+        if value < self.counts[i] or not self.counts[i]:
+            self.counts[i] = value & VALUE_MASK
+
+    @staticmethod
+    def start() -> int:
+        """Start of a timed operation, to pass to stop()."""
+
+        return time.monotonic_ns()
+
+    def stop(self, name: str, started: int) -> int:
+        """
+        Records the time elapsed since start() in a timer.
+
+        Args:
+            name: str, name of the timer
+            started: int, value returned by start()
+        Returns:
+            int, elapsed microseconds
+        """
+
+        elapsed = (time.monotonic_ns() - started) // 1000
+        i = self._timers[name]
+
+        self.timer_counts[i] = (self.timer_counts[i] + 1) & VALUE_MASK
+        total = self._remainders[i] + elapsed
+        self.timer_totals[i] = (self.timer_totals[i] + total // 1000) & VALUE_MASK
+        self._remainders[i] = total % 1000
+        if elapsed > self.timer_max[i]:
+            self.timer_max[i] = min(elapsed, VALUE_MASK)
+
+        return elapsed
+
+    def fields(self) -> tuple:
+        """
+        All the values, as sent in a statistics message: the counters, then
+        count, total and maximum of each timer.
+
+        Args:
+            None
+        Returns:
+            tuple of int, STATS_SIZE values with the default names
+        """
+
+        values = list(self.counts)
+        for i in range(len(self.timer_names)):
+            values.append(self.timer_counts[i])
+            values.append(self.timer_totals[i])
+            values.append(self.timer_max[i])
+
+        return tuple(values)
+
+    def report(self, fields=None) -> str:
+        """
+        Summary of the values: non-zero counters on one line, then one line
+        per timer used with count, average and maximum time.
+
+        Args:
+            fields: tuple, values as returned by fields(), e.g. received from
+                the other board, None for the values of this board
+        Returns:
+            str, the summary
+        """
+
+        if fields is None:
+            fields = self.fields()
+
+        count = len(self.counter_names)
+        counters = [f'{name} {fields[i]}'
+                    for i, name in enumerate(self.counter_names) if fields[i]]
+        lines = [", ".join(counters) if counters else "no counters"]
+
+        for i, name in enumerate(self.timer_names):
+            runs, total, longest = fields[count + 3 * i:count + 3 * i + 3]
+            if runs:
+                lines.append(
+                    f'{name}: {runs} runs, {total / runs:.2f} ms avg, {longest / 1000:.2f} ms max')
+
+        return "\n".join(lines)
+
+
+# Telemetry object to be used in all modules
+telemetry = Telemetry()
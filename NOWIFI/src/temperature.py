@@ -0,0 +1,117 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+from src.logger import get_logger
+
+logger = get_logger("temperature")
+
+# Measurement modes of the SHT4x without heater, same values as
+# adafruit_sht4x.Mode: a high precision measurement blocks the I2C bus for
+# about 8.3 ms, a low precision one for about 1.6 ms
+HIGH_PRECISION = 0xFD
+LOW_PRECISION = 0xE0
+
+
+class TemperatureService:
+    """
+    Temperature sampled from the SHT4x on its own period, see sample(), and
+    smoothed with an exponential moving average. Readers get the last average
+    without touching the sensor, whether it is good is up to OutdoorPolicy.
+
+    Far from the limits a low precision measurement is enough and blocks the
+    bus for less time, high precision is used within 'margin' degrees of
+    any of them.
+    """
+
+    def __init__(self, sensor, limits=(5.0, 32.0), margin: float = 3.0,
+                 smoothing: float = 0.25) -> None:
+        """
+        Args:
+            sensor: adafruit_sht4x.SHT4x (or any object with temperature and
+                mode)
+            limits: tuple of float, temperatures in Celsius where a decision
+                changes, see OutdoorPolicy.limits
+            margin: float, degrees from a limit within which high precision
+                is used
+            smoothing: float, weight of a new sample in the average, 1 for
+                no smoothing
+        """
+
+        self.sensor = sensor
+        self.limits = limits
+        self.margin = margin
+        self.smoothing = smoothing
+
+        # Not a number until read, so it is never within the limits
+        self.value = float("nan")
+
+        self.mode = None
+        self.samples = 0
+        self.low_precision = 0
+        self.errors = 0
+
+    def sample(self) -> None:
+        """Reads the sensor and updates the average, keeping it on error."""
+
+        mode = HIGH_PRECISION if self._near_limit() else LOW_PRECISION
+        try:
+            if mode != self.mode:
+                self.sensor.mode = mode
+                self.mode = mode
+            reading = self.sensor.temperature
+        except (OSError, RuntimeError) as error:
+            self.errors += 1
+            logger.error("Temperature not read: %s", error)
+            return
+
+        self.samples += 1
+        if mode == LOW_PRECISION:
+            self.low_precision += 1
+
+        # The first reading starts the average
+        if self.value != self.value:
+            self.value = reading
+        else:
+            self.value += self.smoothing * (reading - self.value)
+
+        logger.debug("Temperature: %.2f (read %.2f)", self.value, reading)
+
+    def report(self) -> str:
+        """
+        Summary of the samples.
+
+        Args:
+            None
+        Returns:
+            str, the summary
+        """
+
+        share = 100 * self.low_precision // self.samples if self.samples else 0
+        return (f'{self.value:.1f} C, {self.samples} samples ({share}% low precision), '
+                f'{self.errors} errors')
+
+    def _near_limit(self) -> bool:
+        """Whether the average is unknown or within 'margin' of a limit."""
+
+        value = self.value
+        if value != value:
+            return True
+
+        for limit in self.limits:
+            if abs(value - limit) <= self.margin:
+                return True
+
+        return False
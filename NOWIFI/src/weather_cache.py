@@ -0,0 +1,109 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+import time as py_time
+
+from src.logger import get_logger
+
+logger = get_logger("weather")
+
+
+class WeatherCache:
+    """
+    Last good weather data and the time it was received. A refresh is requested
+    every 'ttl' seconds without waiting for it: the cached data keeps being
+    served while the refresh is in flight, and also if it never arrives.
+    """
+
+    def __init__(self, request, ttl: float = 30 * 60, timeout: float = 30,
+                 retry: float = 60, clock=None) -> None:
+        """
+        Args:
+            request: function sending a weather request, the response must be
+                passed to update()
+            ttl: float, seconds after which the data is refreshed
+            timeout: float, seconds to wait for a response
+            retry: float, seconds to wait after a failed refresh before trying
+                again
+            clock: function returning the current time in seconds
+        """
+
+        self.request = request
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry = retry
+        self.clock = clock if clock else py_time.monotonic
+
+        self.weather = None
+        self.sunrise = None
+        self.sunset = None
+
+        # Time of the last good data, of the request in flight and of the last
+        # failure, None if there is none
+        self.updated = None
+        self.requested = None
+        self.failed = None
+
+    def age(self):
+        """Seconds since the data was received, None if there is no data."""
+
+        return None if self.updated is None else self.clock() - self.updated
+
+    def poll(self) -> None:
+        """Requests a refresh if one is due, gives up on a request timed out."""
+
+        now = self.clock()
+
+        # Request in flight
+        if self.requested is not None:
+            if now - self.requested > self.timeout:
+                logger.error('Weather: request timed out, keeping cached data')
+                self.requested = None
+                self.failed = now
+            return
+
+        if self.failed is not None and now - self.failed < self.retry:
+            return
+
+        if self.updated is None or now - self.updated > self.ttl:
+            self.requested = now
+            self.request()
+
+    def update(self, weather, sunrise, sunset) -> bool:
+        """
+        Stores a response. An error response (None values) keeps the cached
+        data.
+
+        Args:
+            weather: str, weather description
+            sunrise: int, sunrise timestamp, epoch seconds
+            sunset: int, sunset timestamp, epoch seconds
+        Returns:
+            bool, True if the data was stored
+        """
+
+        self.requested = None
+
+        if not (weather and sunrise and sunset):
+            self.failed = self.clock()
+            return False
+
+        self.weather = weather
+        self.sunrise = sunrise
+        self.sunset = sunset
+        self.updated = self.clock()
+        self.failed = None
+        return True
@@ -15,6 +15,7 @@
 ########################################################
 
 import board
+import gc
 import busio
 import wifi
 import socketpool
@@ -25,12 +26,16 @@ import time
 
 import adafruit_ntp
 import adafruit_requests
-import adafruit_logging as logging
 import adafruit_datetime as cpy_datetime
 
-# Initialize the logger
-logger = logging.getLogger("root")
-logger.setLevel(logging.DEBUG)
+from src.connections import ConnectionManager
+from src.dispatcher import Dispatcher
+from src.codec import codec_for, format_time
+from src.json_stream import JSONExtractor
+from src.logger import INFO, logger, ring
+from src.notifications import NotificationQueue
+from src.telemetry import telemetry
+from src.time_service import time_service
 
 # Try connecting to WiFi (SSID and password are stored in settings.toml) every 5
 # seconds until a connection is established
@@ -40,26 +45,83 @@ while not connected:
         wifi.radio.connect(os.getenv("WIFI_SSID"), os.getenv("WIFI_PASSWORD"))
         connected = True
     except ConnectionError:
-        logger.error(
-            f'WiFi: failed to connect to {os.getenv("WIFI_SSID")}, retrying in 5 sec...')
+        logger.error('WiFi: failed to connect to %s, retrying in 5 sec...',
+                     os.getenv("WIFI_SSID"))
         time.sleep(5)
 
 pool = socketpool.SocketPool(wifi.radio)
 requests = adafruit_requests.Session(pool, ssl.create_default_context())
-logger.info(f'WiFi: connected to {os.getenv("WIFI_SSID")}')
+connections = ConnectionManager(requests)
+logger.info('WiFi: connected to %s', os.getenv("WIFI_SSID"))
 
 
-# Retrieve the current time from an NTP server
+# Seconds between two syncs with the NTP server, and between two attempts while
+# they fail
+NTP_SYNC_INTERVAL = 6 * 60 * 60
+NTP_RETRY_INTERVAL = 60
+
 ntp = adafruit_ntp.NTP(pool, tz_offset=1)
-rtc.RTC().datetime = ntp.datetime
-logger.info(f"NTP time: {cpy_datetime.datetime.now()}")
 
-# UART for serial communication between Pico and Pico W
-uart = busio.UART(tx=board.GP0, rx=board.GP1, baudrate=115200)
-logger.info('UART initialized at 115200 bauds')
 
+def sync_time() -> bool:
+    """
+    Syncs the time service to the NTP server, and the RTC to the time service
+    for the logs.
 
-def send_notification(title: str, data, tags: str = "") -> None:
+    Args:
+        None
+    Returns:
+        bool, True if the time was synced
+    """
+
+    try:
+        epoch = time.mktime(ntp.datetime)
+    except (OSError, RuntimeError) as error:
+        logger.error("NTP: time not synced (%s)", error)
+        return False
+
+    time_service.sync(epoch)
+    rtc.RTC().datetime = time.localtime(time_service.time())
+    if logger.enabled(INFO):
+        logger.info("NTP time: %s, %s", cpy_datetime.datetime.now(), time_service.report())
+    return True
+
+
+sync_time()
+
+# Seconds between two logs of the HTTP connection statistics and telemetry
+CONNECTIONS_REPORT_INTERVAL = 60 * 60
+
+# Whether the telemetry of the door board is forwarded as a notification,
+# set NTFY_STATS = 1 in settings.toml
+FORWARD_STATS = bool(os.getenv("NTFY_STATS"))
+
+# Values needed from the OpenWeatherMap response: weather, timezone offset,
+# sunrise and sunset, and size of the chunks in which the response is read
+WEATHER_PATHS = (
+    ("weather", 0, "main"),
+    ("timezone",),
+    ("sys", "sunrise"),
+    ("sys", "sunset"),
+)
+WEATHER_CHUNK_SIZE = 256
+
+# Seconds during which weather requests are answered from the cache, and the
+# cache itself: last weather response fields and time they were retrieved
+WEATHER_TTL = 10 * 60
+weather_cache = [None, 0]
+
+# UART for serial communication between Pico and Pico W. Its buffer keeps
+# the requests received while an HTTP request blocks the loop for seconds,
+# the default of 64 bytes is less than a statistics or notification frame.
+UART_BUFFER_SIZE = 512
+uart = busio.UART(tx=board.GP0, rx=board.GP1, baudrate=115200,
+                  receiver_buffer_size=UART_BUFFER_SIZE)
+codec = codec_for(os.getenv("LINK_MODE"))
+logger.info('UART initialized at 115200 bauds, %s mode', codec.name)
+
+
+def send_notification(title: str, data, tags: str = "") -> bool:
     """
     Sends a notification to the NTFY.SH service.
 
@@ -68,131 +130,237 @@ def send_notification(title: str, data, tags: str = "") -> None:
         data (str): The data of the notification.
         tags (str, optional): The tags of the notification. Defaults to "".
     Returns:
-        None
+        bool: True if the notification was sent.
     """
 
-    response = requests.post(
-        os.getenv("NTFYSH_URL"),
-        data=data,
-        headers={"Title": title, "Tags": tags},
-    )
-    response.close()
-    logger.info(f'Notification sent: title={title}, data={data}, tags={tags}')
+    try:
+        with connections.post(
+            os.getenv("NTFYSH_URL"),
+            data=data,
+            headers={"Title": title, "Tags": tags},
+        ) as response:
+            status_code = response.status_code
+    except (OSError, RuntimeError) as error:
+        logger.error('Notification not sent: %s', error)
+        return False
 
+    if status_code != 200:
+        logger.error('Notification not sent: HTTP %d', status_code)
+        return False
 
-def _json_extract(obj, key):
+    logger.info('Notification sent: title=%s, data=%s, tags=%s', title, data, tags)
+    return True
 
-    arr = []
 
-    def extract(obj, arr, key):
+# Notifications waiting to be sent
+notifications = NotificationQueue(send_notification)
 
-        if isinstance(obj, dict):
-            for k, v in obj.items():
-                if isinstance(v, (dict, list)):
-                    extract(v, arr, key)
-                elif k == key:
-                    arr.append(v)
-        elif isinstance(obj, list):
-            for item in obj:
-                extract(item, arr, key)
-        return arr
 
-    values = extract(obj, arr, key)
-    return values
+def fetch_weather():
+    """
+    Retrieves the weather data from the OpenWeatherMap API. The response body
+    is parsed in chunks as it arrives, keeping only the needed values.
 
+    Args:
+        None
+    Returns:
+        tuple, weather and sunrise and sunset timestamps, or None on error
+    """
 
-def response_weather():
-    """Retrieves the weather data from the OpenWeatherMap API and sends it over UART"""
+    logger.debug('Started retrieving weather data for (%s, %s)...',
+                 os.getenv("LATITUDE"), os.getenv("LONGITUDE"))
+    try:
+        with connections.get(
+            f'https://api.openweathermap.org/data/2.5/weather?lat={os.getenv("LATITUDE")}&lon={os.getenv("LONGITUDE")}&appid={os.getenv("OWM_API_KEY")}'
+        ) as response:
+
+            # Parse response
+            if response.status_code != 200:
+                logger.error("Error retrieving weather data: %d", response.status_code)
+                return None
+
+            # Extract relevant data from json response
+            start_time = time.monotonic()
+            start_free = lowest_free = gc.mem_free()
+            extractor = JSONExtractor(WEATHER_PATHS)
+            for chunk in response.iter_content(chunk_size=WEATHER_CHUNK_SIZE):
+                extractor.feed(chunk)
+                lowest_free = min(lowest_free, gc.mem_free())
+    except (OSError, RuntimeError) as error:
+        logger.error("Error retrieving weather data: %s", error)
+        return None
+    except ValueError as error:
+
+        # Not json, e.g. the login page of a captive portal
+        logger.error("Error retrieving weather data: malformed response (%s)", error)
+        return None
+
+    logger.debug("Weather parsed in %.3f s, peak memory %d bytes",
+                 time.monotonic() - start_time, start_free - lowest_free)
+
+    if not extractor.done():
+        logger.error("Error retrieving weather data: incomplete response")
+        return None
+
+    # Values of the wrong type, e.g. null, would make the handler fail
+    weather, timezone, sunrise, sunset = (extractor.values[path] for path in WEATHER_PATHS)
+    if (type(weather) is not str or type(timezone) is not int or
+            type(sunrise) is not int or type(sunset) is not int):
+        logger.error("Error retrieving weather data: unexpected values %s",
+                     (weather, timezone, sunrise, sunset))
+        return None
+
+    sunrise += timezone
+    sunset += timezone
+
+    if logger.enabled(INFO):
+        logger.info("Retrieved new weather data: %s, sunrise: %s, sunset: %s",
+                    weather, format_time(sunrise), format_time(sunset))
+    return weather, sunrise, sunset
+
+
+def response_weather(fields):
+    """
+    Weather data for a weather request. Data younger than WEATHER_TTL comes
+    from the cache without contacting the API. If the API can't be reached the
+    cached data is sent even if older, and an error only if there is none.
 
-    logger.debug(
-        f'Started retrieving weather data for ({os.getenv("LATITUDE")}, {os.getenv("LONGITUDE")})...'
-    )
-    response = requests.get(
-        f'https://api.openweathermap.org/data/2.5/weather?lat={os.getenv("LATITUDE")}&lon={os.getenv("LONGITUDE")}&appid={os.getenv("OWM_API_KEY")}'
-    )
+    Args:
+        fields: tuple, fields of the request, none expected
+    Returns:
+        tuple, weather and sunrise and sunset timestamps, or None on error
+    """
 
-    # Parse response
-    if response.status_code != 200:
-        # Error: send error message over UART
+    now = time.monotonic()
+    weather, updated = weather_cache
+    if weather is None or now - updated > WEATHER_TTL:
+        fetched = fetch_weather()
+        if fetched is not None:
+            weather = fetched
+            weather_cache[0] = weather
+            weather_cache[1] = now
+        elif weather is not None:
+            logger.info("Sending cached weather data, %.0f s old", now - updated)
+    else:
+        logger.debug("Sending cached weather data, %.0f s old", now - updated)
 
-        logger.error(f"Error retrieving weather data: {response.status_code}")
-        uart.write(bytes(f"!W:E;", "ascii"))
+    return weather
 
-    # Extract relevant data from json response
-    weather = _json_extract(response.json(), "main")[0]
-    timezone = _json_extract(response.json(), "timezone")[0]
-    sunset = cpy_datetime.datetime.fromtimestamp(
-        _json_extract(response.json(), "sunset")[0]
-    ) + cpy_datetime.timedelta(seconds=timezone)
-    sunrise = cpy_datetime.datetime.fromtimestamp(
-        _json_extract(response.json(), "sunrise")[0]
-    ) + cpy_datetime.timedelta(seconds=timezone)
 
-    logger.info(
-        f"Retrieved new weather data: {weather}, sunrise: {sunrise}, sunset: {sunset}"
-    )
+def response_time(fields):
+    """
+    Current time for a time request, see TimeService. Until NTP answers the
+    RTC time is wrong, an error is sent instead so the door board asks again.
 
-    # Send data over UART
-    uart.write(bytes(f"!W:{weather}^{sunset}^{sunrise};", "ascii"))
-    logger.debug(f"UART <-- !W:{weather}^{sunrise}^{sunset};")
+    Args:
+        fields: tuple, fields of the request, none expected
+    Returns:
+        tuple, timestamp, or None if the time was never synced
+    """
 
+    if not time_service.synced:
+        logger.error("Time requested before the first NTP sync")
+        return None
 
-def response_time():
-    """Sends the current time over UART"""
+    return (time_service.time(),)
 
-    uart.write(bytes(f"!T:{cpy_datetime.datetime.now()};", "ascii"))
-    logger.debug(f"UART <-- !T:{cpy_datetime.datetime.now()};")
 
+def request_notification(fields):
+    """
+    Queues the notification of a notification request, acknowledged at once
+    and sent afterwards.
 
-def main():
-    """Main loop of the program. Reads UART lines for requests and sends the 
-    appropriate responses."""
+    Args:
+        fields: tuple, title, data and tags of the notification
+    Returns:
+        tuple, empty acknowledgement
+    """
 
-    request_started = False
+    title, data, tags = fields
+    notifications.push(title=title, data=data, tags=tags)
+    return ()
 
-    # Keep listening for requests
-    while True:
 
-        # Read byte from UART
-        byte_read = uart.read(1)
+def response_stats(fields):
+    """
+    Telemetry of this board for a statistics request. The request carries the
+    telemetry of the door board, which is logged and, if FORWARD_STATS is set,
+    forwarded as a notification.
+
+    Args:
+        fields: tuple, telemetry of the door board, see Telemetry.fields(),
+            empty for a bare '?S;' request
+    Returns:
+        tuple, telemetry of this board
+    """
+
+    if fields:
+        report = telemetry.report(fields)
+        logger.info("Door board telemetry:\n%s", report)
+        if FORWARD_STATS:
+            notifications.push(title="Door statistics", data=report, tags="bar_chart")
+
+    telemetry.set("mem_free", gc.mem_free())
+    return telemetry.fields()
 
-        if not byte_read:
-            continue
 
-        # Start of request. Don't save '?'.
-        if byte_read == b"?":
-            request = []
-            request_started = True
-            continue
+# Requests of the other board: time and notifications are answered at once,
+# the weather may need the network and is handled between two UART reads. A
+# request sent again gets the same answer, except the time which is fresh.
+dispatcher = Dispatcher(uart, codec)
+dispatcher.register("T", response_time, repeatable=True)
+dispatcher.register("N", request_notification)
+dispatcher.register("S", response_stats)
+dispatcher.register("W", response_weather, deferred=True)
 
-        if request_started:
 
-            # Check for end of request. Don't save ';'.
-            if byte_read == b";":
-                request_started = False
+def step():
+    """One round of the main loop: requests needing the network run one per
+    round, so the others are answered meanwhile. Notifications are
+    acknowledged as soon as they are queued and sent afterwards."""
 
-                # Parse request
-                request_parts = "".join(request).split("^")
+    dispatcher.poll()
 
-                # Weather request
-                if request_parts[0].startswith("W"):
-                    response_weather()
+    # Slow phase, at most one deferred request and one notification per
+    # round, answering the requests received meanwhile in between
+    dispatcher.process()
+    dispatcher.poll()
+    notifications.process()
 
-                # Time request
-                elif request_parts[0].startswith("T"):
-                    response_time()
 
-                # Notification request
-                elif request_parts[0].startswith("N:"):
-                    title = request_parts[0][2:]
-                    data = request_parts[1]
-                    tags = request_parts[2]
-                    send_notification(title=title, data=data, tags=tags)
-                    uart.write(bytes(f"!N;", "ascii"))
+def main():
+    """Main loop of the program. Reads UART lines for requests and sends the 
+    appropriate responses, see step(). On a crash the last logs are printed
+    before the error."""
+
+    last_report = time.monotonic()
+    last_ntp = time.monotonic()
+    ntp_interval = NTP_SYNC_INTERVAL if time_service.synced else NTP_RETRY_INTERVAL
 
-            # Else, accumulate response bytes.
-            else:
-                request.append(chr(byte_read[0]))
+    # Keep listening for requests
+    try:
+        while True:
+            started = telemetry.start()
+            step()
+            telemetry.stop("loop", started)
+            telemetry.lowest("mem_min", gc.mem_free())
+
+            # Time sync, sooner again if it failed
+            if time.monotonic() - last_ntp > ntp_interval:
+                ntp_interval = NTP_SYNC_INTERVAL if sync_time() else NTP_RETRY_INTERVAL
+                last_ntp = time.monotonic()
+
+            # Connection statistics and telemetry
+            if time.monotonic() - last_report > CONNECTIONS_REPORT_INTERVAL:
+                telemetry.set("mem_free", gc.mem_free())
+                if logger.enabled(INFO):
+                    logger.info("HTTP connections:\n%s", connections.report())
+                    logger.info("Telemetry:\n%s", telemetry.report())
+                    logger.info("Time: %s", time_service.report())
+                last_report = time.monotonic()
+    except Exception:
+        print(f"Last logs:\n{ring.dump()}")
+        raise
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+import time
+
+from src.logger import get_logger
+from src.telemetry import telemetry
+
+logger = get_logger("http")
+
+# Fields of the statistics of a host
+REQUESTS = 0
+REUSED = 1
+NEW_TIME = 2
+REUSED_TIME = 3
+
+
+def _host(url: str) -> str:
+    """Host part of an url, e.g. 'ntfy.sh' for 'https://ntfy.sh/topic'."""
+
+    start = url.find("//") + 2
+    end = url.find("/", start)
+    return url[start:] if end < 0 else url[start:end]
+
+
+class ConnectionManager:
+    """
+    Sends HTTP(S) requests through a single adafruit_requests.Session asking
+    servers to keep connections alive. Responses are always read to the end and
+    closed, so the session can hand the same socket, and its TLS session, to
+    the next request to that host instead of opening a new one. Counts how
+    often a connection is reused and how long requests take with and without a
+    new connection, the difference being the cost of the handshake.
+    """
+
+    def __init__(self, session, clock=None) -> None:
+        """
+        Args:
+            session: adafruit_requests.Session
+            clock: function returning the current time in seconds
+        """
+
+        self.session = session
+        self.clock = clock if clock else time.monotonic
+
+        # Socket used last and statistics, by host
+        self._sockets = {}
+        self.stats = {}
+
+    def request(self, method: str, url: str, headers=None, **kwargs):
+        """
+        Sends a request. The response must be closed by the caller, use it as a
+        context manager.
+
+        Args:
+            method: str, HTTP method
+            url: str, url of the request
+            headers: dict, headers of the request
+            kwargs: passed to adafruit_requests.Session.request()
+        Returns:
+            adafruit_requests.Response
+        """
+
+        host = _host(url)
+        headers = dict(headers) if headers else {}
+        headers["Connection"] = "keep-alive"
+
+        start = self.clock()
+        started = telemetry.start()
+        response = self.session.request(method, url, headers=headers, **kwargs)
+        telemetry.stop("http", started)
+        elapsed = self.clock() - start
+
+        # Same socket as the last request to this host: no new connection
+        reused = (response.socket is not None and
+                  response.socket is self._sockets.get(host))
+        self._sockets[host] = response.socket
+
+        stats = self.stats.get(host)
+        if stats is None:
+            stats = [0, 0, 0.0, 0.0]
+            self.stats[host] = stats
+        stats[REQUESTS] += 1
+        if reused:
+            stats[REUSED] += 1
+            stats[REUSED_TIME] += elapsed
+        else:
+            stats[NEW_TIME] += elapsed
+
+        logger.debug('HTTP: %s %s, %s connection, %.2f s',
+                     method, host, "reused" if reused else "new", elapsed)
+        return response
+
+    def get(self, url: str, **kwargs):
+        """Sends a GET request, see request()."""
+
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        """Sends a POST request, see request()."""
+
+        return self.request("POST", url, **kwargs)
+
+    def report(self) -> str:
+        """
+        Summary of the statistics of each host: requests sent, share of reused
+        connections and average time of a request with a new and with a reused
+        connection.
+
+        Args:
+            None
+        Returns:
+            str, one line per host
+        """
+
+        lines = []
+        for host, stats in self.stats.items():
+            new = stats[REQUESTS] - stats[REUSED]
+            new_time = stats[NEW_TIME] / new if new else 0
+            reused_time = stats[REUSED_TIME] / stats[REUSED] if stats[REUSED] else 0
+            lines.append(
+                f'{host}: {stats[REQUESTS]} requests, {100 * stats[REUSED] // stats[REQUESTS]}% reused, '
+                f'{new_time:.2f} s new, {reused_time:.2f} s reused')
+
+        return "\n".join(lines)
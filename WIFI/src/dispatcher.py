@@ -0,0 +1,248 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+from src.logger import get_logger
+from src.telemetry import telemetry
+
+logger = get_logger("uart")
+
+# Sequence numbers of the door board wrap around after this value, back to 1:
+# a 0 is the first request after it booted, see Link
+SEQ_LIMIT = 256
+
+# Fields of a deferred job
+KIND = 0
+SEQS = 1
+FIELDS = 2
+
+
+class Dispatcher:
+    """
+    Routes the requests of the door board to a handler by kind and sends back
+    the handler's result with the sequence number of the request. Quick
+    handlers run as soon as their request arrives. Deferred handlers, those
+    needing the network, are queued and run one per process() call, so quick
+    requests received meanwhile are not kept waiting behind them. Identical
+    deferred requests share a single run.
+
+    A request sent again after a timeout keeps its sequence number. If it was
+    already answered, the cached response is sent again without running the
+    handler a second time, so e.g. a notification is not queued twice. Error
+    responses are not cached, a request sent again after one is run again.
+    Answers are forgotten when the door board restarts, as its sequence
+    numbers start over.
+    """
+
+    def __init__(self, uart, codec, size: int = 8, history: int = 8) -> None:
+        """
+        Args:
+            uart: busio.UART, connected to the door board
+            codec: AsciiCodec or BinaryCodec, see codec_for()
+            size: int, maximum number of queued deferred jobs
+            history: int, number of answered requests remembered
+        """
+
+        self.uart = uart
+        self.codec = codec
+        self.reader = codec.reader(uart, "?")
+        self.size = size
+
+        # Handlers by kind, each [function, deferred], and deferred jobs, each
+        # [kind, sequence numbers, fields]
+        self._handlers = {}
+        self._repeatable = set()
+        self._jobs = []
+
+        # Last answered requests, oldest first, each [kind, sequence number,
+        # fields, response], and newest sequence number received
+        self.history = history
+        self._answered = []
+        self._newest = None
+
+        self.handled = 0
+        self.merged = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.restarts = 0
+
+    def register(self, kind: str, handler, deferred: bool = False,
+                 repeatable: bool = False) -> None:
+        """
+        Sets the handler of a kind of request.
+
+        Args:
+            kind: str, kind of request, e.g. 'W'
+            handler: function called with the request fields, returning the
+                response fields, () for a bare acknowledgement or None for an
+                error response
+            deferred: bool, whether the handler is slow and must be queued
+            repeatable: bool, whether the handler is quick and has no side
+                effects, so a request sent again gets a fresh response rather
+                than the remembered one, e.g. the time
+        Returns:
+            None
+        """
+
+        self._handlers[kind] = [handler, deferred]
+        if repeatable:
+            self._repeatable.add(kind)
+
+    def poll(self) -> None:
+        """Handles all requests received, running only quick handlers."""
+
+        # Frame by frame, frames() would allocate a generator on every poll
+        while True:
+            frame = self.reader.read_frame()
+            if frame is None:
+                break
+
+            request = self.codec.decode("?", frame)
+            if request is None:
+                telemetry.add("frame_errors")
+                self.rejected += 1
+                logger.error('UART: invalid request %s', frame)
+                continue
+
+            telemetry.add("frames")
+            kind, seq, fields = request
+            self._follow(seq)
+
+            # Sent again after a timeout, answer again without running it
+            answered = self._answer_of(kind, seq, fields)
+            if answered is not None:
+                self.duplicates += 1
+                logger.debug("UART: %s %s already answered", kind, seq)
+                self.respond(kind, seq, answered[3])
+                continue
+
+            handler = self._handlers.get(kind)
+            if handler is None:
+                self.rejected += 1
+                logger.error('UART: unknown request %s', kind)
+                self.respond(kind, seq, None)
+                continue
+
+            if not handler[1]:
+                response = self._run(handler[0], fields)
+                if kind not in self._repeatable:
+                    self._remember(kind, seq, fields, response)
+                self.respond(kind, seq, response)
+                continue
+
+            # Deferred: join an identical queued job, or queue a new one. A
+            # request sent again while queued is already there.
+            for job in self._jobs:
+                if job[KIND] == kind and job[FIELDS] == fields:
+                    if seq in job[SEQS]:
+                        self.duplicates += 1
+                    else:
+                        job[SEQS].append(seq)
+                        self.merged += 1
+                    break
+            else:
+                if len(self._jobs) < self.size:
+                    self._jobs.append([kind, [seq], fields])
+                else:
+                    self.rejected += 1
+                    logger.error('UART: too many requests, %s rejected', kind)
+                    self.respond(kind, seq, None)
+
+    def process(self) -> None:
+        """Runs the oldest deferred job, answering all the requests it serves."""
+
+        if not self._jobs:
+            return
+
+        kind, seqs, fields = self._jobs.pop(0)
+        response = self._run(self._handlers[kind][0], fields)
+        for seq in seqs:
+            self._remember(kind, seq, fields, response)
+            self.respond(kind, seq, response)
+
+    def respond(self, kind: str, seq, fields) -> None:
+        """
+        Sends a response over UART, echoing the sequence number of the request.
+
+        Args:
+            kind: str, kind of the request
+            seq: int, sequence number of the request, None if it had none
+            fields: tuple, fields of the response, None for an error response
+        Returns:
+            None
+        """
+
+        frame = self.codec.encode("!", kind, seq, fields)
+        self.uart.write(frame)
+        telemetry.add("uart_out", len(frame))
+        logger.debug("UART <-- %s", frame)
+
+    def _follow(self, seq) -> None:
+        """
+        Tracks the sequence numbers of the door board and forgets the answers
+        when it restarts: a 0 following other numbers, or a number too far
+        behind the newest one to be a request sent again.
+        """
+
+        newest = self._newest
+        if seq is None or seq == newest:
+            return
+
+        if newest is not None:
+            behind = (newest - seq) % SEQ_LIMIT
+            ahead = (seq - newest) % SEQ_LIMIT
+            if seq and behind <= self.history:
+                return
+            if not seq or ahead >= SEQ_LIMIT // 2:
+                self.restarts += 1
+                self._answered = []
+                logger.info("UART: door board restarted, answers forgotten")
+
+        self._newest = seq
+
+    def _answer_of(self, kind: str, seq, fields):
+        """Remembered answer of the same request, None if there is none.
+        Requests without a sequence number can't be told apart, they are
+        never considered the same."""
+
+        if seq is None:
+            return None
+
+        for answered in self._answered:
+            if answered[1] == seq and answered[0] == kind and answered[2] == fields:
+                return answered
+
+        return None
+
+    def _remember(self, kind: str, seq, fields, response) -> None:
+        """Keeps the response of a request, forgetting the oldest one if needed.
+        Error responses are not kept, the request is run again if sent again."""
+
+        if seq is None or response is None:
+            return
+
+        if len(self._answered) >= self.history:
+            self._answered.pop(0)
+        self._answered.append([kind, seq, fields, response])
+
+    def _run(self, handler, fields):
+        """Runs a handler, a failing handler gives an error response."""
+
+        self.handled += 1
+        try:
+            return handler(fields)
+        except (OSError, RuntimeError, ValueError) as error:
+            logger.error('UART: request failed (%s)', error)
+            return None
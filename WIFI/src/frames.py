@@ -0,0 +1,189 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# NOTE: this file is shared by both boards, keep NOWIFI/src/frames.py and
+# WIFI/src/frames.py identical.
+
+from src.telemetry import telemetry
+
+# End of frame marker
+FRAME_END = 59  # ord(";")
+
+# Separator between the kind of a frame and its sequence number
+SEQ_MARK = "#"
+
+
+def encode_frame(start: str, kind: str, seq=None, payload=None) -> bytes:
+    """
+    Builds a frame '<start><kind>[#<seq>][:<payload>];', e.g. '?W#3;' or
+    '!W#3:Clear^...;'.
+
+    Args:
+        start: str, start of frame marker, '?' for requests, '!' for responses
+        kind: str, kind of the frame, e.g. 'W'
+        seq: int, sequence number, None for a frame without one
+        payload: str, payload, None for a frame without one
+    Returns:
+        bytes, encoded frame
+    """
+
+    body = kind if seq is None else f"{kind}{SEQ_MARK}{seq}"
+    if payload is not None:
+        body = f"{body}:{payload}"
+    return bytes(f"{start}{body};", "ascii")
+
+
+def decode_frame(body: str):
+    """
+    Splits a frame body as returned by FrameReader into its parts, the inverse
+    of encode_frame(). Frames without a sequence number are still accepted.
+
+    Args:
+        body: str, frame body without markers
+    Returns:
+        kind: str, kind of the frame
+        seq: int, sequence number, None if missing or invalid
+        payload: str, payload, None if missing
+    """
+
+    colon = body.find(":")
+    head = body if colon < 0 else body[:colon]
+    payload = None if colon < 0 else body[colon + 1:]
+
+    mark = head.find(SEQ_MARK)
+    if mark < 0:
+        return head, None, payload
+
+    try:
+        seq = int(head[mark + 1:])
+    except ValueError:
+        seq = None
+    return head[:mark], seq, payload
+
+
+class FrameReader:
+    """
+    Reads frames in the form '<start>body;' from a UART. Whatever is waiting in
+    the UART is read in a single call into a preallocated buffer and complete
+    frame bodies are returned without the start and end markers.
+    """
+
+    def __init__(self, uart, start: str = "!", size: int = 256) -> None:
+        """
+        Args:
+            uart: busio.UART (or any object with in_waiting and readinto)
+            start: str, start of frame marker, '?' for requests, '!' for responses
+            size: int, size of the read buffer and maximum frame length
+        """
+
+        self.uart = uart
+        self.start = ord(start)
+        self.dropped = 0
+
+        # Chunk read from the UART and position of the next byte to scan
+        self._chunk = bytearray(size)
+        self._chunk_view = memoryview(self._chunk)
+        self._pos = 0
+        self._end = 0
+
+        # Body of the frame being received, -1 when outside a frame
+        self._frame = bytearray(size)
+        self._frame_len = -1
+
+    def read_frame(self):
+        """
+        Returns the next complete frame body, reading from the UART only when
+        the previously read chunk has been fully scanned. Never blocks.
+
+        Args:
+            None
+        Returns:
+            str, frame body without markers, or None if no frame is complete
+        """
+
+        chunk = self._chunk
+        frame = self._frame
+        size = len(frame)
+
+        while True:
+
+            # Refill the chunk with whatever is waiting in the UART
+            if self._pos == self._end:
+                waiting = self.uart.in_waiting
+                if not waiting:
+                    return None
+
+                if waiting >= size:
+                    read = self.uart.readinto(self._chunk_view)
+                else:
+                    read = self.uart.readinto(self._chunk_view[:waiting])
+                if not read:
+                    return None
+
+                telemetry.add("uart_in", read)
+                self._pos = 0
+                self._end = read
+
+            # Scan the chunk
+            while self._pos < self._end:
+                byte = chunk[self._pos]
+                self._pos += 1
+
+                # Start of frame, discard any partial frame
+                if byte == self.start:
+                    if self._frame_len > 0:
+                        self.dropped += 1
+                    self._frame_len = 0
+
+                # Bytes outside a frame are ignored
+                elif self._frame_len < 0:
+                    continue
+
+                # End of frame. Line noise may leave bytes which are not
+                # text, the frame is then dropped.
+                elif byte == FRAME_END:
+                    length = self._frame_len
+                    self._frame_len = -1
+                    try:
+                        return frame[:length].decode("ascii")
+                    except UnicodeError:
+                        self.dropped += 1
+
+                # Frame too long, drop it
+                elif self._frame_len == size:
+                    self._frame_len = -1
+                    self.dropped += 1
+
+                # Else, accumulate frame bytes
+                else:
+                    frame[self._frame_len] = byte
+                    self._frame_len += 1
+
+    def frames(self):
+        """
+        Generator over all frames that can be completed with the bytes waiting
+        in the UART. Stopping early does not lose any byte.
+
+        Args:
+            None
+        Returns:
+            generator of str, frame bodies
+        """
+
+        frame = self.read_frame()
+        while frame is not None:
+            yield frame
+            frame = self.read_frame()
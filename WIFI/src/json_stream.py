@@ -0,0 +1,281 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Bytes with a meaning in json
+QUOTE = 0x22        # "
+BACKSLASH = 0x5C    # \
+OBJECT_START = 0x7B # {
+OBJECT_END = 0x7D   # }
+ARRAY_START = 0x5B  # [
+ARRAY_END = 0x5D    # ]
+COLON = 0x3A        # :
+COMMA = 0x2C        # ,
+SPACE = 0x20        # outside strings, bytes up to space are whitespace
+
+# Characters following a backslash in a string
+ESCAPES = {
+    0x22: 0x22, 0x5C: 0x5C, 0x2F: 0x2F, 0x62: 0x08,
+    0x66: 0x0C, 0x6E: 0x0A, 0x72: 0x0D, 0x74: 0x09,
+}
+
+# Parser states
+VALUE = 0
+STRING = 1
+ESCAPE = 2
+UNICODE = 3
+BARE = 4
+SURROGATE = 5   # after the first half of a surrogate pair, e.g. \ud83d
+
+# Surrogates of UTF-16, escaped in pairs for characters above U+FFFF
+HIGH_SURROGATE = 0xD800
+LOW_SURROGATE = 0xDC00
+SURROGATE_END = 0xE000
+
+# Character replacing a surrogate without its other half
+REPLACEMENT = 0xFFFD
+
+
+class JSONExtractor:
+    """
+    Extracts a few values from a json document fed in chunks, in a single pass
+    and without building the document. Only the containers enclosing the
+    current position are tracked. Wanted values are given as paths of object
+    keys and array indexes, e.g. ("weather", 0, "main"), and must be strings,
+    numbers, booleans or null.
+    """
+
+    def __init__(self, paths, size: int = 128) -> None:
+        """
+        Args:
+            paths: list of tuples, paths of the wanted values
+            size: int, maximum length of keys and wanted strings
+        """
+
+        self.paths = set(paths)
+        self.values = {}
+
+        # Enclosing containers, each [key or index, is object, expecting key]
+        self._stack = []
+        self._state = VALUE
+
+        # Token being read, hex digits of a \u escape and the first half of a
+        # surrogate pair waiting for the second one
+        self._token = bytearray(size)
+        self._length = 0
+        self._unicode = 0
+        self._digits = 0
+        self._high = 0
+
+    def done(self) -> bool:
+        """Whether all wanted values were found."""
+
+        return len(self.values) == len(self.paths)
+
+    def feed(self, chunk) -> None:
+        """
+        Parses the next chunk of the document.
+
+        Args:
+            chunk: bytes, next part of the document
+        Returns:
+            None
+        Raises:
+            ValueError: if the document is not json, e.g. an HTML page
+        """
+
+        for byte in chunk:
+            state = self._state
+
+            if state == STRING:
+                if byte == QUOTE:
+                    self._state = VALUE
+                    self._string_end()
+                elif byte == BACKSLASH:
+                    self._state = ESCAPE
+                else:
+                    self._append(byte)
+                continue
+
+            if state == ESCAPE:
+                if byte == 0x75:  # u
+                    self._state = UNICODE
+                    self._unicode = 0
+                    self._digits = 0
+                else:
+                    self._state = STRING
+                    self._unpaired()
+                    self._append(ESCAPES.get(byte, byte))
+                continue
+
+            if state == UNICODE:
+                self._unicode = self._unicode * 16 + int(chr(byte), 16)
+                self._digits += 1
+                if self._digits == 4:
+                    self._state = STRING
+                    self._escaped(self._unicode)
+                continue
+
+            if state == SURROGATE:
+
+                # Anything but another escape leaves the first half alone
+                if byte == BACKSLASH:
+                    self._state = ESCAPE
+                    continue
+                self._unpaired()
+                if byte == QUOTE:
+                    self._state = VALUE
+                    self._string_end()
+                else:
+                    self._state = STRING
+                    self._append(byte)
+                continue
+
+            if state == BARE:
+                if (byte <= SPACE or byte == COMMA or
+                        byte == OBJECT_END or byte == ARRAY_END):
+                    self._state = VALUE
+                    self._bare_end()
+                else:
+                    self._append(byte)
+                    continue
+
+            # Structure
+            if byte <= SPACE:
+                continue
+            elif byte == QUOTE:
+                self._state = STRING
+                self._length = 0
+            elif byte == OBJECT_START:
+                self._stack.append([None, True, True])
+            elif byte == ARRAY_START:
+                self._stack.append([0, False, False])
+            elif byte == OBJECT_END or byte == ARRAY_END:
+                self._top(byte)
+                self._stack.pop()
+            elif byte == COLON:
+                self._top(byte)[2] = False
+            elif byte == COMMA:
+                top = self._top(byte)
+                if top[1]:
+                    top[2] = True
+                else:
+                    top[0] += 1
+            else:
+                self._state = BARE
+                self._length = 0
+                self._append(byte)
+
+    def _top(self, byte: int) -> list:
+        """
+        Innermost container, for a byte that is only valid within one.
+
+        Args:
+            byte: int, byte being parsed
+        Returns:
+            list, [key or index, is object, expecting key]
+        Raises:
+            ValueError: if outside any container, i.e. not a json document
+        """
+
+        if not self._stack:
+            raise ValueError(f"unexpected {chr(byte)!r} outside json containers")
+        return self._stack[-1]
+
+    def _escaped(self, code: int) -> None:
+        """
+        Adds the character of a \\u escape to the current token. Characters
+        above U+FFFF come as a pair of surrogates, the first half is kept until
+        the second one arrives. A surrogate without its other half becomes
+        U+FFFD, as it can't be encoded in UTF-8.
+
+        Args:
+            code: int, code of the escape
+        Returns:
+            None
+        """
+
+        if self._high:
+            if LOW_SURROGATE <= code < SURROGATE_END:
+                code = 0x10000 + ((self._high - HIGH_SURROGATE) << 10) + code - LOW_SURROGATE
+                self._high = 0
+            else:
+                self._unpaired()
+
+        if HIGH_SURROGATE <= code < LOW_SURROGATE:
+            self._high = code
+            self._state = SURROGATE
+            return
+        if LOW_SURROGATE <= code < SURROGATE_END:
+            code = REPLACEMENT
+
+        for encoded in chr(code).encode("utf-8"):
+            self._append(encoded)
+
+    def _unpaired(self) -> None:
+        """Replaces the first half of a surrogate pair, if any, left alone."""
+
+        if self._high:
+            self._high = 0
+            for encoded in chr(REPLACEMENT).encode("utf-8"):
+                self._append(encoded)
+
+    def _append(self, byte: int) -> None:
+        """Adds a byte to the current token, extra bytes are dropped."""
+
+        if self._length < len(self._token):
+            self._token[self._length] = byte
+            self._length += 1
+
+    def _is_wanted(self) -> bool:
+        """Whether the value at the current position is wanted."""
+
+        if not self._stack:
+            return False
+
+        return tuple(frame[0] for frame in self._stack) in self.paths
+
+    def _string_end(self) -> None:
+        """Handles a complete string, either a key or a value."""
+
+        top = self._stack[-1] if self._stack else None
+        if top and top[1] and top[2]:
+            top[0] = self._token[:self._length].decode("utf-8")
+        elif self._is_wanted():
+            self._store(self._token[:self._length].decode("utf-8"))
+
+    def _bare_end(self) -> None:
+        """Handles a complete number, boolean or null."""
+
+        if not self._is_wanted():
+            return
+
+        token = self._token[:self._length].decode("ascii")
+        if token == "true":
+            value = True
+        elif token == "false":
+            value = False
+        elif token == "null":
+            value = None
+        elif "." in token or "e" in token or "E" in token:
+            value = float(token)
+        else:
+            value = int(token)
+        self._store(value)
+
+    def _store(self, value) -> None:
+        """Stores a wanted value."""
+
+        self.values[tuple(frame[0] for frame in self._stack)] = value
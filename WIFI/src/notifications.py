@@ -0,0 +1,125 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+import time
+
+from src.logger import get_logger
+from src.telemetry import telemetry
+
+logger = get_logger("notifications")
+
+# Fields of a queued notification
+TITLE = 0
+DATA = 1
+TAGS = 2
+COUNT = 3
+ATTEMPTS = 4
+DUE = 5
+
+
+class NotificationQueue:
+    """
+    Bounded queue of notifications waiting to be sent. Requests only enqueue,
+    sending happens in a separate phase with process(). A notification equal to
+    one already waiting is merged with it, and failed sends are retried with
+    exponential backoff.
+    """
+
+    def __init__(self, send, size: int = 8, retries: int = 3,
+                 backoff: float = 2.0, clock=None) -> None:
+        """
+        Args:
+            send: function(title, data, tags) sending a notification, returns
+                True on success
+            size: int, maximum number of notifications waiting
+            retries: int, times a failed notification is sent again
+            backoff: float, seconds before the first retry, doubled every time
+            clock: function returning the current time in seconds
+        """
+
+        self.send = send
+        self.size = size
+        self.retries = retries
+        self.backoff = backoff
+        self.clock = clock if clock else time.monotonic
+
+        self._queue = []
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def push(self, title: str, data: str, tags: str = "") -> bool:
+        """
+        Adds a notification to the queue.
+
+        Args:
+            title: str, title of the notification
+            data: str, data of the notification
+            tags: str, tags of the notification, comma separated
+        Returns:
+            bool, False if the queue is full and the notification was dropped
+        """
+
+        # Same notification already waiting
+        for entry in self._queue:
+            if entry[TITLE] == title and entry[DATA] == data and entry[TAGS] == tags:
+                entry[COUNT] += 1
+                self.merged += 1
+                return True
+
+        if len(self._queue) >= self.size:
+            self.dropped += 1
+            telemetry.add("notifications_dropped")
+            logger.error('Notifications: queue full, dropped "%s"', title)
+            return False
+
+        self._queue.append([title, data, tags, 1, 0, self.clock()])
+        return True
+
+    def process(self) -> None:
+        """Sends the oldest notification which is due, if any."""
+
+        now = self.clock()
+        for index in range(len(self._queue)):
+            if self._queue[index][DUE] <= now:
+                break
+        else:
+            return
+
+        entry = self._queue[index]
+
+        data = entry[DATA]
+        if entry[COUNT] > 1:
+            data = f"{data} ({entry[COUNT]} times)"
+
+        if self.send(entry[TITLE], data, entry[TAGS]):
+            self._queue.pop(index)
+            self.sent += 1
+            telemetry.add("notifications_sent")
+            return
+
+        # Failed, retry later or give up
+        entry[ATTEMPTS] += 1
+        if entry[ATTEMPTS] > self.retries:
+            self._queue.pop(index)
+            self.dropped += 1
+            telemetry.add("notifications_dropped")
+            logger.error('Notifications: giving up on "%s"', entry[TITLE])
+        else:
+            entry[DUE] = self.clock() + self.backoff * 2 ** (entry[ATTEMPTS] - 1)
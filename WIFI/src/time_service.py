@@ -0,0 +1,218 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# NOTE: this file is shared by both boards, keep NOWIFI/src/time_service.py and
+# WIFI/src/time_service.py identical.
+
+import time
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+# Differences from the reference above which the clock is stepped rather than
+# slewed, in milliseconds
+STEP_THRESHOLD = 10 * 1000
+
+# Milliseconds of monotonic time over which a millisecond of difference is
+# slewed, i.e. the clock runs at most 5% faster or slower while correcting
+SLEW_FACTOR = 20
+
+# Shortest time between the first and the last sync for the drift to be
+# estimated, in milliseconds: the reference has a resolution of one second,
+# over an hour that is still about 280 ppm
+MIN_BASELINE = 60 * 60 * 1000
+
+# Largest drift believed, in parts per million. Crystals drift by tens of ppm,
+# anything far beyond comes from a wrong reference.
+MAX_DRIFT = 5000
+
+
+def _ticks() -> int:
+    """Monotonic time in milliseconds."""
+
+    return time.monotonic_ns() // 1000000
+
+
+class TimeService:
+    """
+    Wall clock (epoch seconds, local time) kept from the monotonic clock and
+    synced to a reference from time to time: NTP on the WIFI board, the WIFI
+    board on the other one.
+
+    Between two syncs the time is the monotonic time elapsed since the last
+    one, corrected by the drift of the local clock. The drift is estimated
+    from the first and the last sync, so the estimate gets better as the
+    board runs. Small differences found at a sync are slewed, so the time
+    never jumps nor goes back, and only large ones (e.g. the first sync) step
+    the clock.
+
+    The time is kept as day and milliseconds since midnight, so the seconds
+    since midnight, what the schedule needs, are read without allocating
+    a datetime.
+    """
+
+    def __init__(self, epoch: int = None, ticks=None) -> None:
+        """
+        Args:
+            epoch: int, initial time in epoch seconds, the RTC time if None
+            ticks: function returning the monotonic time in milliseconds, as
+                an int
+        """
+
+        self.ticks = ticks if ticks else _ticks
+
+        # Drift of the local clock in ppm, positive if it runs fast
+        self.drift = 0
+
+        # Number of syncs, time of the last one and difference found then
+        self.syncs = 0
+        self.last_sync = None
+        self.last_error = 0
+
+        # Time at the anchor: monotonic milliseconds, day and milliseconds
+        # since midnight, the latter possibly more than a day
+        self._anchor = self.ticks()
+        self._day = 0
+        self._offset = 0
+        self._set(self._anchor, (time.time() if epoch is None else epoch) * 1000)
+
+        # Difference still to be slewed since the anchor, milliseconds
+        self._slew = 0
+
+        # First sync after the last step, from which the drift is estimated:
+        # monotonic and reference milliseconds
+        self._base = None
+        self._base_reference = 0
+
+    @property
+    def synced(self) -> bool:
+        """Whether the time was synced at least once."""
+
+        return self.syncs > 0
+
+    def stale(self, max_age: float) -> bool:
+        """
+        Args:
+            max_age: float, seconds after which a sync is too old
+        Returns:
+            bool, True if never synced or last synced more than max_age ago
+        """
+
+        return (self.last_sync is None or
+                self.ticks() - self.last_sync > max_age * 1000)
+
+    def sync(self, epoch: int, at: int = None) -> None:
+        """
+        Syncs to a reference time.
+
+        Args:
+            epoch: int, reference time in epoch seconds, truncated
+            at: int, monotonic milliseconds at which the reference was read,
+                now if None
+        Returns:
+            None
+        """
+
+        at = self.ticks() if at is None else at
+
+        # The reference is truncated to the second, half a second is closer on
+        # average
+        reference = epoch * 1000 + 500
+        predicted = self._ms(at)
+        error = reference - predicted
+
+        if self._base is None or abs(error) > STEP_THRESHOLD:
+            self._set(at, reference)
+            self._slew = 0
+            self._base = at
+            self._base_reference = reference
+        else:
+            self._set(at, predicted)
+            self._slew = error
+
+            # Drift since the first sync, the longer the better
+            elapsed = at - self._base
+            if elapsed >= MIN_BASELINE:
+                drift = (elapsed - (reference - self._base_reference)) * 1000000 // elapsed
+                self.drift = max(-MAX_DRIFT, min(drift, MAX_DRIFT))
+
+        self.syncs += 1
+        self.last_sync = at
+        self.last_error = error
+
+    def time(self) -> int:
+        """Current time in epoch seconds."""
+
+        return self._ms(self.ticks()) // 1000
+
+    def ms_of_day(self) -> int:
+        """Milliseconds since midnight."""
+
+        return (self._offset + self._elapsed(self.ticks())) % MS_PER_DAY
+
+    def seconds_of_day(self) -> int:
+        """Seconds since midnight, see Schedule."""
+
+        return self.ms_of_day() // 1000
+
+    def report(self) -> str:
+        """
+        Summary of the syncs.
+
+        Args:
+            None
+        Returns:
+            str, the summary
+        """
+
+        if not self.synced:
+            return "never synced"
+
+        age = (self.ticks() - self.last_sync) // 1000
+        return (f'{self.syncs} syncs, last {age} s ago off by {self.last_error} ms, '
+                f'drift {self.drift} ppm')
+
+    def _set(self, at: int, ms: int) -> None:
+        """Moves the anchor to monotonic milliseconds 'at', epoch milliseconds 'ms'."""
+
+        self._anchor = at
+        self._day, self._offset = divmod(ms, MS_PER_DAY)
+
+    def _ms(self, at: int) -> int:
+        """Epoch milliseconds at monotonic milliseconds 'at'."""
+
+        return self._day * MS_PER_DAY + self._offset + self._elapsed(at)
+
+    def _elapsed(self, at: int) -> int:
+        """
+        Milliseconds elapsed since the anchor at monotonic milliseconds 'at',
+        corrected by the drift and the part of the slew applied so far.
+        """
+
+        elapsed = at - self._anchor
+
+        # Drift correction in ppm of whole seconds, keeping the product small
+        elapsed -= elapsed // 1000 * self.drift // 1000
+
+        slew = self._slew
+        if slew:
+            applied = elapsed // SLEW_FACTOR
+            elapsed += slew if applied >= abs(slew) else (applied if slew > 0 else -applied)
+
+        return elapsed
+
+
+# Time of the board, see TimeService
+time_service = TimeService()
@@ -0,0 +1,369 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Benchmarks the hot paths of the control loop on desktop Python, with both
+# boards loaded as by simulate.py. For each path it reports operations per
+# second, median and 99th percentile latency, and the memory allocated by an
+# operation as seen by tracemalloc: peak bytes and blocks still held after it.
+# Desktop numbers are not board numbers, compare runs on the same machine:
+#
+#   python3 tools/benchmark.py --save before.json
+#   ... change the code ...
+#   python3 tools/benchmark.py --compare before.json
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from simulate import Scenario, Simulation
+
+# Operations timed per benchmark, operations traced for the bytes they
+# allocate, and operations between snapshots for the blocks
+ITERATIONS = 20000
+TRACED = 2000
+SNAPSHOTS = 100
+
+# Relative slowdown of the median above which a benchmark is a regression
+THRESHOLD = 0.10
+
+# Flex sensor trace replayed by the door sensor, in a loop
+DOOR_TRACE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces", "door_push.txt")
+
+# Synthetic journal queried by day: a year of events, one every half hour
+JOURNAL_DAYS = 365
+JOURNAL_EVENTS_PER_DAY = 48
+
+WEATHER_JSON = json.dumps({
+    "coord": {"lon": 11.12, "lat": 46.07},
+    "weather": [{"id": 803, "main": "Clouds", "description": "broken clouds", "icon": "04d"}],
+    "base": "stations",
+    "main": {"temp": 285.1, "feels_like": 284.2, "pressure": 1016, "humidity": 71},
+    "visibility": 10000,
+    "wind": {"speed": 1.5, "deg": 220},
+    "clouds": {"all": 75},
+    "dt": 1709280000,
+    "sys": {"type": 2, "id": 2000, "country": "IT", "sunrise": 1709272300, "sunset": 1709313400},
+    "timezone": 3600,
+    "id": 3165243,
+    "name": "Trento",
+    "cod": 200,
+}).encode()
+
+
+def stepper(simulation, factory):
+    """
+    Operation running one step of a task, the task is restarted when over.
+    The virtual clock moves by the time the task asks to wait.
+    """
+
+    task = [factory()]
+
+    def step():
+        try:
+            delay = next(task[0])
+        except StopIteration:
+            task[0] = factory()
+            delay = next(task[0])
+        simulation.time.now += delay
+
+    return step
+
+
+def benchmarks(simulation, state_machine, journal_dir: str):
+    """Hot paths to measure, as (name, operation) tuples. Journals are written
+    in 'journal_dir'."""
+
+    door = simulation.door_modules
+    wifi = simulation.wifi_modules
+    simulated = door["src.simulated"]
+    ascii_codec = door["src.codec"].AsciiCodec()
+    binary_codec = door["src.codec"].BinaryCodec()
+    weather = ("Clouds", 1709275900, 1709317000)
+
+    # UART carrying the same response over and over
+    def uart_reader(codec):
+        uart = simulated.FakeUART()
+        frame = codec.encode("!", "W", 7, weather)
+        reader = codec.reader(uart, "!")
+
+        def read():
+            uart.feed(frame)
+            codec.decode("!", reader.read_frame())
+
+        return read
+
+    ascii_frame = ascii_codec.encode("!", "W", 7, weather)[1:-1].decode()
+    binary_frame = binary_codec.encode("!", "W", 7, weather)[:-1]
+    extractor_class = wifi["src.json_stream"].JSONExtractor
+    paths = simulation.wifi.WEATHER_PATHS
+
+    def parse_weather():
+        extractor = extractor_class(paths)
+        extractor.feed(WEATHER_JSON)
+
+    # Whole RFID scan without tags, with its logs, as run every 5 seconds
+    def scan():
+        for delay in state_machine.read_RFID():
+            simulation.time.now += delay
+
+    # Door sensor sampling a recorded trace, one sample per call
+    trace_sensor = door["src.door_sensor"].DoorSensor(
+        simulated.TraceADC.from_file(DOOR_TRACE, loop=True))
+    samples = [0]
+
+    def door_trace():
+        samples[0] += 1
+        trace_sensor.sample(samples[0] * trace_sensor.period)
+
+    # Log calls: one below the level, one logged to the ring buffer only
+    log = door["src.logger"]
+    log_off = log.Logger("benchmark", log.INFO, None, log.ring)
+    log_ring = log.Logger("benchmark", log.DEBUG, None, log.ring)
+
+    # Journals: one appended to, one holding a year of events queried by day
+    journal_module = door["src.journal"]
+    appended = journal_module.Journal(os.path.join(journal_dir, "append.bin"))
+    year = journal_module.Journal(os.path.join(journal_dir, "year.bin"))
+    first_day = 1704067200 // journal_module.SECONDS_PER_DAY
+    step = journal_module.SECONDS_PER_DAY // JOURNAL_EVENTS_PER_DAY
+    for i in range(JOURNAL_DAYS * JOURNAL_EVENTS_PER_DAY):
+        year.record(first_day * journal_module.SECONDS_PER_DAY + i * step,
+                    journal_module.PET_IN + i % 2, 0xd951c359, i % 4)
+    year.flush()
+    epoch = [first_day * journal_module.SECONDS_PER_DAY]
+    days = random.Random(0)
+
+    def journal_append():
+        epoch[0] += step
+        appended.record(epoch[0], journal_module.PET_IN, 0xd951c359, 1)
+
+    def journal_day():
+        year.day(first_day + days.randrange(JOURNAL_DAYS))
+
+    # Seconds since midnight from the time service, and through a datetime
+    # as the control loop used to
+    time_service = door["src.time_service"].time_service
+
+    def seconds_datetime():
+        now = datetime.datetime.fromtimestamp(time_service.time(), datetime.timezone.utc)
+        return now.hour * 3600 + now.minute * 60 + now.second
+
+    # Whether the pet can go out: the inline check the states used to repeat,
+    # and the compiled policy
+    pet = next(iter(state_machine.pets))
+
+    def outdoor_list():
+        return (state_machine.weather in ['Clear', 'Clouds', 'Drizzle'] and
+                state_machine.temperature > 5.0 and
+                state_machine.temperature < 32.0)
+
+    leds = state_machine.leds
+    colors = [(0, 255, 0), (255, 0, 0)]
+    pulsing = []
+
+    def leds_fill():
+        colors.reverse()
+        leds.fill(colors[0])
+
+    def leds_pulse():
+        if not pulsing:
+            leds.pulse((0, 255, 0))
+            pulsing.append(True)
+        simulation.time.now += 0.05
+        leds.tick()
+
+    return [
+        ("go_to", state_machine.go_to),
+        ("update", stepper(simulation, state_machine.update)),
+        ("read_RFID", stepper(simulation, state_machine.read_RFID)),
+        ("door_open", stepper(simulation, state_machine.door_open)),
+        ("door.trace", door_trace),
+        ("temperature", state_machine.read_temperature),
+        ("policy.list", outdoor_list),
+        ("policy.can_go_out", lambda: state_machine.can_go_out(pet)),
+        ("weather.update", lambda: state_machine._on_weather(weather)),
+        ("clock.datetime", seconds_datetime),
+        ("clock.seconds", time_service.seconds_of_day),
+        ("rfid.scan", scan),
+        ("log.off", lambda: log_off.debug("RFID: read id is %08x", 0xd951c359)),
+        ("log.ring", lambda: log_ring.debug("RFID: read id is %08x", 0xd951c359)),
+        ("leds.fill", leds_fill),
+        ("leds.pulse", leds_pulse),
+        ("link.poll", simulation.hardware.link.poll),
+        ("ascii.encode", lambda: ascii_codec.encode("!", "W", 7, weather)),
+        ("ascii.decode", lambda: ascii_codec.decode("!", ascii_frame)),
+        ("ascii.read", uart_reader(ascii_codec)),
+        ("binary.encode", lambda: binary_codec.encode("!", "W", 7, weather)),
+        ("binary.decode", lambda: binary_codec.decode("!", binary_frame)),
+        ("binary.read", uart_reader(binary_codec)),
+        ("weather.parse", parse_weather),
+        ("journal.append", journal_append),
+        ("journal.day", journal_day),
+    ]
+
+
+def _empty() -> None:
+    """Operation doing nothing, traced to find the cost of tracing itself."""
+
+
+def trace(operation, traced: int, snapshots: int):
+    """
+    Allocations of an operation, including those of tracing it, see measure().
+
+    Returns:
+        float, peak bytes allocated per call
+        float, blocks allocated per call and still held when it returns
+    """
+
+    tracemalloc.start()
+    peak = 0
+    for _ in range(traced):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        operation()
+        peak += tracemalloc.get_traced_memory()[1] - current
+
+    # Blocks are counted per call and by allocation site, so the blocks one
+    # call frees don't hide those allocated by another, nor at another site
+    ignored = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    blocks = 0
+    for _ in range(snapshots):
+        before = tracemalloc.take_snapshot().filter_traces(ignored)
+        operation()
+        after = tracemalloc.take_snapshot().filter_traces(ignored)
+        blocks += sum(stat.count_diff for stat in after.compare_to(before, "lineno")
+                      if stat.count_diff > 0)
+    tracemalloc.stop()
+
+    return peak / traced, blocks / snapshots
+
+
+def measure(operation, iterations: int, traced: int):
+    """
+    Times an operation one call at a time, then traces its allocations. The
+    allocations of an empty operation are subtracted, so an operation which
+    allocates nothing shows none. Blocks freed before a call returns are not
+    seen by tracemalloc, they only count in the bytes.
+
+    Args:
+        operation: function, the operation
+        iterations: int, calls timed
+        traced: int, calls traced
+    Returns:
+        dict, ops per second, p50 and p99 latency in microseconds, peak bytes
+        and blocks allocated per operation
+    """
+
+    for _ in range(min(iterations // 10, 1000)):
+        operation()
+
+    clock = time.perf_counter_ns
+    latencies = []
+    for _ in range(iterations):
+        start = clock()
+        operation()
+        latencies.append(clock() - start)
+    latencies.sort()
+
+    snapshots = min(SNAPSHOTS, traced)
+    empty_bytes, empty_blocks = trace(_empty, traced, snapshots)
+    op_bytes, op_blocks = trace(operation, traced, snapshots)
+
+    return {
+        "ops": iterations * 1e9 / sum(latencies),
+        "p50": latencies[len(latencies) // 2] / 1000,
+        "p99": latencies[len(latencies) * 99 // 100] / 1000,
+        "bytes": max(0.0, op_bytes - empty_bytes),
+        "blocks": max(0.0, op_blocks - empty_blocks),
+    }
+
+
+def report(results, baseline=None, threshold: float = THRESHOLD):
+    """
+    Table of the results, with the change of the median against a baseline.
+
+    Returns:
+        str, the table
+        list of str, names of the benchmarks slower than the baseline
+    """
+
+    header = f'{"benchmark":<20}{"ops/s":>12}{"p50 us":>10}{"p99 us":>10}{"B/op":>10}{"blocks/op":>11}'
+    if baseline:
+        header += f'{"p50 change":>12}'
+    lines = [header]
+    regressions = []
+
+    for name, result in results.items():
+        line = (f'{name:<20}{result["ops"]:>12.0f}{result["p50"]:>10.2f}{result["p99"]:>10.2f}'
+                f'{result["bytes"]:>10.0f}{result["blocks"]:>11.2f}')
+        if baseline and name in baseline:
+            change = result["p50"] / baseline[name]["p50"] - 1
+            line += f'{change:>+11.0%}'
+            if change > threshold:
+                line += " !"
+                regressions.append(name)
+        lines.append(line)
+
+    return "\n".join(lines), regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks the control loop hot paths.")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS, help="calls timed per benchmark")
+    parser.add_argument("--only", help="comma separated benchmarks to run")
+    parser.add_argument("--link-mode", choices=("ascii", "binary"), help="UART protocol")
+    parser.add_argument("--save", help="write the results to a json file")
+    parser.add_argument("--compare", help="json file of a baseline run to compare with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="median slowdown reported as a regression, e.g. 0.1")
+    args = parser.parse_args()
+
+    simulation = Simulation(Scenario(), "2024-03-01", args.link_mode, 0.0, 0.0)
+    state_machine, _ = simulation.door.start()
+
+    only = args.only.split(",") if args.only else None
+    results = {}
+    with tempfile.TemporaryDirectory() as journal_dir:
+        for name, operation in benchmarks(simulation, state_machine, journal_dir):
+            if only is None or name in only:
+                results[name] = measure(operation, args.iterations,
+                                        min(TRACED, args.iterations))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    table, regressions = report(results, baseline, args.threshold)
+    print(table)
+
+    if args.save:
+        with open(args.save, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+
+    if regressions:
+        print(f'Regressions: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
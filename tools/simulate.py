@@ -0,0 +1,723 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Runs both boards in one desktop Python process: NOWIFI/code.py with the
+# simulated hardware backend and WIFI/code.py with a fake network, connected by
+# a loopback UART and driven by a virtual clock running as fast as the CPU
+# allows. Sensors follow a scenario file, see scenarios/day.txt. At the end the
+# state transitions, door actions and notifications are reported.
+#
+#   python3 tools/simulate.py [scenario] [--hours 24] [--link-mode binary]
+
+import argparse
+import calendar
+import datetime as _datetime
+import http.client
+import http.server
+import importlib.util
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time as _time
+import types
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SCENARIO = os.path.join(ROOT, "tools", "scenarios", "day.txt")
+
+# Timezone offset of the simulated place, in seconds
+TIMEZONE = 3600
+
+# Seconds between two rounds of the WIFI board main loop
+WIFI_STEP = 0.01
+
+# Simulated heap of a board: size and bytes allocated per second between two
+# collections
+HEAP_SIZE = 190 * 1024
+HEAP_ALLOCATION_RATE = 100
+
+EPOCH = _datetime.datetime(1970, 1, 1)
+
+
+class VirtualTime:
+    """
+    Clock shared by both boards. Monotonic time starts at 0 and only moves
+    when a board sleeps, the wall clock is the monotonic time plus an offset
+    set like an RTC. Functions in 'on_sleep' run after each sleep, that is
+    what the other board and the scenario do meanwhile.
+    """
+
+    def __init__(self, wall_start: int) -> None:
+        self.now = 0.0
+        self.wall_offset = wall_start
+        self.on_sleep = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def monotonic_ns(self) -> int:
+        return int(self.now * 1e9)
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.now += seconds
+        for hook in self.on_sleep:
+            hook()
+
+    def time(self) -> int:
+        return int(self.wall_offset + self.now)
+
+    def localtime(self, epoch=None):
+        return _time.gmtime(self.time() if epoch is None else epoch)
+
+    def mktime(self, t) -> int:
+        return calendar.timegm(tuple(t)[:6] + (0, 0, 0))
+
+    def set_wall(self, t) -> None:
+        self.wall_offset = self.mktime(t) - self.now
+
+    def clock_text(self) -> str:
+        """Wall clock as 'HH:MM:SS'."""
+
+        return _time.strftime("%H:%M:%S", self.localtime())
+
+
+class BoardTime(VirtualTime):
+    """
+    Clock of one board over the shared VirtualTime: its monotonic time runs
+    'skew' ppm faster (slower if negative) than the shared one, and its RTC is
+    its own.
+    """
+
+    def __init__(self, vt: VirtualTime, skew: float = 0.0) -> None:
+        self.vt = vt
+        self.rate = 1 + skew / 1e6
+        self.wall_offset = vt.wall_offset
+        self.on_sleep = vt.on_sleep
+
+    @property
+    def now(self) -> float:
+        return self.vt.now * self.rate
+
+    def sleep(self, seconds: float) -> None:
+        self.vt.sleep(seconds / self.rate)
+
+
+class Scenario:
+    """
+    Events of a scenario file, one per line: '<HH:MM[:SS]> <event> [args]'.
+    Times are seconds since the start of the simulated day. Without a file
+    the scenario is empty: nobody comes to the door.
+    """
+
+    def __init__(self, path: str = None) -> None:
+        self.cards = []
+        self.pushes = []
+        self.settings = []
+        self.sun = (7 * 3600, 19 * 3600)
+        if path is None:
+            return
+
+        with open(path) as scenario:
+            for number, line in enumerate(scenario, 1):
+                fields = line.split("#")[0].split()
+                if not fields:
+                    continue
+                try:
+                    self._add(_seconds(fields[0]), fields[1], fields[2:])
+                except (IndexError, ValueError) as error:
+                    raise SystemExit(f"{path}:{number}: invalid event ({error})")
+
+        self.settings.sort(key=lambda setting: setting[0])
+
+    def _add(self, at: int, event: str, args) -> None:
+        if event == "badge":
+            duration = float(args[1]) if len(args) > 1 else 1.0
+            self.cards.append((at, at + duration, int(args[0], 16)))
+        elif event == "door":
+            duration = float(args[0]) if args else 2.0
+            self.pushes.append((at, at + duration))
+        elif event in ("temperature", "weather", "sun"):
+            self.settings.append((at, event, args))
+        else:
+            raise ValueError(f"unknown event {event}")
+
+
+def _seconds(text: str) -> int:
+    """Seconds since midnight of 'HH:MM' or 'HH:MM:SS'."""
+
+    parts = [int(part) for part in text.split(":")]
+    return parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) > 2 else 0)
+
+
+class FakeResponse:
+    """Response of the fake network, see adafruit_requests.Response."""
+
+    def __init__(self, status_code: int, body: bytes = b"", socket=None) -> None:
+        self.status_code = status_code
+        self.body = body
+        self.socket = socket
+
+    def iter_content(self, chunk_size: int = 1):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class FakeNetwork:
+    """
+    Stand-in for adafruit_requests.Session: answers OpenWeatherMap with the
+    scenario weather and records the notifications posted to ntfy.sh.
+    """
+
+    def __init__(self, simulation) -> None:
+        self.simulation = simulation
+        self.weather_requests = 0
+        self.notifications = []
+        self._socket = object()
+
+    def request(self, method: str, url: str, headers=None, data=None, **kwargs):
+        simulation = self.simulation
+        if "openweathermap" in url:
+            self.weather_requests += 1
+            day = simulation.time.time() // 86400 * 86400 - TIMEZONE
+            sunrise, sunset = simulation.sun
+            body = json.dumps({
+                "weather": [{"main": simulation.weather}],
+                "sys": {"sunrise": day + sunrise, "sunset": day + sunset},
+                "timezone": TIMEZONE,
+            }).encode()
+            return FakeResponse(200, body, self._socket)
+
+        headers = headers if headers else {}
+        self.notifications.append((simulation.time.clock_text(),
+                                   headers.get("Title"), data))
+        return FakeResponse(200, b"", self._socket)
+
+
+class HTTPResponse:
+    """Response of HTTPSession, see adafruit_requests.Response."""
+
+    def __init__(self, response, socket) -> None:
+        self._response = response
+        self.status_code = response.status
+        self.socket = socket
+
+    def iter_content(self, chunk_size: int = 1):
+        while True:
+            chunk = self._response.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self) -> None:
+
+        # Read to the end, so the connection can carry the next request
+        self._response.read()
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class HTTPSession:
+    """
+    Stand-in for adafruit_requests.Session talking to real HTTP servers, e.g.
+    a local http.server: one connection per host, kept open between requests
+    unless the server closes it, and opened again once if a request finds it
+    closed, as adafruit_requests does. Requests to the hosts in 'hosts' go to
+    another address instead, e.g. the weather API to a LocalServer.
+    """
+
+    def __init__(self, hosts=None, timeout: float = 5) -> None:
+        self.hosts = hosts if hosts else {}
+        self.timeout = timeout
+        self._connections = {}
+
+    def request(self, method: str, url: str, headers=None, data=None, **kwargs):
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path + ("?" + parts.query if parts.query else "") or "/"
+        address = self.hosts.get(parts.netloc, parts.netloc)
+        for attempt in range(2):
+            connection = self._connections.get(address)
+            if connection is None:
+                connection = http.client.HTTPConnection(address, timeout=self.timeout)
+                self._connections[address] = connection
+            try:
+                connection.request(method, path, body=data, headers=headers or {})
+
+                # The connection drops its socket after a response closing it
+                socket = connection.sock
+                return HTTPResponse(connection.getresponse(), socket)
+            except (http.client.RemoteDisconnected, ConnectionError):
+                connection.close()
+                del self._connections[address]
+                if attempt:
+                    raise
+
+    def close(self) -> None:
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
+
+
+class LocalHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers GET requests with the body of the server, POST requests with their
+    own body, keeping the connection alive. Paths ending in '/close' close it
+    saying so, paths ending in '/drop' close it without a word, as a server
+    timing out an idle connection.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        self.answer(self.server.body)
+
+    def do_POST(self) -> None:
+        self.answer(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+    def answer(self, body: bytes) -> None:
+        self.send_response(200)
+        piece = self.server.piece
+        if piece:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+        if self.path.endswith("/close"):
+            self.send_header("Connection", "close")
+        self.end_headers()
+
+        if piece:
+            for start in range(0, len(body), piece):
+                data = body[start:start + piece]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.wfile.write(body)
+        if self.path.endswith(("/close", "/drop")):
+            self.close_connection = True
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class LocalServer(http.server.ThreadingHTTPServer):
+    """
+    HTTP server on a free local port, serving in a thread until shut down and
+    counting the connections it accepts. The body of GET responses is sent in
+    one go, or with chunked transfer encoding in pieces of 'piece' bytes.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, body: bytes = b'{"ok": true}', piece: int = 0) -> None:
+        super().__init__(("127.0.0.1", 0), LocalHandler)
+        self.body = body
+        self.piece = piece
+        self.connections = 0
+        self.address = "127.0.0.1:%d" % self.server_address[1]
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class SimulatedHeap:
+    """Heap of a board for the gc shim, allocating at a steady rate until the
+    next collection."""
+
+    def __init__(self, vt: VirtualTime) -> None:
+        self.vt = vt
+        self.collected = 0.0
+        self.collections = 0
+
+    def mem_alloc(self) -> int:
+        allocated = int((self.vt.now - self.collected) * HEAP_ALLOCATION_RATE)
+        return min(allocated, HEAP_SIZE)
+
+    def mem_free(self) -> int:
+        return HEAP_SIZE - self.mem_alloc()
+
+    def collect(self) -> None:
+        self.collected = self.vt.now
+        self.collections += 1
+
+
+def _module(name: str, **attributes):
+    """Module with the given attributes, installed in place of a real one."""
+
+    module = types.ModuleType(name)
+    for attribute, value in attributes.items():
+        setattr(module, attribute, value)
+    return module
+
+
+def _configure_uart(uart, receiver_buffer_size: int = 64, **kwargs):
+    """busio.UART() returning an end of the loopback link, with the buffer asked."""
+
+    uart.buffer_size = receiver_buffer_size
+    return uart
+
+
+def _common_shims(board: str, vt: VirtualTime):
+    """CircuitPython modules used by both boards."""
+
+    heap = SimulatedHeap(vt)
+
+    class datetime(_datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls.fromtimestamp(vt.time())
+
+        @classmethod
+        def fromtimestamp(cls, epoch, tz=None):
+            return cls(*(EPOCH + _datetime.timedelta(seconds=epoch)).timetuple()[:6])
+
+    class RTC:
+        @property
+        def datetime(self):
+            return vt.localtime()
+
+        @datetime.setter
+        def datetime(self, value):
+            vt.set_wall(value)
+
+    return {
+        "time": _module("time", monotonic=vt.monotonic, monotonic_ns=vt.monotonic_ns,
+                        sleep=vt.sleep, time=vt.time, localtime=vt.localtime,
+                        mktime=vt.mktime, struct_time=_time.struct_time),
+        "gc": _module("gc", collect=heap.collect, mem_free=heap.mem_free,
+                      mem_alloc=heap.mem_alloc, enable=lambda: None, disable=lambda: None),
+        "rtc": _module("rtc", RTC=RTC),
+        "adafruit_datetime": _module("adafruit_datetime", datetime=datetime,
+                                     timedelta=_datetime.timedelta,
+                                     date=_datetime.date),
+        "adafruit_logging": _module("adafruit_logging",
+                                    getLogger=lambda name: logging.getLogger(f"{board}.{name}"),
+                                    DEBUG=logging.DEBUG, INFO=logging.INFO,
+                                    WARNING=logging.WARNING, ERROR=logging.ERROR,
+                                    CRITICAL=logging.CRITICAL),
+    }
+
+
+def load_board(board: str, shims, extra=()):
+    """
+    Imports <board>/code.py with its own 'src' package. Shim modules replace
+    the CircuitPython ones during the import only, and the 'src' modules are
+    taken out of sys.modules afterwards so the other board can load its own.
+
+    Args:
+        board: str, 'NOWIFI' or 'WIFI'
+        shims: dict, maps a module name to the module to use instead
+        extra: tuple, names of other modules of the board to import
+    Returns:
+        code: module, the board's code.py
+        modules: dict, the board's 'src' modules by name
+    """
+
+    board_dir = os.path.join(ROOT, board)
+    saved = {name: sys.modules.get(name) for name in shims}
+    sys.modules.update(shims)
+    sys.path.insert(0, board_dir)
+    try:
+        spec = importlib.util.spec_from_file_location(
+            f"{board.lower()}_code", os.path.join(board_dir, "code.py"))
+        code = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(code)
+        for name in extra:
+            importlib.import_module(name)
+    finally:
+        sys.path.remove(board_dir)
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        modules = {name: sys.modules.pop(name) for name in list(sys.modules)
+                   if name == "src" or name.startswith("src.")}
+
+    return code, modules
+
+
+def load_src(board: str, names, vt: VirtualTime = None):
+    """
+    Imports modules of the 'src' package of a board without its code.py, see
+    load_board().
+
+    Args:
+        board: str, 'NOWIFI' or 'WIFI'
+        names: tuple, names of the modules, e.g. 'src.codec'
+        vt: VirtualTime, clock of the CircuitPython modules shimmed during the
+            import, None to shim none, which is enough for modules that use
+            none of them
+    Returns:
+        dict, the board's 'src' modules by name
+    """
+
+    shims = _common_shims(board, vt) if vt else {}
+    saved = {name: sys.modules.get(name) for name in shims}
+    sys.modules.update(shims)
+    board_dir = os.path.join(ROOT, board)
+    sys.path.insert(0, board_dir)
+    try:
+        for name in names:
+            importlib.import_module(name)
+    finally:
+        sys.path.remove(board_dir)
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        modules = {name: sys.modules.pop(name) for name in list(sys.modules)
+                   if name == "src" or name.startswith("src.")}
+
+    return modules
+
+
+class Simulation:
+    """Both boards, the link between them and the scenario."""
+
+    def __init__(self, scenario: Scenario, date: str, link_mode: str,
+                 delay: float, loss: float, log_level: int = logging.CRITICAL,
+                 journal: str = None, skew: float = 0.0) -> None:
+        self.scenario = scenario
+        wall_start = calendar.timegm(_time.strptime(date, "%Y-%m-%d"))
+        self.start_day = wall_start // (24 * 3600)
+        self.time = VirtualTime(wall_start)
+
+        # Clocks of the boards, the door one possibly skewed, the WIFI one
+        # exact like NTP
+        self.door_time = BoardTime(self.time, skew)
+        self.wifi_time = BoardTime(self.time)
+
+        # Scenario settings in force
+        self.weather = "Clear"
+        self.sun = scenario.sun
+        self.temperature = 20.0
+        self._next_setting = 0
+
+        self.transitions = []
+        self.door_actions = []
+
+        os.environ["HARDWARE_BACKEND"] = "simulated"
+        if link_mode:
+            os.environ["LINK_MODE"] = link_mode
+        os.environ.setdefault("NTFYSH_URL", "https://ntfy.sh/simulated")
+
+        # Messages the console would not show are not even formatted
+        os.environ.setdefault("LOG_LEVEL", logging.getLevelName(log_level))
+
+        # Door board, its simulated module also provides the loopback UART
+        self.door, self.door_modules = load_board(
+            "NOWIFI", _common_shims("NOWIFI", self.door_time), extra=("src.simulated",))
+        simulated = self.door_modules["src.simulated"]
+        door_uart, wifi_uart = simulated.loopback_pair(
+            self.time.monotonic, delay=delay, loss=loss,
+            buffer_size=self.door_modules["src.hardware"].UART_BUFFER_SIZE)
+        self.uarts = (door_uart, wifi_uart)
+
+        hardware = self.door_modules["src.hardware"].hardware
+        hardware.uart = door_uart
+        hardware.rfid = simulated.FakeMFRC522(self.time.monotonic, scenario.cards)
+        hardware.flex = simulated.ScriptedADC(self.time.monotonic, scenario.pushes)
+        hardware.sht = simulated.FakeSHT4x(self.temperature, self.time.monotonic)
+        hardware.motor_in = simulated.FakeServo(
+            on_move=lambda angle: self._door_action("in", angle))
+        hardware.motor_out = simulated.FakeServo(
+            on_move=lambda angle: self._door_action("out", angle))
+        self.hardware = hardware
+        self.door_modules["src.state_machine"].PETS_FILE = os.path.join(
+            ROOT, "NOWIFI", "pets.txt")
+        self.door_modules["src.state_machine"].POLICY_FILE = os.path.join(
+            ROOT, "NOWIFI", "policy.txt")
+
+        # Event journal, in a temporary directory unless kept
+        if journal is None:
+            self._journal_dir = tempfile.TemporaryDirectory()
+            journal = os.path.join(self._journal_dir.name, "events.bin")
+        self.door_modules["src.state_machine"].JOURNAL_FILE = journal
+
+        # WIFI board, with a fake network
+        self.network = FakeNetwork(self)
+        wifi_shims = _common_shims("WIFI", self.wifi_time)
+        radio = types.SimpleNamespace(connect=lambda ssid, password: None)
+        wifi_shims.update({
+            "board": _module("board", __getattr__=lambda name: name),
+            "busio": _module("busio", UART=lambda **kwargs: _configure_uart(wifi_uart, **kwargs)),
+            "wifi": _module("wifi", radio=radio),
+            "socketpool": _module("socketpool", SocketPool=lambda radio: None),
+            "adafruit_ntp": _module("adafruit_ntp", NTP=lambda pool, tz_offset=0: self),
+            "adafruit_requests": _module("adafruit_requests",
+                                         Session=lambda pool, context: self.network),
+        })
+        self.wifi, self.wifi_modules = load_board("WIFI", wifi_shims)
+
+        # The boards log everything, only show what was asked for
+        for board in ("NOWIFI", "WIFI"):
+            logging.getLogger(f"{board}.root").setLevel(log_level)
+
+        self._next_wifi_step = 0.0
+        self.time.on_sleep.append(self._background)
+
+    def _background(self) -> None:
+        """Runs the WIFI board and applies the scenario settings due."""
+
+        now = self.time.now
+        if now >= self._next_wifi_step:
+            self._next_wifi_step = now + WIFI_STEP
+            self.wifi.step()
+
+        settings = self.scenario.settings
+        while (self._next_setting < len(settings) and
+               settings[self._next_setting][0] <= now):
+            at, event, args = settings[self._next_setting]
+            self._next_setting += 1
+            if event == "temperature" and len(args) > 1:
+                self.hardware.sht.ramp(float(args[0]), float(args[1]) * 60)
+            elif event == "temperature":
+                self.hardware.sht.temperature = float(args[0])
+            elif event == "weather":
+                self.weather = args[0]
+            elif event == "sun":
+                self.sun = (_seconds(args[0]), _seconds(args[1]))
+
+    @property
+    def datetime(self):
+        """Time answered by the fake NTP server, the exact one."""
+
+        return self.time.localtime()
+
+    def _door_action(self, door: str, angle: float) -> None:
+        self.door_actions.append((self.time.clock_text(), door,
+                                  "locked" if angle == 0 else "unlocked"))
+
+    def run(self, hours: float) -> None:
+        """Boots the door board and runs both boards for some simulated hours."""
+
+        state_machine, scheduler = self.door.start()
+        self.state_machine = state_machine
+
+        switch_state = state_machine._switch_state
+
+        def recording_switch_state(new_state):
+            if new_state != state_machine.state:
+                self.transitions.append(
+                    (self.time.clock_text(),
+                     type(state_machine.states[new_state]).__name__))
+            switch_state(new_state)
+
+        state_machine._switch_state = recording_switch_state
+        scheduler.run(duration=hours * 3600)
+
+    def report(self) -> str:
+        """Summary of what happened."""
+
+        lines = ["State transitions:"]
+        lines += [f"  {at} {state}" for at, state in self.transitions]
+        lines.append("Door actions:")
+        lines += [f"  {at} {door} {action}" for at, door, action in self.door_actions]
+        lines.append("Notifications:")
+        lines += [f"  {at} {title}: {data}" for at, title, data in self.network.notifications]
+        lines.append("Pets:")
+        lines += [f"  {pet.name}: {'inside' if pet.inside else 'outside'}"
+                  for pet in self.state_machine.pets]
+        lines.append(f"Link: {self.hardware.link.report()}")
+        lines.append(f"UART overflows: door {self.uarts[0].overflowed} B, "
+                     f"WIFI {self.uarts[1].overflowed} B")
+        lines.append(f"Weather API calls: {self.network.weather_requests}")
+        lines.append(f"RFID: {self.hardware.rfid.requests} requests, "
+                     f"{self.hardware.rfid.reads} reads")
+        lines.append(f"GC: {self.state_machine.gc_manager.report()}")
+        lines.append(f"Temperature: {self.state_machine.temperature_service.report()}")
+
+        # Time of the door board against the exact one
+        time_service = self.door_modules["src.time_service"].time_service
+        day = 24 * 3600 * 1000
+        exact = int((self.time.wall_offset + self.time.now) * 1000) % day
+        error = (time_service.ms_of_day() - exact + day // 2) % day - day // 2
+        lines.append(f"Time: door off by {error} ms, {time_service.report()}")
+
+        # Events of the simulated day, read back from the journal
+        journal_module = self.door_modules["src.journal"]
+        journal = self.state_machine.journal
+        events = journal.day(self.start_day)
+        counts = {}
+        for _, _, event, _, _ in events:
+            name = journal_module.EVENT_NAMES[event]
+            counts[name] = counts.get(name, 0) + 1
+        lines.append(f"Journal: {journal.count} records, first day "
+                     + ", ".join(f"{count} {name}" for name, count in counts.items()))
+        return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulates both boards of the pet door.")
+    parser.add_argument("scenario", nargs="?", default=DEFAULT_SCENARIO,
+                        help="scenario file")
+    parser.add_argument("--hours", type=float, default=24, help="simulated hours")
+    parser.add_argument("--date", default="2024-03-01", help="simulated day, YYYY-MM-DD")
+    parser.add_argument("--link-mode", choices=("ascii", "binary"), help="UART protocol")
+    parser.add_argument("--delay", type=float, default=0.002,
+                        help="UART delay in seconds")
+    parser.add_argument("--loss", type=float, default=0.0,
+                        help="probability of losing a UART frame")
+    parser.add_argument("--journal", help="event journal file, kept after the run")
+    parser.add_argument("--skew", type=float, default=0.0,
+                        help="drift of the door board clock in ppm, positive if fast")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the boards' logs")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(name)s %(levelname)s %(message)s")
+
+    simulation = Simulation(Scenario(args.scenario), args.date, args.link_mode,
+                            args.delay, args.loss,
+                            logging.DEBUG if args.verbose else logging.CRITICAL,
+                            args.journal, args.skew)
+
+    start = _time.perf_counter()
+    simulation.run(args.hours)
+    elapsed = _time.perf_counter() - start
+
+    print(simulation.report())
+    print(f"Simulated {args.hours:g} h in {elapsed:.1f} s "
+          f"({args.hours * 3600 / elapsed:.0f}x real time)")
+
+
+if __name__ == "__main__":
+    main()
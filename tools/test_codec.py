@@ -0,0 +1,226 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Round trips of the UART codecs on a computer: messages encoded by one board
+# are read from a FakeUART and decoded by the other one, in both link modes.
+#
+#   python3 -m unittest discover tools
+
+import random
+import unittest
+
+from simulate import load_src
+
+DOOR = load_src("NOWIFI", ("src.codec", "src.simulated"))
+WIFI = load_src("WIFI", ("src.codec",))
+FakeUART = DOOR["src.simulated"].FakeUART
+STATS_SIZE = DOOR["src.telemetry"].STATS_SIZE
+
+SUNRISE = 1709272800  # 2024-03-01 06:00:00
+SUNSET = 1709313000   # 2024-03-01 17:10:00
+
+# Fields of a message of each schema, by start marker and kind
+MESSAGES = {
+    "?T": (),
+    "!T": (SUNRISE,),
+    "?W": (),
+    "!W": ("Clouds", SUNRISE, SUNSET),
+    "?N": ("It's time to go out!", "Food time has ended and Rex is still inside",
+           "alarm_clock"),
+    "!N": (),
+    "?S": tuple(range(STATS_SIZE - 2)) + (0, 0xFFFFFFFF),
+    "!S": tuple(value * 1000 for value in range(STATS_SIZE)),
+}
+
+# Text fields with the characters of the frames and separators, and others
+# which are not ASCII
+AWKWARD = ("a^b;c", "?!", "back\\slash", "Fido; Rex^2", "caffè ☕", "", "tab\there")
+
+
+class CodecCase:
+    """
+    Checks of a codec, mixed into one TestCase per mode. Messages go from the
+    door codec to the WIFI one, responses the other way round, as on the boards.
+    """
+
+    mode = None
+
+    def setUp(self) -> None:
+        self.door = DOOR["src.codec"].codec_for(self.mode)
+        self.wifi = WIFI["src.codec"].codec_for(self.mode)
+
+    def codecs(self, start: str):
+        """Sending and receiving codecs of a message, by its start marker."""
+
+        return (self.door, self.wifi) if start == "?" else (self.wifi, self.door)
+
+    def receive(self, codec, start: str, chunks):
+        """Decodes all the messages in 'chunks', fed to a FakeUART one by one."""
+
+        uart = FakeUART()
+        reader = codec.reader(uart, start)
+        for chunk in chunks:
+            uart.feed(chunk)
+
+        messages = []
+        while uart.in_waiting:
+            messages += [codec.decode(start, frame) for frame in reader.frames()]
+        return reader, messages
+
+    def round_trip(self, start: str, kind: str, seq, fields):
+        """Sends a message through the link and returns what is received."""
+
+        sender, receiver = self.codecs(start)
+        data = sender.encode(start, kind, seq, fields)
+        reader, messages = self.receive(receiver, start, [data])
+        self.assertEqual(reader.dropped, 0)
+        self.assertEqual(len(messages), 1)
+        return messages[0]
+
+    def test_every_schema(self) -> None:
+        for key, fields in MESSAGES.items():
+            for seq in (None, 0, 7, 255):
+                with self.subTest(message=key, seq=seq):
+                    start, kind = key
+                    self.assertEqual(self.round_trip(start, kind, seq, fields),
+                                     (kind, seq, fields))
+
+    def test_error_responses(self) -> None:
+        for kind in "TWNS":
+            for seq in (None, 3):
+                with self.subTest(kind=kind, seq=seq):
+                    self.assertEqual(self.round_trip("!", kind, seq, None),
+                                     (kind, seq, None))
+
+    def test_text_fields(self) -> None:
+        for text in AWKWARD:
+            with self.subTest(text=text):
+                fields = (text, "title " + text, text + " tags")
+                self.assertEqual(self.round_trip("?", "N", 1, fields),
+                                 ("N", 1, fields))
+
+    def test_split_at_any_byte(self) -> None:
+        data = b"".join(self.door.encode(start, kind, seq, MESSAGES[start + kind])
+                        for seq, (start, kind) in enumerate(("?W", "?N", "?S", "?T")))
+        expected = [(kind, seq, MESSAGES["?" + kind]) for seq, kind in enumerate("WNST")]
+
+        for size in range(1, 40):
+            with self.subTest(size=size):
+                chunks = [data[pos:pos + size] for pos in range(0, len(data), size)]
+                reader, messages = self.receive(self.wifi, "?", chunks)
+                self.assertEqual(messages, expected)
+
+        # Two cuts at every pair of positions of a single message
+        frame = self.door.encode("?", "N", 9, MESSAGES["?N"])
+        for first in range(1, len(frame)):
+            for second in range(first, len(frame)):
+                chunks = [frame[:first], frame[first:second], frame[second:]]
+                reader, messages = self.receive(self.wifi, "?", chunks)
+                self.assertEqual(messages, [("N", 9, MESSAGES["?N"])])
+
+    def test_garbage(self) -> None:
+        generator = random.Random(1)
+        frame = self.door.encode("?", "S", 4, MESSAGES["?S"])
+        for _ in range(200):
+            garbage = bytes(generator.randrange(256)
+                            for _ in range(generator.randrange(1, 300)))
+            with self.subTest(garbage=garbage):
+                reader, messages = self.receive(self.wifi, "?", [garbage, frame, frame])
+
+                # Whatever the garbage turns into, at most the frame right
+                # after it is lost, e.g. a packet with no end in between
+                self.assertEqual(messages[-1], ("S", 4, MESSAGES["?S"]))
+
+
+class AsciiCodecTest(CodecCase, unittest.TestCase):
+    mode = "ascii"
+
+    def test_escaped_text(self) -> None:
+        data = self.door.encode("?", "N", 2, AWKWARD[:3])
+        self.assertEqual(data.count(b";"), 1)
+        self.assertEqual(data.count(b"^"), 2)
+        self.assertEqual(data.count(b"?"), 1)
+        self.assertNotIn(b"!", data)
+
+    def test_longest_frame(self) -> None:
+
+        # Kind, sequence number and colon take four bytes of the body, the
+        # separators two and 'y' one
+        size = DOOR["src.codec"].ASCII_FRAME_SIZE
+        fields = ("x" * (size - 7), "y", "")
+        self.assertEqual(self.round_trip("?", "N", 8, fields), ("N", 8, fields))
+
+        with self.assertRaises(ValueError):
+            self.door.encode("?", "N", 8, ("x" * (size - 6), "y", ""))
+
+    def test_truncated_escape(self) -> None:
+        self.assertIsNone(self.wifi.decode("?", "N#1:a\\2^b^c"))
+        self.assertIsNone(self.wifi.decode("?", "N#1:a\\FF^b^c"))
+        self.assertEqual(self.wifi.errors, 2)
+
+
+class BinaryCodecTest(CodecCase, unittest.TestCase):
+    mode = "binary"
+
+    def test_corrupted_packets(self) -> None:
+        codec = DOOR["src.codec"]
+        packet = self.wifi.encode("!", "W", 5, MESSAGES["!W"])[:-1]
+
+        # Change each byte of the packet, keeping it free of zeros
+        for pos in range(len(packet)):
+            corrupted = bytearray(packet)
+            corrupted[pos] = corrupted[pos] % 255 + 1
+            with self.subTest(pos=pos):
+                self.assertIsNone(self.door.decode("!", bytes(corrupted)))
+
+        # A wrong CRC, on otherwise valid COBS
+        data = codec.cobs_decode(packet)
+        data[-1] ^= 0x01
+        self.assertIsNone(self.door.decode("!", bytes(codec.cobs_encode(data))))
+        self.assertEqual(self.door.errors, len(packet) + 1)
+
+    def test_cobs_runs(self) -> None:
+        codec = DOOR["src.codec"]
+        for length in (0, 1, 253, 254, 255, 256, 508, 509, 600):
+            for data in (bytes(length), bytes([0x55] * length),
+                         bytes(range(1, 256)) * 3, bytes(range(256)) * 2):
+                data = data[:length]
+                with self.subTest(length=length, first=data[:1]):
+                    encoded = codec.cobs_encode(data)
+                    self.assertNotIn(0, encoded)
+                    self.assertEqual(codec.cobs_decode(encoded), data)
+                    self.assertLessEqual(len(encoded), length + 1 + length // 254)
+
+    def test_longest_payload(self) -> None:
+
+        # Three length bytes and 252 bytes of text make a payload of 255 bytes
+        fields = ("x" * 200, "y" * 52, "")
+        self.assertEqual(self.round_trip("?", "N", 8, fields), ("N", 8, fields))
+
+        with self.assertRaises(ValueError):
+            self.door.encode("?", "N", 8, ("x" * 200, "y" * 53, ""))
+
+    def test_payload_over_255_bytes(self) -> None:
+        with self.assertRaises(ValueError):
+            self.door.encode("?", "N", 1, ("x" * 255, "y" * 255, "z"))
+
+    def test_wrong_direction(self) -> None:
+        packet = self.door.encode("?", "T", 1, ())[:-1]
+        self.assertIsNone(self.door.decode("!", packet))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Connections of the WIFI board's ConnectionManager to a local http.server,
+# counted by the server: kept alive between requests, and opened again when
+# the server closes them.
+#
+#   python3 -m unittest discover tools
+
+import time
+import unittest
+
+from simulate import HTTPSession, LocalServer, VirtualTime, load_src
+
+connections = load_src("WIFI", ("src.connections",), VirtualTime(0))["src.connections"]
+
+
+class ConnectionManagerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.servers = [LocalServer(), LocalServer()]
+        self.session = HTTPSession()
+        self.manager = connections.ConnectionManager(self.session, time.monotonic)
+
+    def tearDown(self) -> None:
+        self.session.close()
+        for server in self.servers:
+            server.stop()
+
+    def url(self, path: str = "/", server: int = 0) -> str:
+        return "http://%s%s" % (self.servers[server].address, path)
+
+    def send(self, url: str, method: str = "GET") -> bytes:
+        """Sends a request and reads its response to the end, as code.py does."""
+
+        data = b"data" if method == "POST" else None
+        with self.manager.request(method, url, data=data) as response:
+            self.assertEqual(response.status_code, 200)
+            return b"".join(response.iter_content(chunk_size=4))
+
+    def host_stats(self, server: int = 0):
+        return self.manager.stats[connections._host(self.url(server=server))]
+
+    def test_kept_alive(self) -> None:
+        for _ in range(5):
+            self.assertEqual(self.send(self.url()), b'{"ok": true}')
+        self.assertEqual(self.send(self.url("/topic"), "POST"), b"data")
+
+        self.assertEqual(self.servers[0].connections, 1)
+        stats = self.host_stats()
+        self.assertEqual(stats[connections.REQUESTS], 6)
+        self.assertEqual(stats[connections.REUSED], 5)
+
+    def test_hosts(self) -> None:
+        for _ in range(3):
+            self.send(self.url(server=0))
+            self.send(self.url(server=1))
+
+        self.assertEqual([server.connections for server in self.servers], [1, 1])
+        self.assertEqual(self.host_stats(0)[connections.REUSED], 2)
+        self.assertEqual(self.host_stats(1)[connections.REUSED], 2)
+        self.assertEqual(len(self.manager.report().splitlines()), 2)
+
+    def test_closed_by_server(self) -> None:
+        for path in ("/", "/close", "/", "/"):
+            self.send(self.url(path))
+
+        # The request after the close opens a new connection, not counted as
+        # reused
+        self.assertEqual(self.servers[0].connections, 2)
+        self.assertEqual(self.host_stats()[connections.REUSED], 2)
+
+    def test_dropped_by_server(self) -> None:
+        for path in ("/", "/drop", "/", "/"):
+            self.send(self.url(path))
+
+        # The request after the drop finds the connection closed and sends
+        # itself again on a new one
+        self.assertEqual(self.servers[0].connections, 2)
+        self.assertEqual(self.host_stats()[connections.REUSED], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
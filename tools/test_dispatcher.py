@@ -0,0 +1,108 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Requests sent again to the dispatcher of the WIFI board, and restarts of the
+# door board.
+#
+#   python3 -m unittest discover tools
+
+import unittest
+
+from simulate import VirtualTime, load_src
+
+VT = VirtualTime(0)
+WIFI = load_src("WIFI", ("src.codec", "src.dispatcher"), VT)
+DOOR = load_src("NOWIFI", ("src.codec", "src.link", "src.simulated"), VT)
+FakeUART = DOOR["src.simulated"].FakeUART
+
+NOTIFICATION = ("Title", "Data", "tags")
+
+
+class DispatcherTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.uart = FakeUART()
+        self.door_codec = DOOR["src.codec"].AsciiCodec()
+        self.dispatcher = WIFI["src.dispatcher"].Dispatcher(
+            self.uart, WIFI["src.codec"].AsciiCodec())
+
+        # Notifications queued, and weather answers given in turn
+        self.queued = []
+        self.weather = [None, ("Clear", 1, 2)]
+        self.dispatcher.register("N", self.notify)
+        self.dispatcher.register("W", lambda fields: self.weather.pop(0), deferred=True)
+
+    def notify(self, fields):
+        self.queued.append(fields)
+        return ()
+
+    def send(self, kind: str, seq, fields=()):
+        """Sends a request and returns the responses written meanwhile."""
+
+        self.uart.tx = bytearray()
+        self.uart.feed(self.door_codec.encode("?", kind, seq, fields))
+        self.dispatcher.poll()
+        self.dispatcher.process()
+
+        reader = self.door_codec.reader(FakeUART(), "!")
+        reader.uart.feed(self.uart.tx)
+        return [self.door_codec.decode("!", frame) for frame in reader.frames()]
+
+    def test_sent_again(self) -> None:
+        self.assertEqual(self.send("N", 1, NOTIFICATION), [("N", 1, ())])
+        self.assertEqual(self.send("N", 1, NOTIFICATION), [("N", 1, ())])
+        self.assertEqual(self.queued, [NOTIFICATION])
+        self.assertEqual(self.dispatcher.duplicates, 1)
+
+    def test_error_not_remembered(self) -> None:
+        self.assertEqual(self.send("W", 1), [("W", 1, None)])
+        self.assertEqual(self.send("W", 1), [("W", 1, ("Clear", 1, 2))])
+
+    def test_restart(self) -> None:
+        for seq in range(4):
+            self.send("N", seq, NOTIFICATION)
+
+        # The door board boots again and sends the same requests
+        for seq in range(4):
+            self.assertEqual(self.send("N", seq, NOTIFICATION), [("N", seq, ())])
+        self.assertEqual(len(self.queued), 8)
+        self.assertEqual(self.dispatcher.restarts, 1)
+        self.assertEqual(self.dispatcher.duplicates, 0)
+
+    def test_far_behind(self) -> None:
+        self.send("N", 100, NOTIFICATION)
+        self.send("N", 1, NOTIFICATION)
+        self.assertEqual(len(self.queued), 2)
+        self.assertEqual(self.dispatcher.restarts, 1)
+
+    def test_wrap_around(self) -> None:
+        for seq in (253, 254, 255, 1, 2):
+            self.send("N", seq, NOTIFICATION)
+        self.send("N", 255, NOTIFICATION)
+        self.assertEqual(len(self.queued), 5)
+        self.assertEqual(self.dispatcher.restarts, 0)
+        self.assertEqual(self.dispatcher.duplicates, 1)
+
+    def test_link_skips_zero(self) -> None:
+        link = DOOR["src.link"].Link(FakeUART(), self.door_codec, clock=VT.monotonic)
+        seqs = [link.request("T").seq]
+        link._seq = 255
+        seqs += [link.request("T").seq, link.request("T").seq]
+        self.assertEqual(seqs, [0, 255, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# The door sensor replaying the flex sensor trace in tools/traces.
+#
+#   python3 -m unittest discover tools
+
+import os
+import unittest
+
+from simulate import load_src
+
+DOOR = load_src("NOWIFI", ("src.door_sensor", "src.simulated"))
+door_sensor = DOOR["src.door_sensor"]
+simulated = DOOR["src.simulated"]
+
+TRACE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces", "door_push.txt")
+
+
+class DoorSensorTest(unittest.TestCase):
+
+    def replay(self, adc):
+        sensor = door_sensor.DoorSensor(adc)
+        return sensor, simulated.replay_door_trace(sensor)
+
+    def test_trace(self) -> None:
+        sensor, events = self.replay(simulated.TraceADC.from_file(TRACE))
+
+        # The knock at 1 s is ignored, the push from 2 s to 3.8 s opens the
+        # door once despite its dips, and it closes as soon as the push ends
+        self.assertEqual([event for at, event in events],
+                         [door_sensor.DOOR_OPENED, door_sensor.DOOR_CLOSED])
+        opened, closed = events[0][0], events[1][0]
+        self.assertTrue(2.0 < opened < 2.3, opened)
+        self.assertTrue(3.7 < closed < 4.0, closed)
+        self.assertFalse(sensor.is_open)
+
+    def test_duration(self) -> None:
+        sensor, events = self.replay(simulated.TraceADC.from_file(TRACE))
+        self.assertEqual(len(sensor.adc.values), 580)
+
+        sensor = door_sensor.DoorSensor(simulated.TraceADC.from_file(TRACE))
+        events = simulated.replay_door_trace(sensor, duration=3.0)
+        self.assertEqual([event for at, event in events], [door_sensor.DOOR_OPENED])
+        self.assertTrue(sensor.is_open)
+
+    def test_loop(self) -> None:
+        adc = simulated.TraceADC([1, 2, 3], loop=True)
+        self.assertEqual([adc.value for _ in range(7)], [1, 2, 3, 1, 2, 3, 1])
+
+        adc = simulated.TraceADC([1, 2, 3])
+        self.assertEqual([adc.value for _ in range(5)], [1, 2, 3, 3, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Text frames read in chunks from a loopback UART on a simulated clock, and
+# the escaping of their text fields.
+#
+#   python3 -m unittest discover tools
+
+import unittest
+
+from simulate import load_src
+
+DOOR = load_src("NOWIFI", ("src.codec", "src.frames", "src.simulated"))
+WIFI = load_src("WIFI", ("src.frames",))
+codec = DOOR["src.codec"]
+simulated = DOOR["src.simulated"]
+encode_frame = WIFI["src.frames"].encode_frame
+
+# UART delay, in seconds
+DELAY = 0.005
+
+RESPONSES = [encode_frame("!", "W", seq, f"Clear^{seq}") for seq in range(5)]
+
+
+class FrameReaderTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.clock = simulated.SimClock()
+        self.wifi_uart, self.door_uart = simulated.loopback_pair(
+            self.clock.monotonic, delay=DELAY, buffer_size=512)
+
+    def reader(self, size: int = 64):
+        return DOOR["src.frames"].FrameReader(self.door_uart, "!", size)
+
+    def receive(self, reader) -> list:
+        """Bodies of the frames readable once the bytes sent have arrived."""
+
+        self.clock.sleep(DELAY)
+        return list(reader.frames())
+
+    def test_frames(self) -> None:
+        reader = self.reader()
+        for frame in RESPONSES:
+            self.wifi_uart.write(frame)
+
+        # Nothing arrives before the delay
+        self.assertIsNone(reader.read_frame())
+        self.assertEqual(self.receive(reader), [f"W#{seq}:Clear^{seq}" for seq in range(5)])
+        self.assertEqual(reader.dropped, 0)
+
+    def test_split_at_any_byte(self) -> None:
+        data = b"".join(RESPONSES)
+        for first in range(1, len(data)):
+            with self.subTest(first=first):
+                reader = self.reader(16)
+                self.wifi_uart.write(data[:first])
+                frames = self.receive(reader)
+                self.wifi_uart.write(data[first:])
+                frames += self.receive(reader)
+                self.assertEqual(len(frames), len(RESPONSES))
+                self.assertEqual(reader.dropped, 0)
+
+    def test_stopped_early(self) -> None:
+        reader = self.reader()
+        self.wifi_uart.write(b"".join(RESPONSES))
+        self.clock.sleep(DELAY)
+
+        # A chunk holds all the frames, the ones not taken are kept
+        self.assertEqual(next(reader.frames()), "W#0:Clear^0")
+        self.assertEqual(len(list(reader.frames())), 4)
+
+    def test_dropped(self) -> None:
+        reader = self.reader(16)
+        for data in (b"noise!T#1:2024-01-01 0\xff:00:00;",   # not ASCII
+                     b"!W#2:" + b"x" * 20 + b";",             # too long
+                     b"!T#3:2024-01-",                        # cut by the next one
+                     RESPONSES[4]):
+            self.wifi_uart.write(data)
+
+        self.assertEqual(self.receive(reader), ["W#4:Clear^4"])
+        self.assertEqual(reader.dropped, 3)
+
+    def test_decode_frame(self) -> None:
+        decode_frame = DOOR["src.frames"].decode_frame
+        self.assertEqual(decode_frame("W#3:Clear^a:b"), ("W", 3, "Clear^a:b"))
+        self.assertEqual(decode_frame("T"), ("T", None, None))
+        self.assertEqual(decode_frame("T#x:"), ("T", None, ""))
+        self.assertEqual(encode_frame("?", "N", 0, ""), b"?N#0:;")
+
+
+class EscapeTest(unittest.TestCase):
+
+    def test_round_trip(self) -> None:
+        for text in ("", "plain text", "^;?!\\", "Rex; 2^3 ok?", "caffè ☕", "\x00\n\x7f"):
+            with self.subTest(text=text):
+                escaped = codec.escape(text)
+                self.assertEqual(codec.unescape(escaped), text)
+                self.assertTrue(all(0x20 <= ord(char) <= 0x7E for char in escaped))
+                self.assertFalse(set(escaped) & set("^;?!"))
+
+    def test_escapes(self) -> None:
+        self.assertEqual(codec.escape("a;b\\"), "a\\3Bb\\5C")
+        self.assertEqual(codec.escape("è"), "\\C3\\A8")
+
+    def test_invalid(self) -> None:
+        for text in ("a\\3", "a\\", "a\\zz", "\\C3"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    codec.unescape(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
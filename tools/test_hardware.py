@@ -0,0 +1,76 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Devices of the door board whose driver fails, replaced by inert stand-ins.
+#
+#   python3 -m unittest discover tools
+
+import math
+import sys
+import unittest
+from unittest import mock
+
+from simulate import VirtualTime, load_src
+
+DOOR = load_src("NOWIFI", ("src.hardware", "src.link", "src.simulated"), VirtualTime(0))
+hardware = DOOR["src.hardware"]
+simulated = DOOR["src.simulated"]
+
+
+def failing(hw):
+    raise OSError("no device")
+
+
+class HardwareTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+
+        # Stand-ins are imported when a driver fails, from the board's modules
+        patcher = mock.patch.dict(sys.modules, DOOR)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_degraded(self) -> None:
+        names = list(simulated.SIMULATED_DRIVERS) + list(hardware.COMMON_DRIVERS)
+        hw = hardware.Hardware({name: failing for name in names})
+        for name in names:
+            with self.subTest(name=name):
+                self.assertIsNotNone(getattr(hw, name))
+                self.assertTrue(hw.is_degraded(name))
+
+        self.assertTrue(math.isnan(hw.sht.temperature))
+        request = hw.link.request("T", timeout=0.0, retries=0)
+        hw.link.poll()
+        self.assertEqual(request.status, DOOR["src.link"].FAILED)
+
+    def test_working_link_on_failed_uart(self) -> None:
+        drivers = dict(simulated.SIMULATED_DRIVERS, uart=failing)
+        drivers.update(hardware.COMMON_DRIVERS)
+        hw = hardware.Hardware(drivers)
+        hw.init("link")
+        self.assertFalse(hw.is_degraded("link"))
+        self.assertTrue(hw.is_degraded("uart"))
+
+    def test_not_a_device(self) -> None:
+        hw = hardware.Hardware({"lidar": failing})
+        with self.assertRaisesRegex(ValueError, "lidar"):
+            hw.lidar
+        with self.assertRaises(AttributeError):
+            hw.radar
+
+
+if __name__ == "__main__":
+    unittest.main()
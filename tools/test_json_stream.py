@@ -0,0 +1,101 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# The streaming json extractor of the WIFI board, fed documents cut at every
+# byte, and \u escapes of characters outside the Basic Multilingual Plane.
+#
+#   python3 -m unittest discover tools
+
+import json
+import unittest
+
+from simulate import load_src
+
+json_stream = load_src("WIFI", ("src.json_stream",))["src.json_stream"]
+
+PATHS = (("weather", 0, "main"), ("sys", "sunrise"), ("name",))
+
+DOCUMENT = (b'{"weather": [{"id": 501, "main": "Rain \\ud83c\\udf27\\u2602",'
+            b' "description": "a \\"moderate\\" rain\\\\"}],'
+            b' "sys": {"sunrise": 1709272300}, "name": "Trento \\u00e8"}')
+
+VALUES = {
+    ("weather", 0, "main"): "Rain \U0001F327☂",
+    ("sys", "sunrise"): 1709272300,
+    ("name",): "Trento è",
+}
+
+
+def extract(chunks, paths=PATHS) -> dict:
+    """Values of 'paths' in the document fed in 'chunks'."""
+
+    extractor = json_stream.JSONExtractor(paths)
+    for chunk in chunks:
+        extractor.feed(chunk)
+    return extractor.values
+
+
+def string(escaped: str) -> str:
+    """Value of a json string, given its text between the quotes."""
+
+    return extract([b'{"s": "%s"}' % escaped.encode()], (("s",),))[("s",)]
+
+
+class JSONExtractorTest(unittest.TestCase):
+
+    def test_document(self) -> None:
+        self.assertEqual(extract([DOCUMENT]), VALUES)
+        self.assertEqual(json.loads(DOCUMENT)["weather"][0]["main"], VALUES[PATHS[0]])
+
+    def test_split_at_any_byte(self) -> None:
+        for size in range(1, 40):
+            with self.subTest(size=size):
+                chunks = [DOCUMENT[pos:pos + size] for pos in range(0, len(DOCUMENT), size)]
+                self.assertEqual(extract(chunks), VALUES)
+
+        # Two cuts at every pair of positions inside the escaped string
+        start = DOCUMENT.index(b"Rain")
+        end = DOCUMENT.index(b'",', start)
+        for first in range(start, end):
+            for second in range(first, end):
+                chunks = [DOCUMENT[:first], DOCUMENT[first:second], DOCUMENT[second:]]
+                self.assertEqual(extract(chunks), VALUES, (first, second))
+
+    def test_surrogate_pairs(self) -> None:
+        self.assertEqual(string("\\ud83d\\ude00"), "\U0001F600")
+        self.assertEqual(string("a\\uD83D\\uDE00b\\ud83d\\ude01"), "a\U0001F600b\U0001F601")
+
+    def test_lone_surrogates(self) -> None:
+        for escaped, expected in (
+                ("\\ud83d", "�"),
+                ("\\ud83dabc", "�abc"),
+                ("\\ud83d\\n", "�\n"),
+                ("\\ud83d\\u00e8", "�è"),
+                ("\\ud83d\\ud83d\\ude00", "�\U0001F600"),
+                ("\\ude00x", "�x"),
+                ("\\ude00\\ud83d", "��")):
+            with self.subTest(escaped=escaped):
+                self.assertEqual(string(escaped), expected)
+
+    def test_not_json(self) -> None:
+        for data in (b"]", b"}", b'{"s": "\\uzzzz"}'):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    extract([data])
+
+
+if __name__ == "__main__":
+    unittest.main()
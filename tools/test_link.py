@@ -0,0 +1,202 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Requests of the door board's Link answered over a loopback UART on a
+# simulated clock, with delays, losses, late and unexpected responses.
+#
+#   python3 -m unittest discover tools
+
+import unittest
+
+from simulate import VirtualTime, load_src
+
+DOOR = load_src("NOWIFI", ("src.codec", "src.link", "src.simulated"), VirtualTime(0))
+link = DOOR["src.link"]
+simulated = DOOR["src.simulated"]
+
+# Seconds between two polls of both ends
+STEP = 0.01
+
+
+class Echo:
+    """
+    Other end of the link, answering each request with its own fields, after
+    'delay' seconds.
+    """
+
+    def __init__(self, uart, codec, clock, delay: float = 0.0) -> None:
+        self.uart = uart
+        self.codec = codec
+        self.reader = codec.reader(uart, "?")
+        self.clock = clock
+        self.delay = delay
+        self.requests = []
+        self._answers = []
+
+    def poll(self) -> None:
+        for frame in self.reader.frames():
+            kind, seq, fields = self.codec.decode("?", frame)
+            self.requests.append((kind, seq))
+            self._answers.append((self.clock.monotonic() + self.delay, kind, seq, fields))
+
+        while self._answers and self._answers[0][0] <= self.clock.monotonic():
+            at, kind, seq, fields = self._answers.pop(0)
+            self.answer(kind, seq, fields)
+
+    def answer(self, kind: str, seq, fields) -> None:
+        self.uart.write(self.codec.encode("!", kind, seq, fields))
+
+
+class LinkTest(unittest.TestCase):
+
+    def connect(self, delay: float = 0.002, loss: float = 0.0, answer_delay: float = 0.0,
+                mode: str = "ascii", **kwargs):
+        """Link of the door board and Echo on the other end."""
+
+        self.clock = simulated.SimClock()
+        door_uart, wifi_uart = simulated.loopback_pair(
+            self.clock.monotonic, delay=delay, loss=loss, seed=7, buffer_size=512)
+        self.link = link.Link(door_uart, DOOR["src.codec"].codec_for(mode),
+                              clock=self.clock.monotonic, **kwargs)
+        self.echo = Echo(wifi_uart, DOOR["src.codec"].codec_for(mode), self.clock,
+                         answer_delay)
+
+    def run_for(self, seconds: float) -> None:
+        for _ in range(round(seconds / STEP)):
+            self.clock.sleep(STEP)
+            self.echo.poll()
+            self.link.poll()
+
+    def sleep(self, seconds: float) -> None:
+        """Sleep of Link.wait(), the other end keeps going meanwhile."""
+
+        self.clock.sleep(seconds)
+        self.echo.poll()
+
+    def test_answered(self) -> None:
+        self.connect()
+        answers = []
+        request = self.link.request("X", ("hello",), callback=answers.append)
+        self.assertEqual(self.link.wait(request, self.sleep), ("hello",))
+
+        self.assertEqual(request.status, link.DONE)
+        self.assertEqual(answers, [("hello",)])
+        self.assertEqual(request.attempts, 1)
+        self.assertEqual(sum(self.link.latencies["X"]), 1)
+        self.assertFalse(self.link.busy)
+
+    def test_late_response(self) -> None:
+
+        # The answer to the first attempt arrives after the request was sent
+        # again: it answers the request, the second one is discarded
+        self.connect(answer_delay=1.5)
+        request = self.link.request("X", ("late",), timeout=1.0)
+        self.run_for(4.0)
+
+        self.assertEqual(request.response, ("late",))
+        self.assertEqual(request.attempts, 2)
+        self.assertEqual(len(self.echo.requests), 2)
+        self.assertEqual(self.link.discarded, 1)
+        self.assertEqual(self.link.latencies["X"][link.LATENCY_BUCKETS.index(2.0)], 1)
+
+    def test_unexpected_responses(self) -> None:
+        self.connect(answer_delay=0.5)
+        request = self.link.request("X", ("mine",))
+        self.run_for(0.1)
+
+        # Another sequence number, another kind, and garbage
+        self.echo.answer("X", request.seq + 1, ("other",))
+        self.echo.answer("T", request.seq, None)
+        self.echo.uart.write(b"!X#0:\\zz;")
+        self.run_for(0.1)
+        self.assertTrue(request.pending)
+        self.assertEqual(self.link.discarded, 3)
+
+        self.run_for(0.5)
+        self.assertEqual(request.response, ("mine",))
+
+    def test_failed(self) -> None:
+        self.connect(loss=1.0)
+        answers = []
+        request = self.link.request("X", ("lost",), timeout=0.5, retries=2,
+                                    callback=answers.append)
+        self.assertIsNone(self.link.wait(request, self.sleep))
+
+        # Sent three times, failed after the timeout of the last one
+        self.assertEqual(request.status, link.FAILED)
+        self.assertEqual(request.attempts, 3)
+        self.assertEqual(answers, [None])
+        self.assertAlmostEqual(self.clock.monotonic(), 1.5, delta=2 * STEP)
+        self.assertEqual(self.link.failed, 1)
+
+    def test_window(self) -> None:
+        self.connect(answer_delay=0.1, window=2)
+        requests = [self.link.request("X", (str(i),)) for i in range(5)]
+        self.assertEqual(self.link.sent, 2)
+
+        self.run_for(1.0)
+        self.assertEqual([request.response for request in requests],
+                         [(str(i),) for i in range(5)])
+        self.assertEqual(len(self.echo.requests), 5)
+
+    def test_losses(self) -> None:
+        for mode in ("ascii", "binary"):
+            with self.subTest(mode=mode):
+                self.connect(delay=0.02, loss=0.2, mode=mode)
+                requests = [self.link.request("X", (f"request {i}",), timeout=0.3,
+                                              retries=5) for i in range(60)]
+                self.run_for(30.0)
+
+                # Every request gets its own answer, whatever was lost or sent
+                # again
+                for i, request in enumerate(requests):
+                    self.assertEqual(request.status, link.DONE, i)
+                    self.assertEqual(request.response, (f"request {i}",))
+                self.assertGreater(self.link.retried, 0)
+                self.assertEqual(self.link.sent, 60 + self.link.retried)
+
+    def test_too_long(self) -> None:
+        for mode in ("ascii", "binary"):
+            with self.subTest(mode=mode):
+                self.connect(mode=mode)
+                answers = []
+                request = self.link.request("N", ("Title", "x" * 400, "tags"),
+                                            callback=answers.append)
+
+                # Not sent, and the link goes on with the next request
+                self.assertEqual(request.status, link.FAILED)
+                self.assertEqual(answers, [None])
+                self.assertEqual(self.link.sent, 0)
+                self.assertFalse(self.link.busy)
+                request = self.link.request("X", ("short",))
+                self.assertEqual(self.link.wait(request, self.sleep), ("short",))
+
+    def test_sequence_numbers(self) -> None:
+        self.connect()
+        seqs = []
+        for _ in range(300):
+            request = self.link.request("X", ("x",))
+            seqs.append(request.seq)
+            self.link.wait(request, self.sleep)
+
+        # 0 only after boot, then 1 to 255 over and over
+        self.assertEqual(seqs[:3], [0, 1, 2])
+        self.assertEqual(seqs[255:258], [255, 1, 2])
+        self.assertEqual(seqs.count(0), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
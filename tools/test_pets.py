@@ -0,0 +1,64 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Pets files read by the door board, with invalid lines among the valid ones.
+#
+#   python3 -m unittest discover tools
+
+import os
+import tempfile
+import unittest
+
+from simulate import VirtualTime, load_src
+
+DOOR = load_src("NOWIFI", ("src.pets", "src.schedule"), VirtualTime(0))
+pets = DOOR["src.pets"]
+schedule = DOOR["src.schedule"]
+
+
+class PetRegistryTest(unittest.TestCase):
+
+    def load(self, text: str):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pets.txt")
+            with open(path, "w") as pets_file:
+                pets_file.write(text)
+            return pets.PetRegistry.from_file(path)
+
+    def test_valid(self) -> None:
+        registry = self.load("# comment\n\nd951c359 Fido 3:1 -5..28\n0000000a Rex\n")
+        fido = registry.get(0xd951c359)
+        self.assertEqual(len(registry), 2)
+        self.assertEqual(fido.state(schedule.MUST_STAY_OUT), schedule.FREE_IN_OUT)
+        self.assertEqual(fido.state(schedule.EATING), schedule.EATING)
+        self.assertEqual(fido.limits, (-5.0, 28.0))
+
+    def test_invalid_lines_skipped(self) -> None:
+        registry = self.load("d951c359 Fido 3:4\n"
+                             "0000000b Tom -1:2\n"
+                             "0000000c Max 3-1\n"
+                             "zzzz Bob\n"
+                             "0000000d\n"
+                             "0000000a Rex 0:1\n")
+        self.assertEqual([pet.name for pet in registry], ["Rex"])
+
+    def test_missing_file(self) -> None:
+        registry = pets.PetRegistry.from_file(os.path.join(tempfile.gettempdir(), "no-pets.txt"))
+        self.assertEqual([pet.uid for pet in registry], [pets.DEFAULT_PET[0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Temperature limits of the outdoor policy, with hysteresis after the first
+# sample.
+#
+#   python3 -m unittest discover tools
+
+import unittest
+
+from simulate import VirtualTime, load_src
+
+policy = load_src("NOWIFI", ("src.policy",), VirtualTime(0))["src.policy"]
+
+NAN = float("nan")
+
+
+class RuleTest(unittest.TestCase):
+
+    def rule(self):
+        return policy.Rule(("Clear",), low=5.0, high=32.0, hysteresis=1.0)
+
+    def verdicts(self, rule, temperatures) -> list:
+        verdicts = []
+        for temperature in temperatures:
+            rule.update(temperature)
+            verdicts.append(rule.allows("Clear"))
+        return verdicts
+
+    def test_first_sample(self) -> None:
+
+        # Just within the limits, without the hysteresis
+        for temperature in (5.5, 31.5):
+            with self.subTest(temperature=temperature):
+                self.assertEqual(self.verdicts(self.rule(), [temperature]), [True])
+        self.assertEqual(self.verdicts(self.rule(), [5.0]), [False])
+
+    def test_hysteresis(self) -> None:
+        self.assertEqual(self.verdicts(self.rule(), [6.0, 5.5, 4.9, 5.5, 6.0, 6.1, 5.5]),
+                         [True, True, False, False, False, True, True])
+        self.assertEqual(self.verdicts(self.rule(), [4.0, 5.5, 6.5]), [False, False, True])
+
+    def test_not_a_number(self) -> None:
+
+        # A failed sample forbids going out, the next one decides again as the
+        # first one
+        self.assertEqual(self.verdicts(self.rule(), [NAN, 5.5, 4.0, NAN, 5.5]),
+                         [False, True, False, False, True])
+        self.assertIs(self.verdicts(self.rule(), [NAN])[0], False)
+
+    def test_weather(self) -> None:
+        rule = self.rule()
+        rule.update(20.0)
+        self.assertTrue(rule.allows("Clear"))
+        self.assertFalse(rule.allows("Rain"))
+        self.assertFalse(rule.allows(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
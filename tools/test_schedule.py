@@ -0,0 +1,100 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# The compiled daily schedule, against the time ranges StateMachine.go_to()
+# used to check one by one.
+#
+#   python3 -m unittest discover tools
+
+import unittest
+
+from simulate import load_src
+
+schedule = load_src("NOWIFI", ("src.schedule",))["src.schedule"]
+
+HOUR = 3600
+MINUTE = 60
+
+
+def ranges_state(seconds: int, sunrise: int, sunset: int) -> int:
+    """State at some time as go_to() found it before the schedule was compiled:
+    ranges checked in order, the last one matching wins."""
+
+    breakfast, lunch, dinner, meal = 9 * HOUR, 13 * HOUR, 20 * HOUR, 30 * MINUTE
+    ranges = (
+        (0, sunrise, schedule.MUST_STAY_IN),
+        (sunrise, breakfast, schedule.FREE_IN_OUT),
+        (breakfast, breakfast + meal, schedule.EATING),
+        (breakfast + meal, lunch, schedule.MUST_STAY_OUT),
+        (lunch, lunch + meal, schedule.EATING),
+        (lunch + meal, sunset, schedule.MUST_STAY_OUT),
+        (sunset, dinner, schedule.FREE_IN_OUT),
+        (dinner, dinner + meal, schedule.EATING),
+        (dinner + meal, schedule.SECONDS_PER_DAY, schedule.MUST_STAY_IN),
+    )
+
+    state = None
+    for start, end, range_state in ranges:
+        if start <= seconds < end:
+            state = range_state
+    return state
+
+
+class ScheduleTest(unittest.TestCase):
+
+    def compiled(self, sunrise: int, sunset: int):
+        table = schedule.Schedule()
+        table.compile(sunrise, sunset)
+        return table
+
+    def test_summer_sunset(self) -> None:
+        table = self.compiled(5 * HOUR + 30 * MINUTE, 21 * HOUR + 15 * MINUTE)
+
+        self.assertEqual(table.state_at(19 * HOUR + 59 * MINUTE), schedule.MUST_STAY_OUT)
+        self.assertEqual(table.state_at(20 * HOUR + 10 * MINUTE), schedule.EATING)
+        for minutes in range(20 * 60 + 30, 24 * 60):
+            self.assertEqual(table.state_at(minutes * MINUTE), schedule.MUST_STAY_IN)
+        self.assertEqual(table.next_transition(20 * HOUR + 40 * MINUTE),
+                         schedule.SECONDS_PER_DAY)
+
+    def test_winter_sunrise(self) -> None:
+        table = self.compiled(9 * HOUR + 15 * MINUTE, 16 * HOUR)
+
+        self.assertEqual(table.state_at(8 * HOUR + 59 * MINUTE), schedule.MUST_STAY_IN)
+        self.assertEqual(table.state_at(9 * HOUR + 20 * MINUTE), schedule.EATING)
+        self.assertEqual(table.state_at(16 * HOUR), schedule.FREE_IN_OUT)
+
+    def test_matches_ranges(self) -> None:
+
+        # Sunrises until after breakfast, sunsets from the end of lunch on
+        for sunrise in range(4 * HOUR, 10 * HOUR, 25 * MINUTE):
+            for sunset in range(13 * HOUR + 30 * MINUTE, 23 * HOUR, 25 * MINUTE):
+                table = self.compiled(sunrise, sunset)
+                for seconds in range(0, schedule.SECONDS_PER_DAY, 5 * MINUTE):
+                    self.assertEqual(table.state_at(seconds),
+                                     ranges_state(seconds, sunrise, sunset),
+                                     (sunrise, sunset, seconds))
+
+    def test_next_transition(self) -> None:
+        table = self.compiled(6 * HOUR, 18 * HOUR)
+
+        self.assertEqual(table.next_transition(0), 6 * HOUR)
+        self.assertEqual(table.next_transition(6 * HOUR), 9 * HOUR)
+        self.assertEqual(table.next_transition(18 * HOUR + 1), 20 * HOUR)
+
+
+if __name__ == "__main__":
+    unittest.main()
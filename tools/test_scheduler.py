@@ -0,0 +1,121 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# The cooperative scheduler of the door board on a simulated clock: when
+# tasks run, cancelled and finished tasks, and tasks talking over a loopback
+# UART.
+#
+#   python3 -m unittest discover tools
+
+import unittest
+
+from simulate import VirtualTime, load_src
+
+DOOR = load_src("NOWIFI", ("src.frames", "src.scheduler", "src.simulated"), VirtualTime(0))
+simulated = DOOR["src.simulated"]
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.clock = simulated.SimClock()
+        self.scheduler = DOOR["src.scheduler"].Scheduler(self.clock.monotonic, self.clock.sleep)
+        self.calls = []
+
+    def record(self, name: str = "f"):
+        """Function recording when it is called."""
+
+        return lambda: self.calls.append((name, round(self.clock.monotonic(), 6)))
+
+    def task(self, name: str, delays):
+        """Task recording when it runs, then waiting each of 'delays' in turn."""
+
+        for delay in delays:
+            self.record(name)()
+            yield delay
+
+    def test_every(self) -> None:
+        self.scheduler.every(1.0, self.record("a"))
+        self.scheduler.every(0.4, self.record("b"), delay=0.5)
+        self.scheduler.run(2.3)
+
+        self.assertEqual(self.calls, [("a", 0), ("b", 0.5), ("b", 0.9), ("a", 1.0),
+                                      ("b", 1.3), ("b", 1.7), ("a", 2.0), ("b", 2.1)])
+        self.assertAlmostEqual(self.clock.monotonic(), 2.3)
+
+    def test_tasks(self) -> None:
+        self.scheduler.spawn(self.task("a", (0.3, 0, 1.0)))
+        self.scheduler.spawn(self.task("b", (0.5,)), delay=0.1)
+
+        # Both tasks end, the scheduler returns without waiting for the
+        # duration
+        self.scheduler.run(10.0)
+        self.assertEqual(self.calls, [("a", 0), ("b", 0.1), ("a", 0.3), ("a", 0.3)])
+        self.assertEqual(self.clock.monotonic(), 1.3)
+
+    def test_cancel(self) -> None:
+        ticks = self.scheduler.every(0.25, self.record("tick"))
+
+        def stopper():
+            yield 1.0
+            self.scheduler.cancel(ticks)
+
+        self.scheduler.spawn(stopper())
+        self.scheduler.run(3.0)
+        self.assertEqual(len(self.calls), 5)
+        self.assertEqual(self.calls[-1], ("tick", 1.0))
+
+    def test_spawned_while_running(self) -> None:
+
+        def spawner():
+            self.scheduler.spawn(self.task("child", (1.0,)))
+            yield 2.0
+
+        self.scheduler.spawn(spawner())
+        self.assertEqual(self.scheduler.run_once(), 0)
+        self.assertEqual(self.calls, [])
+
+        self.assertEqual(self.scheduler.run_once(), 1.0)
+        self.assertEqual(self.calls, [("child", 0)])
+
+    def test_uart_tasks(self) -> None:
+
+        # A task sends a frame every 0.5 s, another one reads the frames
+        # every 0.05 s, from the other end of a UART with a delay of 0.02 s
+        sender, receiver = simulated.loopback_pair(self.clock.monotonic, delay=0.02)
+        reader = DOOR["src.frames"].FrameReader(receiver, "!")
+        received = []
+
+        def send():
+            for seq in range(5):
+                sender.write(b"!T#%d;" % seq)
+                yield 0.5
+
+        def read():
+            for frame in reader.frames():
+                received.append((frame, round(self.clock.monotonic(), 6)))
+
+        self.scheduler.spawn(send())
+        self.scheduler.every(0.05, read)
+        self.scheduler.run(3.0)
+
+        self.assertEqual([frame for frame, at in received], [f"T#{seq}" for seq in range(5)])
+        for seq, (frame, at) in enumerate(received):
+            self.assertAlmostEqual(at, seq * 0.5 + 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
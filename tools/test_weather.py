@@ -0,0 +1,110 @@
+########################################################
+#
+#   Embedded Software for IoT, University of Trento
+#   A.Y. 2023/2024
+#   Final project
+#
+#   Authors: Carlotta Cazzolli 226912
+#            Alessandro Iepure 228023
+#            Martina Panini 226621
+#
+#   Smart Pet Door
+#
+#   MIT license, see LICENSE file
+#
+########################################################
+
+# Weather responses, well formed or not, parsed by fetch_weather() of the WIFI
+# board, also served by a local http.server in pieces cut at awkward places.
+#
+#   python3 -m unittest discover tools
+
+import json
+import unittest
+
+from simulate import FakeResponse, HTTPSession, LocalServer, Scenario, Simulation
+
+SIMULATION = Simulation(Scenario(), "2024-03-01", None, 0.0, 0.0)
+WIFI = SIMULATION.wifi
+
+GOOD = {
+    "weather": [{"id": 803, "main": "Clouds"}],
+    "sys": {"sunrise": 1709272300, "sunset": 1709313400},
+    "timezone": 3600,
+}
+
+
+def body(weather=GOOD["weather"], sunrise=1709272300, sunset=1709313400,
+         timezone=3600) -> bytes:
+    """OpenWeatherMap response, with the values given."""
+
+    return json.dumps({"weather": weather, "sys": {"sunrise": sunrise, "sunset": sunset},
+                       "timezone": timezone}).encode()
+
+
+class FetchWeatherTest(unittest.TestCase):
+
+    def fetch(self, data: bytes, status: int = 200):
+        """fetch_weather() with the weather API answering 'data'."""
+
+        network = SIMULATION.network
+        network.request = lambda method, url, **kwargs: FakeResponse(status, data, None)
+        try:
+            return WIFI.fetch_weather()
+        finally:
+            del network.request
+
+    def test_good(self) -> None:
+        self.assertEqual(self.fetch(body()), ("Clouds", 1709275900, 1709317000))
+
+    def test_null_and_string_values(self) -> None:
+        for values in ({"sunrise": None}, {"sunset": "1709313400"},
+                       {"timezone": "3600"}, {"timezone": None},
+                       {"weather": [{"main": None}]}, {"weather": [{"main": 3}]},
+                       {"sunrise": True}, {"sunset": 1709313400.5}):
+            with self.subTest(values=values):
+                self.assertIsNone(self.fetch(body(**values)))
+
+    def test_not_json(self) -> None:
+        for data in (b"<html><body>Sign in, please: <a href=x>here</a>}</body></html>",
+                     b"", b"{\"weather\": [", b"null"):
+            with self.subTest(data=data):
+                self.assertIsNone(self.fetch(data))
+
+    def test_status(self) -> None:
+        self.assertIsNone(self.fetch(body(), status=401))
+
+
+class ServedWeatherTest(unittest.TestCase):
+
+    # Escapes in the wanted string, a pair of surrogates among them
+    BODY = (b'{"coord": {"lon": 11.12, "lat": 46.07}, "weather": [{"id": 501,'
+            b' "main": "R\\u0061in \\ud83c\\udf27", "description": "\\"moderate\\" rain"}],'
+            b' "sys": {"sunrise": 1709272300, "sunset": 1709313400}, "timezone": 3600}')
+
+    def setUp(self) -> None:
+        self.server = LocalServer(self.BODY)
+        self.session = HTTPSession({"api.openweathermap.org": self.server.address})
+        self.saved = WIFI.connections.session, WIFI.WEATHER_CHUNK_SIZE
+        WIFI.connections.session = self.session
+
+    def tearDown(self) -> None:
+        WIFI.connections.session, WIFI.WEATHER_CHUNK_SIZE = self.saved
+        self.session.close()
+        self.server.stop()
+
+    def test_pieces(self) -> None:
+        expected = ("Rain \U0001F327", 1709275900, 1709317000)
+        for piece in (0, 1, 5, 64):
+            self.server.piece = piece
+            for size in range(1, 48):
+                with self.subTest(piece=piece, size=size):
+                    WIFI.WEATHER_CHUNK_SIZE = size
+                    self.assertEqual(WIFI.fetch_weather(), expected)
+
+        # All the requests on a single connection
+        self.assertEqual(self.server.connections, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()